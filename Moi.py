@@ -1,61 +1,9 @@
 #!/usr/bin/env python3
-import json
 import sys
 from tikapi import TikAPI, ValidationException, ResponseException
-
-def extraer_room_ids(json_texto):
-    try:
-        datos = json.loads(json_texto)
-        room_ids = []
-
-        for item in datos.get("data", []):
-            room_info = item.get("live_info", {}).get("owner", {}).get("own_room", {})
-            ids = room_info.get("room_ids", [])
-            room_ids.extend(ids)
-
-        return room_ids
-
-    except json.JSONDecodeError:
-        print("Error: El texto proporcionado no es un JSON válido.")
-        return []
-
-def extraer_display_ids(json_str, lista=None):
-    """
-    Extrae los 'display_id' de cada objeto en 'data'.
-    """
-    if lista is None:
-        lista = []
-    try:
-        datos = json.loads(json_str)
-
-        for item in datos.get("data", []):
-            display_id = item.get("live_info", {}).get("owner", {}).get("display_id")
-            if display_id:
-                lista.append(str(display_id))
-
-    except (json.JSONDecodeError, TypeError) as e:
-        print("Error procesando el JSON:", e)
-
-    return lista
-
-def extraer_display_ids_recommended(json_str, lista=None):
-    """
-    Extrae los 'display_id' de cada objeto en 'data' de recomendados.
-    """
-    if lista is None:
-        lista = []
-    try:
-        datos = json.loads(json_str)
-
-        for item in datos.get("data", []):
-            display_id = item.get("owner", {}).get("display_id")
-            if display_id:
-                lista.append(str(display_id))
-
-    except (json.JSONDecodeError, TypeError) as e:
-        print("Error procesando el JSON:", e)
-
-    return lista
+from app.services.extractor import (
+    parse_search_response, parse_recommend_response, response_payload
+)
 
 def main():
     # Obtener query de argumentos o usar default
@@ -77,17 +25,19 @@ def main():
     try:
         response = User.live.search(query=query)
 
-        # Extraer display_ids de la búsqueda
-        extraer_display_ids(response.text, lista)
-
-        # Extraer room_ids para recomendaciones
-        respose_rooms_ids = extraer_room_ids(response.text)
+        # Extraer display_ids y room_ids de la búsqueda en una sola pasada
+        search = parse_search_response(response_payload(response))
+        lista.extend(record.display_id for record in search.records)
+        respose_rooms_ids = search.room_ids
 
         # Obtener recomendados de cada room
         for room_id in respose_rooms_ids:
             try:
                 response1 = User.live.recommend(room_id=str(room_id))
-                extraer_display_ids_recommended(response1.text, lista)
+                lista.extend(
+                    record.display_id
+                    for record in parse_recommend_response(response_payload(response1))
+                )
 
             except ValidationException as e:
                 print(f"Error de validación: {e}, campo: {e.field}")
@@ -2,57 +2,31 @@
 FastAPI routes and WebSocket endpoints
 """
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from app.models.database import Streamer, ScanHistory, Database
+from app.models.database import Streamer, ScanHistory, SearchQuery, get_database
+from app.services.tikapi_service import get_tikapi_service
+from app.services.statistics import cached_statistics
+from app.services.scan_writer import scan_writer
+from app.api.websocket import encode_message, manager
+from app.services.pagination import cached_count, paginate
+from app.services.export import export_streamers
+from app.services.sightings import streamer_timeline
+from app.services.streamer_queries import queries_for_streamer, streamers_for_query
+from app.services.tracing import tracer
 import logging
 import json
-import os
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients"""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending to websocket: {e}")
-                disconnected.append(connection)
-
-        # Remove disconnected clients
-        for connection in disconnected:
-            if connection in self.active_connections:
-                self.active_connections.remove(connection)
-
-
-manager = ConnectionManager()
-
-
 # Dependency to get database session
 def get_db():
-    db_url = os.getenv("DATABASE_URL", "sqlite:///./tiktok_monitor.db")
-    db_instance = Database(db_url)
-    session = db_instance.get_session()
+    session = get_database().get_session()
     try:
         yield session
     finally:
@@ -60,11 +34,13 @@ def get_db():
 
 
 @router.get("/api/streamers")
-async def get_streamers(
+def get_streamers(
     query: Optional[str] = Query(None, description="Filter by search query"),
     is_live: Optional[bool] = Query(None, description="Filter by live status"),
     limit: int = Query(100, ge=1, le=500),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Rows to skip (ignored when cursor is given)"),
+    cursor: Optional[str] = Query(None, description="next_cursor returned by the previous page"),
+    count: bool = Query(True, description="Include the (cached) total count"),
     db: Session = Depends(get_db)
 ):
     """Get list of streamers with optional filters"""
@@ -73,25 +49,26 @@ async def get_streamers(
         db_query = db.query(Streamer)
 
         if query:
-            db_query = db_query.filter(Streamer.query == query)
+            # Every streamer the query ever found, not only its latest query
+            db_query = db_query.filter(Streamer.id.in_(streamers_for_query(query)))
 
         if is_live is not None:
             db_query = db_query.filter(Streamer.is_live == is_live)
 
-        # Order by last seen (most recent first)
-        db_query = db_query.order_by(desc(Streamer.last_seen))
-
-        # Get total count
-        total = db_query.count()
+        # Total count, cached per filter combination
+        total = cached_count(("streamers", query, is_live), db_query.count) if count else None
 
-        # Apply pagination
-        streamers = db_query.offset(offset).limit(limit).all()
+        # Most recent first, keyset pagination on (last_seen, id)
+        streamers, next_cursor = paginate(
+            db_query, Streamer.last_seen, Streamer.id, limit, cursor=cursor, offset=offset
+        )
 
         return {
             "success": True,
             "total": total,
             "limit": limit,
             "offset": offset,
+            "next_cursor": next_cursor,
             "data": [streamer.to_dict() for streamer in streamers]
         }
     except Exception as e:
@@ -102,15 +79,36 @@ async def get_streamers(
         }
 
 
+@router.get("/api/streamers/export")
+def export_streamers_endpoint(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    query: Optional[str] = Query(None, description="Filter by search query"),
+    is_live: Optional[bool] = Query(None, description="Filter by live status"),
+    gzip: bool = Query(False, description="Gzip the file"),
+):
+    """Stream every matching streamer as NDJSON or CSV (declared before /{username})"""
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    filename = f"streamers.{format}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        export_streamers(format, query=query, is_live=is_live, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/api/streamers/{username}")
-async def get_streamer(username: str, db: Session = Depends(get_db)):
+def get_streamer(username: str, db: Session = Depends(get_db)):
     """Get specific streamer by username"""
     try:
         streamer = db.query(Streamer).filter(Streamer.username == username).first()
         if streamer:
             return {
                 "success": True,
-                "data": streamer.to_dict()
+                "data": {**streamer.to_dict(), "queries": queries_for_streamer(db, streamer.id)}
             }
         else:
             return {
@@ -125,64 +123,49 @@ async def get_streamer(username: str, db: Session = Depends(get_db)):
         }
 
 
+@router.get("/api/streamers/{username}/timeline")
+def get_streamer_timeline(
+    username: str,
+    hours: int = Query(24 * 7, ge=1, le=24 * 365, description="Timeline for last N hours"),
+    bucket: Optional[str] = Query(None, pattern="^(hour|day)$", description="Aggregate per hour or day"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """Get the sighting history of a streamer, newest first"""
+    try:
+        streamer_id = db.query(Streamer.id).filter(Streamer.username == username).scalar()
+        if streamer_id is None:
+            return {
+                "success": False,
+                "error": "Streamer not found"
+            }
+
+        since = datetime.utcnow() - timedelta(hours=hours)
+        return {
+            "success": True,
+            "username": username,
+            "hours": hours,
+            "bucket": bucket,
+            "data": streamer_timeline(db, streamer_id, since, bucket=bucket, limit=limit)
+        }
+    except Exception as e:
+        logger.error(f"Error getting streamer timeline: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
 @router.get("/api/statistics")
-async def get_statistics(
+def get_statistics(
     hours: int = Query(24, description="Statistics for last N hours"),
     db: Session = Depends(get_db)
 ):
     """Get statistics about scraping activity"""
     try:
-        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-
-        # Total streamers
-        total_streamers = db.query(Streamer).count()
-        live_streamers = db.query(Streamer).filter(Streamer.is_live == True).count()
-
-        # Recent scans
-        recent_scans = db.query(ScanHistory).filter(
-            ScanHistory.timestamp >= cutoff_time
-        ).count()
-
-        successful_scans = db.query(ScanHistory).filter(
-            ScanHistory.timestamp >= cutoff_time,
-            ScanHistory.success == True
-        ).count()
-
-        failed_scans = db.query(ScanHistory).filter(
-            ScanHistory.timestamp >= cutoff_time,
-            ScanHistory.success == False
-        ).count()
-
-        # Streamers by query
-        streamers_by_query = db.query(
-            Streamer.query,
-            func.count(Streamer.id).label('count')
-        ).group_by(Streamer.query).all()
-
-        # Top streamers by times seen
-        top_streamers = db.query(Streamer).order_by(
-            desc(Streamer.times_seen)
-        ).limit(10).all()
-
-        # Recent scan history
-        scan_history = db.query(ScanHistory).filter(
-            ScanHistory.timestamp >= cutoff_time
-        ).order_by(desc(ScanHistory.timestamp)).limit(20).all()
-
         return {
             "success": True,
-            "data": {
-                "total_streamers": total_streamers,
-                "live_streamers": live_streamers,
-                "recent_scans": recent_scans,
-                "successful_scans": successful_scans,
-                "failed_scans": failed_scans,
-                "streamers_by_query": [
-                    {"query": q, "count": c} for q, c in streamers_by_query
-                ],
-                "top_streamers": [s.to_dict() for s in top_streamers],
-                "scan_history": [s.to_dict() for s in scan_history]
-            }
+            "data": cached_statistics(db, hours)
         }
     except Exception as e:
         logger.error(f"Error getting statistics: {e}")
@@ -193,10 +176,10 @@ async def get_statistics(
 
 
 @router.get("/api/queries")
-async def get_queries(db: Session = Depends(get_db)):
+def get_queries(db: Session = Depends(get_db)):
     """Get all unique search queries"""
     try:
-        queries = db.query(Streamer.query).distinct().all()
+        queries = db.query(SearchQuery.text).order_by(SearchQuery.text).all()
         return {
             "success": True,
             "data": [q[0] for q in queries]
@@ -210,23 +193,29 @@ async def get_queries(db: Session = Depends(get_db)):
 
 
 @router.get("/api/scan-history")
-async def get_scan_history(
+def get_scan_history(
     limit: int = Query(50, ge=1, le=200),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Rows to skip (ignored when cursor is given)"),
+    cursor: Optional[str] = Query(None, description="next_cursor returned by the previous page"),
+    count: bool = Query(True, description="Include the (cached) total count"),
     db: Session = Depends(get_db)
 ):
     """Get scan history"""
     try:
-        total = db.query(ScanHistory).count()
-        scans = db.query(ScanHistory).order_by(
-            desc(ScanHistory.timestamp)
-        ).offset(offset).limit(limit).all()
+        db_query = db.query(ScanHistory)
+        total = cached_count(("scan_history",), db_query.count) if count else None
+
+        # Most recent first, keyset pagination on (timestamp, id)
+        scans, next_cursor = paginate(
+            db_query, ScanHistory.timestamp, ScanHistory.id, limit, cursor=cursor, offset=offset
+        )
 
         return {
             "success": True,
             "total": total,
             "limit": limit,
             "offset": offset,
+            "next_cursor": next_cursor,
             "data": [scan.to_dict() for scan in scans]
         }
     except Exception as e:
@@ -237,19 +226,58 @@ async def get_scan_history(
         }
 
 
+@router.get("/api/traces/slow")
+def get_slow_traces(limit: int = Query(20, ge=1, le=200)):
+    """Most recent traces slower than TRACE_SLOW_SECONDS, with their span breakdown"""
+    return {
+        "success": True,
+        "slow_threshold": tracer.slow_threshold,
+        "data": tracer.slow(limit)
+    }
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time updates"""
+    """
+    WebSocket endpoint for real-time updates
+
+    Besides "ping", clients send JSON commands:
+    {"action": "subscribe", "query": ..., "ops": [...], "since": seq}
+    starts (or changes) the stream of streamer deltas.
+    """
     await manager.connect(websocket)
     try:
         while True:
             # Keep connection alive and receive messages
             data = await websocket.receive_text()
-            logger.info(f"Received WebSocket message: {data}")
+            logger.debug(f"Received WebSocket message: {data}")
 
-            # Echo back or handle specific commands
+            # Replies go through the client's queue so they never
+            # interleave with broadcasts
             if data == "ping":
-                await websocket.send_json({"type": "pong"})
+                await manager.send(websocket, {"type": "pong"})
+                continue
+
+            try:
+                command = json.loads(data)
+            except ValueError:
+                command = None
+            if not isinstance(command, dict):
+                await manager.send(websocket, {"type": "error", "error": "Unknown command"})
+                continue
+
+            if command.get("action") == "subscribe":
+                since = command.get("since")
+                await manager.subscribe(
+                    websocket,
+                    query=command.get("query"),
+                    ops=command.get("ops"),
+                    since=since if isinstance(since, int) else None
+                )
+            elif command.get("action") == "unsubscribe":
+                manager.unsubscribe(websocket)
+            else:
+                await manager.send(websocket, {"type": "error", "error": f"Unknown action: {command.get('action')}"})
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -262,72 +290,41 @@ async def websocket_endpoint(websocket: WebSocket):
 @router.post("/api/search-live")
 async def search_live_streamers(
     query: str = Query(..., description="Search query"),
-    db: Session = Depends(get_db)
+    max_age: Optional[int] = Query(None, ge=0, description="Accept cached results up to N seconds old (0 = fresh)"),
+    hops: int = Query(1, ge=1, le=5, description="Recommendation hops to follow (1 = direct recommendations only)"),
+    call_budget: Optional[int] = Query(None, ge=1, le=200, description="Max TikAPI calls when hops > 1")
 ):
     """
     Buscar streamers en vivo en tiempo real usando TikAPI y guardar en BD
     """
     try:
-        from app.services.tikapi_service import TikAPIService
-        from datetime import datetime
-
-        api_key = os.getenv("TIKAPI_KEY")
-        account_key = os.getenv("TIKAPI_ACCOUNT_KEY")
+        service = get_tikapi_service()
 
-        if not api_key or not account_key:
+        if service is None:
             return {
                 "success": False,
                 "error": "TikAPI credentials not configured"
             }
 
-        service = TikAPIService(api_key=api_key, account_key=account_key)
-        usernames = service.search_live_streamers(query)
-
-        # Save streamers to database
-        streamers_data = []
-        for username in usernames:
-            existing = db.query(Streamer).filter(
-                Streamer.username == username
-            ).first()
-
-            if existing:
-                # Update existing streamer
-                existing.last_seen = datetime.utcnow()
-                existing.times_seen += 1
-                existing.is_live = True
-                existing.query = query
-                streamers_data.append(existing.to_dict())
-            else:
-                # Create new streamer
-                new_streamer = Streamer(
-                    username=username,
-                    query=query,
-                    viewers=0,
-                    first_seen=datetime.utcnow(),
-                    last_seen=datetime.utcnow(),
-                    times_seen=1,
-                    is_live=True
-                )
-                db.add(new_streamer)
-                db.flush()  # Get the ID
-                streamers_data.append(new_streamer.to_dict())
-
-        # Record scan history
-        scan = ScanHistory(
-            timestamp=datetime.utcnow(),
-            query=query,
-            streamers_found=len(usernames),
-            success=True
-        )
-        db.add(scan)
-        db.commit()
+        expansion = None
+        if hops > 1:
+            records, expansion = await run_in_threadpool(
+                service.expand_live_graph, query, hops, call_budget, None, max_age
+            )
+        else:
+            records = await service.search_live_records_async(query, max_age)
+        usernames = [record.display_id for record in records]
+
+        # The scan writer stores it with other pending scans in one transaction
+        streamers_data = await scan_writer.submit(query, records)
 
         return {
             "success": True,
             "query": query,
             "total": len(usernames),
             "streamers": usernames,
-            "streamers_data": streamers_data
+            "streamers_data": streamers_data,
+            "expansion": expansion
         }
     except Exception as e:
         logger.error(f"Error searching live streamers: {e}")
@@ -337,6 +334,65 @@ async def search_live_streamers(
         }
 
 
+async def _search_live_events(service, query: str, max_age: Optional[int]):
+    """NDJSON events of a progressive search, ending with the stored rows"""
+    records = []
+    try:
+        async for step in iterate_in_threadpool(service.iter_live_records(query, max_age)):
+            records.extend(step.records)
+            yield encode_message({
+                "type": "recommendations" if step.stage == "recommendations" else "search",
+                "cached": step.stage == "cached",
+                "room_id": step.room_id,
+                "rooms_done": step.rooms_done,
+                "rooms_total": step.rooms_total,
+                "total": len(records),
+                "streamers": [
+                    {"username": record.display_id, "viewers": record.viewers, "room_id": record.room_id}
+                    for record in step.records
+                ]
+            }) + "\n"
+
+        streamers_data = await scan_writer.submit(query, records)
+        yield encode_message({
+            "type": "done",
+            "success": True,
+            "query": query,
+            "total": len(records),
+            "streamers": [record.display_id for record in records],
+            "streamers_data": streamers_data
+        }) + "\n"
+    except Exception as e:
+        logger.error(f"Error streaming live search: {e}")
+        yield encode_message({"type": "error", "success": False, "error": str(e)}) + "\n"
+
+
+@router.post("/api/search-live/stream")
+async def search_live_stream(
+    query: str = Query(..., description="Search query"),
+    max_age: Optional[int] = Query(None, ge=0, description="Accept cached results up to N seconds old (0 = fresh)")
+):
+    """
+    Buscar streamers en vivo emitiendo resultados a medida que llegan (NDJSON)
+
+    Emite los resultados de la busqueda directa en cuanto TikAPI responde,
+    luego las recomendaciones de cada sala segun van terminando y, al final,
+    los streamers guardados en BD.
+    """
+    service = get_tikapi_service()
+    if service is None:
+        return {
+            "success": False,
+            "error": "TikAPI credentials not configured"
+        }
+
+    return StreamingResponse(
+        _search_live_events(service, query, max_age),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 async def broadcast_update(message_type: str, data: dict):
     """
     Helper function to broadcast updates to all WebSocket clients
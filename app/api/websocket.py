@@ -0,0 +1,260 @@
+"""
+WebSocket connection manager: concurrent, backpressured broadcasts
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from fastapi import WebSocket
+from app.services.live_feed import live_feed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_message(message: dict) -> str:
+    """Serialize a message once for every client"""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message)
+
+
+DELTA_OPS = ("new", "updated", "offline")
+
+
+class Subscription:
+    """Which streamer deltas a client wants"""
+
+    def __init__(self, query: Optional[str] = None, ops: Optional[List[str]] = None):
+        """
+        Args:
+            query: Only deltas of scans for this query (offline deltas always pass)
+            ops: Delta kinds to receive (default: all of DELTA_OPS)
+        """
+        self.query = query or None
+        self.ops = tuple(op for op in DELTA_OPS if op in ops) if ops else DELTA_OPS
+
+    @property
+    def key(self) -> Tuple:
+        """Clients with equal keys receive the same serialized message"""
+        return (self.query, self.ops)
+
+    def matches(self, delta: dict) -> bool:
+        """Whether a delta passes this subscription"""
+        if delta["op"] not in self.ops:
+            return False
+        return self.query is None or delta["op"] == "offline" or delta["query"] == self.query
+
+
+class Client:
+    """A connected WebSocket with its bounded outbound queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.subscription: Optional[Subscription] = None
+        self.dropped = 0
+
+
+class ConnectionManager:
+    """
+    Tracks WebSocket clients and fans messages out to them
+
+    A broadcast serializes the message once and only enqueues it: each
+    client has its own sender task and a bounded queue, so a slow client
+    never delays the others. When a client's queue is full the oldest
+    queued message is dropped (the newest state wins), and a client whose
+    send does not finish within send_timeout is disconnected.
+
+    Clients that subscribed to streamer deltas cannot lose one silently:
+    on overflow their queue, and the message that overflowed it, are
+    replaced by a single "resync_required" telling them to reload.
+    """
+
+    def __init__(self, queue_size: Optional[int] = None, send_timeout: Optional[float] = None):
+        """
+        Args:
+            queue_size: Messages queued per client (default: WS_CLIENT_QUEUE_SIZE or 64)
+            send_timeout: Seconds a send may take before the client is evicted
+                (default: WS_SEND_TIMEOUT or 10)
+        """
+        self.queue_size = queue_size if queue_size is not None else int(os.getenv("WS_CLIENT_QUEUE_SIZE", "64"))
+        self.send_timeout = (
+            send_timeout if send_timeout is not None else float(os.getenv("WS_SEND_TIMEOUT", "10"))
+        )
+        self.clients: Dict[WebSocket, Client] = {}
+
+        self.broadcasts = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    @property
+    def active_connections(self) -> int:
+        """Number of connected clients"""
+        return len(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        """Accept a WebSocket and start its sender task"""
+        await websocket.accept()
+        client = Client(websocket, self.queue_size)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
+        logger.info(f"WebSocket connected. Total connections: {len(self.clients)}")
+
+    def disconnect(self, websocket: WebSocket):
+        """Forget a client and stop its sender; safe to call more than once"""
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.clients)}")
+
+    def _enqueue(self, client: Client, text: str):
+        """Queue a serialized message, making room if the queue is full"""
+        try:
+            client.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if client.subscription is None:
+            client.queue.get_nowait()
+            client.dropped += 1
+            self.dropped += 1
+        else:
+            # The reload covers this message too, and with a queue of one
+            # there would be no room left for it
+            dropped = client.queue.qsize() + 1
+            while not client.queue.empty():
+                client.queue.get_nowait()
+            client.queue.put_nowait(encode_message({"type": "resync_required", "seq": live_feed.seq}))
+            client.dropped += dropped
+            self.dropped += dropped
+            return
+        client.queue.put_nowait(text)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for one client"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, encode_message(message))
+
+    async def broadcast(self, message: dict):
+        """Queue a message for every connected client"""
+        if not self.clients:
+            return
+        text = encode_message(message)
+        for client in list(self.clients.values()):
+            self._enqueue(client, text)
+        self.broadcasts += 1
+
+    def publish_deltas(self, seq: int, deltas: List[dict]):
+        """
+        Queue a batch of streamer deltas for every subscribed client
+
+        Each distinct subscription filters and serializes the batch once.
+        Called on the event loop by the live feed.
+        """
+        encoded: Dict[Tuple, Optional[str]] = {}
+        for client in list(self.clients.values()):
+            subscription = client.subscription
+            if subscription is None:
+                continue
+            if subscription.key not in encoded:
+                matching = [delta for delta in deltas if subscription.matches(delta)]
+                encoded[subscription.key] = (
+                    encode_message({"type": "deltas", "seq": seq, "deltas": matching}) if matching else None
+                )
+            text = encoded[subscription.key]
+            if text is not None:
+                self._enqueue(client, text)
+
+    async def subscribe(
+        self,
+        websocket: WebSocket,
+        query: Optional[str] = None,
+        ops: Optional[List[str]] = None,
+        since: Optional[int] = None
+    ):
+        """
+        Set a client's delta subscription, replaying what it missed
+
+        Args:
+            websocket: Client socket
+            query: Only deltas of scans for this query
+            ops: Delta kinds to receive (default: all)
+            since: Last sequence number the client applied; batches after it
+                are replayed, or the client is told to reload when they are
+                no longer buffered
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        subscription = Subscription(query, ops)
+
+        # No await from here on: nothing can be published in between
+        client.subscription = subscription
+        if since is not None:
+            batches = live_feed.since(since)
+            if batches is None:
+                self._enqueue(client, encode_message({"type": "resync_required", "seq": live_feed.seq}))
+            else:
+                for seq, deltas in batches:
+                    matching = [delta for delta in deltas if subscription.matches(delta)]
+                    if matching:
+                        self._enqueue(client, encode_message({"type": "deltas", "seq": seq, "deltas": matching}))
+        self._enqueue(client, encode_message({"type": "subscribed", "seq": live_feed.seq}))
+
+    def unsubscribe(self, websocket: WebSocket):
+        """Stop sending streamer deltas to a client"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.subscription = None
+
+    async def _sender(self, client: Client):
+        """Deliver one client's queue in order; evict it if a send stalls or fails"""
+        try:
+            while True:
+                text = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(text), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.evicted += 1
+            logger.warning(f"Evicting WebSocket client: send took longer than {self.send_timeout}s")
+            self.disconnect(client.websocket)
+            await self._close(client.websocket)
+        except Exception as e:
+            logger.error(f"Error sending to websocket: {e}")
+            self.disconnect(client.websocket)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        """Close an evicted socket, ignoring errors from a dead connection"""
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), 1)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict:
+        """Connection and delivery counters"""
+        return {
+            "connections": len(self.clients),
+            "subscribed": sum(1 for client in self.clients.values() if client.subscription is not None),
+            "queue_size": self.queue_size,
+            "send_timeout": self.send_timeout,
+            "queued": sum(client.queue.qsize() for client in self.clients.values()),
+            "broadcasts": self.broadcasts,
+            "dropped": self.dropped,
+            "evicted": self.evicted
+        }
+
+
+manager = ConnectionManager()
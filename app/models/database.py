@@ -1,11 +1,21 @@
 """
 Database models for TikTok Live Monitor
 """
+import logging
+import os
+import threading
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean
+from typing import Optional
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import (
+    create_engine, event, inspect, Column, Integer, String, DateTime, Boolean, ForeignKey, Index, UniqueConstraint
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 
@@ -22,6 +32,15 @@ class Streamer(Base):
     times_seen = Column(Integer, default=1)
     is_live = Column(Boolean, default=True)
 
+    __table_args__ = (
+        # Live-status sweeps and the is_live filter on /api/streamers
+        Index("ix_streamers_is_live_last_seen", "is_live", "last_seen"),
+        # Keyset pagination of /api/streamers
+        Index("ix_streamers_last_seen_id", "last_seen", "id"),
+        # Top streamers in /api/statistics
+        Index("ix_streamers_times_seen", "times_seen"),
+    )
+
     def to_dict(self):
         """Convert model to dictionary"""
         return {
@@ -47,6 +66,11 @@ class ScanHistory(Base):
     success = Column(Boolean, default=True)
     error_message = Column(String, nullable=True)
 
+    __table_args__ = (
+        # Keyset pagination of /api/scan-history
+        Index("ix_scan_history_timestamp_id", "timestamp", "id"),
+    )
+
     def to_dict(self):
         """Convert model to dictionary"""
         return {
@@ -59,19 +83,172 @@ class ScanHistory(Base):
         }
 
 
+class ScanRollup(Base):
+    """Hourly per-query scan metrics, maintained incrementally by the write path"""
+    __tablename__ = "scan_rollups_hourly"
+
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(DateTime, nullable=False)  # Start of the hour (UTC)
+    query = Column(String, nullable=False)
+    scans = Column(Integer, default=0, nullable=False)
+    successful_scans = Column(Integer, default=0, nullable=False)
+    failed_scans = Column(Integer, default=0, nullable=False)
+    streamers_found = Column(Integer, default=0, nullable=False)
+    new_streamers = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "query", name="uq_scan_rollups_bucket_query"),
+    )
+
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "bucket": self.bucket.isoformat() if self.bucket else None,
+            "query": self.query,
+            "scans": self.scans,
+            "successful_scans": self.successful_scans,
+            "failed_scans": self.failed_scans,
+            "streamers_found": self.streamers_found,
+            "new_streamers": self.new_streamers
+        }
+
+
+class SearchQuery(Base):
+    """Interned search query strings, referenced by id from high-volume tables"""
+    __tablename__ = "queries"
+
+    id = Column(Integer, primary_key=True)
+    text = Column(String, unique=True, nullable=False)
+
+
+class StreamerQuery(Base):
+    """Which queries found each streamer, with per-query counts"""
+    __tablename__ = "streamer_queries"
+
+    streamer_id = Column(Integer, ForeignKey("streamers.id"), primary_key=True)
+    query_id = Column(Integer, ForeignKey("queries.id"), primary_key=True)
+    first_seen = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_seen = Column(DateTime, default=datetime.utcnow, nullable=False)
+    times_seen = Column(Integer, default=1, nullable=False)
+
+    __table_args__ = (
+        # Filter-by-query and per-query counts read only this index
+        Index("ix_streamer_queries_query_streamer", "query_id", "streamer_id"),
+    )
+
+
+class Sighting(Base):
+    """One streamer seen by one scan (append-only)"""
+    __tablename__ = "sightings"
+
+    id = Column(Integer, primary_key=True)
+    streamer_id = Column(Integer, ForeignKey("streamers.id"), nullable=False)
+    scan_id = Column(Integer, nullable=True)  # scan_history.id; history is pruned independently
+    query_id = Column(Integer, ForeignKey("queries.id"), nullable=False)
+    seen_at = Column(Integer, nullable=False)  # Unix epoch seconds (UTC), compact on disk
+    viewers = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        # Per-streamer timelines are index range scans
+        Index("ix_sightings_streamer_seen_at", "streamer_id", "seen_at"),
+    )
+
+
+DEFAULT_DATABASE_URL = "sqlite:///./tiktok_monitor.db"
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "alembic.ini")
+# Revision matching the schema create_all produced before migrations existed
+BASELINE_REVISION = "0001"
+
+# Pragmas applied to every new SQLite connection. auto_vacuum only takes
+# effect on a new database (it must precede WAL); it lets the retention job
+# return freed pages with PRAGMA incremental_vacuum.
+SQLITE_PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection for concurrent readers and one writer"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
 class Database:
     """Database manager class"""
 
-    def __init__(self, database_url: str = "sqlite:///./tiktok_monitor.db"):
-        self.engine = create_engine(
-            database_url,
-            connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
-        )
+    def __init__(
+        self,
+        database_url: str = DEFAULT_DATABASE_URL,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        pool_pre_ping: Optional[bool] = None
+    ):
+        """
+        Create the engine and session factory
+
+        Args:
+            database_url: SQLAlchemy database URL
+            pool_size: Connections kept in the pool (default: DB_POOL_SIZE or 5)
+            max_overflow: Extra connections allowed under load (default: DB_MAX_OVERFLOW or 10)
+            pool_pre_ping: Check connections before use (default: DB_POOL_PRE_PING or true)
+        """
+        self.database_url = database_url
+        is_sqlite = database_url.startswith("sqlite")
+        is_memory = is_sqlite and (":memory:" in database_url or database_url.rstrip("/") == "sqlite:")
+
+        engine_kwargs = {
+            "pool_pre_ping": (
+                pool_pre_ping if pool_pre_ping is not None
+                else os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+            )
+        }
+        if not is_memory:
+            engine_kwargs["pool_size"] = pool_size if pool_size is not None else int(os.getenv("DB_POOL_SIZE", "5"))
+            engine_kwargs["max_overflow"] = (
+                max_overflow if max_overflow is not None else int(os.getenv("DB_MAX_OVERFLOW", "10"))
+            )
+        if is_sqlite:
+            engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+        self.engine = create_engine(database_url, **engine_kwargs)
+        if is_sqlite and not is_memory:
+            event.listen(self.engine, "connect", _set_sqlite_pragmas)
+
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
 
-    def create_tables(self):
-        """Create all tables in the database"""
-        Base.metadata.create_all(bind=self.engine)
+    def create_tables(self, bind=None):
+        """Create all tables in the database, and any indexes missing from existing tables"""
+        bind = bind if bind is not None else self.engine
+        Base.metadata.create_all(bind=bind)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=bind, checkfirst=True)
+
+    def migrate(self):
+        """
+        Upgrade the schema to the latest Alembic revision
+
+        Databases created with create_tables() before migrations existed are
+        completed (missing tables and indexes), stamped with the baseline
+        revision and then upgraded like any other.
+        """
+        config = Config(ALEMBIC_INI)
+        with self.engine.begin() as connection:
+            config.attributes["connection"] = connection
+            tables = inspect(connection).get_table_names()
+            if "streamers" in tables and "alembic_version" not in tables:
+                logger.info(f"Stamping existing database with baseline revision {BASELINE_REVISION}")
+                self.create_tables(bind=connection)
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
 
     def get_session(self):
         """Get a new database session"""
@@ -85,3 +262,42 @@ class Database:
     def close_session(self, db):
         """Close a database session"""
         db.close()
+
+    def dispose(self):
+        """Close all pooled connections"""
+        self.engine.dispose()
+
+
+_database: Optional[Database] = None
+_database_lock = threading.Lock()
+
+
+def init_database(database_url: Optional[str] = None) -> Database:
+    """
+    Initialize the process-wide Database (engine and connection pool)
+
+    Args:
+        database_url: SQLAlchemy database URL (default: DATABASE_URL)
+
+    Returns:
+        The shared Database instance
+    """
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database(database_url or os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL))
+        return _database
+
+
+def get_database() -> Database:
+    """Get the shared Database, initializing it on first use"""
+    return _database if _database is not None else init_database()
+
+
+def close_database():
+    """Dispose of the shared Database, if it was initialized"""
+    global _database
+    with _database_lock:
+        if _database is not None:
+            _database.dispose()
+            _database = None
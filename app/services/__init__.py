@@ -1,5 +1,5 @@
 """Services package"""
 from .scraper import run_scraper_job
-from .tikapi_service import TikAPIService
+from .tikapi_service import TikAPIService, get_tikapi_service
 
-__all__ = ["run_scraper_job", "TikAPIService"]
+__all__ = ["run_scraper_job", "TikAPIService", "get_tikapi_service"]
@@ -0,0 +1,184 @@
+"""
+In-memory result caches with LRU and TTL eviction
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a TTL
+
+    Concurrent get_or_compute calls for the same missing key are coalesced:
+    the first caller computes the value and the others wait for its result.
+    invalidate() bumps the generation of its key and clear() the generation
+    of the whole cache, so a value computed from data read before the
+    invalidation is returned but never stored. Invalidating one key leaves
+    the computations of other keys alone.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        """
+        Args:
+            maxsize: Maximum number of entries kept (least recently used go first)
+            ttl: Seconds an entry stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._pending: Dict[Hashable, Future] = {}
+        self._generation = 0
+        # Per-key generations of keys invalidated while being computed,
+        # until the next clear()
+        self._key_generations: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key: Hashable, max_age: Optional[float]):
+        """Return (found, value); must be called with the lock held"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        stored_at, value = entry
+        age = time.monotonic() - stored_at
+        if age >= self.ttl:
+            del self._entries[key]
+            return False, None
+        if max_age is not None and age > max_age:
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any):
+        """Insert an entry and evict the oldest ones; lock must be held"""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+            max_age: Only accept entries younger than this many seconds
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            found, value = self._lookup(key, max_age)
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value"""
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Any],
+        max_age: Optional[float] = None,
+        cache_if: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Get a cached value, computing and storing it on a miss
+
+        Exceptions raised by compute are propagated to every waiting caller
+        and nothing is cached.
+
+        Args:
+            key: Cache key
+            compute: Zero-argument callable producing the value
+            max_age: Only accept entries younger than this many seconds
+            cache_if: Store the computed value only if this returns True for
+                it; waiting callers get the value either way
+
+        Returns:
+            The cached or freshly computed value
+        """
+        with self._lock:
+            found, value = self._lookup(key, max_age)
+            if found:
+                self.hits += 1
+                return value
+
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                self.misses += 1
+                pending = Future()
+                self._pending[key] = pending
+                generation = (self._generation, self._key_generations.get(key, 0))
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return pending.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._forget_pending(key, pending)
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            # Skip the store if the key or the cache was invalidated while computing
+            current = (self._generation, self._key_generations.get(key, 0))
+            if generation == current and (cache_if is None or cache_if(value)):
+                self._store(key, value)
+            self._forget_pending(key, pending)
+        pending.set_result(value)
+        return value
+
+    def _forget_pending(self, key: Hashable, pending: Future):
+        """Remove a finished computation unless a newer one replaced it; lock must be held"""
+        if self._pending.get(key) is pending:
+            del self._pending[key]
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry; a computation of this key in flight will not be stored"""
+        with self._lock:
+            # Without a pending computation there is nothing to outdate: any
+            # unregistered one in flight was already invalidated
+            if key in self._pending:
+                self._key_generations[key] = self._key_generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+            self._pending.pop(key, None)
+
+    def clear(self):
+        """Drop every entry; computations in flight will not be stored"""
+        with self._lock:
+            self._generation += 1
+            self._key_generations.clear()
+            self._entries.clear()
+            self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -0,0 +1,173 @@
+"""
+Scheduled multi-query crawler
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.services.scan_writer import scan_writer
+from app.services.tikapi_service import get_tikapi_service, summarize_scrape
+
+logger = logging.getLogger(__name__)
+
+
+def parse_query_intervals(value: str) -> Dict[str, float]:
+    """
+    Parse per-query intervals in minutes, e.g. "gaming=10,music=2"
+
+    Args:
+        value: Comma separated query=minutes pairs
+
+    Returns:
+        Dictionary of query -> interval in minutes
+    """
+    intervals = {}
+    for pair in value.split(","):
+        if "=" not in pair:
+            continue
+        query, minutes = pair.split("=", 1)
+        try:
+            intervals[query.strip()] = float(minutes)
+        except ValueError:
+            logger.warning(f"Ignoring invalid interval for query '{query.strip()}': {minutes}")
+    return intervals
+
+
+class Crawler:
+    """
+    Runs due queries in parallel on every scheduler tick
+
+    Each query has its own interval (plus random jitter so queries do not all
+    fire together). A tick that starts while the previous cycle is still
+    running is skipped. Results are stored through the scan writer, which
+    batches them with concurrent searches: a cycle is not one transaction
+    of its own but shares writer batches of up to WRITE_BATCH_SIZE scans,
+    so a large cycle (or one that lands while a batch is filling) spans
+    several commits. Each scan is still written atomically.
+    """
+
+    def __init__(
+        self,
+        queries: List[str],
+        interval_minutes: float,
+        query_intervals: Optional[Dict[str, float]] = None,
+        jitter_seconds: float = 0,
+        max_concurrency: int = 4,
+        api_key: Optional[str] = None,
+        account_key: Optional[str] = None
+    ):
+        """
+        Args:
+            queries: Search queries to crawl
+            interval_minutes: Default interval between scans of a query
+            query_intervals: Per-query interval overrides in minutes
+            jitter_seconds: Random +/- offset applied to each next run
+            max_concurrency: Queries searched at the same time
+            api_key: TikAPI API key (default: TIKAPI_KEY)
+            account_key: TikAPI account key (default: TIKAPI_ACCOUNT_KEY)
+        """
+        self.queries = [query.strip() for query in queries if query.strip()]
+        self.interval_minutes = interval_minutes
+        self.query_intervals = query_intervals or {}
+        self.jitter_seconds = jitter_seconds
+        self.max_concurrency = max_concurrency
+        self.api_key = api_key
+        self.account_key = account_key
+
+        # Spread the first scans over the jitter window
+        now = time.monotonic()
+        self._next_due = {query: now + random.uniform(0, jitter_seconds) for query in self.queries}
+        self._running = False
+
+        self.cycles = 0
+        self.skipped_cycles = 0
+        self.last_cycle: Optional[Dict] = None
+
+    def interval_seconds(self, query: str) -> float:
+        """Interval between scans of a query, in seconds"""
+        return self.query_intervals.get(query, self.interval_minutes) * 60
+
+    def due_queries(self, now: Optional[float] = None) -> List[str]:
+        """Queries whose next scan time has passed"""
+        now = now if now is not None else time.monotonic()
+        return [query for query in self.queries if self._next_due[query] <= now]
+
+    def _schedule_next(self, queries: List[str], now: float):
+        """Set the next scan time of each query, with jitter"""
+        for query in queries:
+            jitter = random.uniform(-self.jitter_seconds, self.jitter_seconds)
+            self._next_due[query] = now + max(0.0, self.interval_seconds(query) + jitter)
+
+    def _fetch(self, queries: List[str]) -> List[tuple]:
+        """Search every query (blocking); returns (query, records, scanned_at, error) tuples"""
+        service = get_tikapi_service(self.api_key, self.account_key)
+        if service is None:
+            raise ValueError("TikAPI credentials (api_key and account_key) are required")
+        return service.fetch_queries(queries, max_concurrency=self.max_concurrency)
+
+    async def _scrape(self, queries: List[str]) -> Dict:
+        """Run one scrape cycle: search off the event loop, then store through the writer's batches"""
+        fetched = await asyncio.to_thread(self._fetch, queries)
+        rows = await scan_writer.submit_many(fetched)
+        return summarize_scrape(fetched, rows)
+
+    async def run_cycle(self) -> Optional[Dict]:
+        """
+        Scan every due query once
+
+        Returns:
+            Cycle report, or None if nothing was due or the cycle was skipped
+        """
+        if self._running:
+            self.skipped_cycles += 1
+            logger.warning("Previous crawl cycle still running, skipping this tick")
+            return None
+
+        queries = self.due_queries()
+        if not queries:
+            return None
+
+        self._running = True
+        started = time.monotonic()
+        try:
+            results = await self._scrape(queries)
+        finally:
+            self._running = False
+            self._schedule_next(queries, time.monotonic())
+
+        duration = time.monotonic() - started
+        self.cycles += 1
+        shortest_interval = min(self.interval_seconds(query) for query in queries)
+        report = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "queries": queries,
+            "duration_seconds": round(duration, 3),
+            "streamers_per_second": round(results["total_found"] / duration, 2) if duration else None,
+            "queries_per_minute": round(len(queries) * 60 / duration, 2) if duration else None,
+            "overran_interval": duration > shortest_interval,
+            "results": results
+        }
+        self.last_cycle = report
+
+        logger.info(
+            f"Crawl cycle: {len(queries)} queries, {results['total_found']} streamers "
+            f"({results['total_new']} new) in {duration:.1f}s"
+        )
+        if report["overran_interval"]:
+            logger.warning(
+                f"Crawl cycle took {duration:.1f}s, longer than the {shortest_interval:.0f}s interval; "
+                f"raise SCRAPE_CONCURRENCY or the query intervals"
+            )
+        return report
+
+    def stats(self) -> Dict:
+        """Crawler counters and the last cycle report"""
+        return {
+            "queries": len(self.queries),
+            "running": self._running,
+            "cycles": self.cycles,
+            "skipped_cycles": self.skipped_cycles,
+            "last_cycle": self.last_cycle
+        }
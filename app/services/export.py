@@ -0,0 +1,119 @@
+"""
+Streaming bulk export of streamers as NDJSON or CSV
+"""
+import csv
+import io
+import json
+import logging
+import os
+import zlib
+from typing import Iterator, Optional, Sequence
+from sqlalchemy import select
+from app.models.database import Streamer, get_database
+from app.services.streamer_queries import streamers_for_query
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+EXPORT_COLUMNS = (
+    Streamer.id,
+    Streamer.username,
+    Streamer.query,
+    Streamer.viewers,
+    Streamer.first_seen,
+    Streamer.last_seen,
+    Streamer.times_seen,
+    Streamer.is_live,
+)
+_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+
+
+def _isoformat(value):
+    """ISO 8601 for datetimes, anything else unchanged"""
+    return value.isoformat() if value is not None and hasattr(value, "isoformat") else value
+
+
+def _ndjson_chunk(rows: Sequence) -> bytes:
+    """Encode rows as newline-delimited JSON objects"""
+    if orjson is not None:
+        return b"".join(
+            orjson.dumps(dict(zip(_FIELDS, row))) + b"\n" for row in rows
+        )
+    return "".join(
+        json.dumps(dict(zip(_FIELDS, map(_isoformat, row)))) + "\n" for row in rows
+    ).encode()
+
+
+def _csv_chunk(rows: Sequence, header: bool = False) -> bytes:
+    """Encode rows as CSV lines"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(_FIELDS)
+    writer.writerows([_isoformat(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def export_streamers(
+    fmt: str = "ndjson",
+    query: Optional[str] = None,
+    is_live: Optional[bool] = None,
+    compress: bool = False,
+    chunk_rows: int = EXPORT_CHUNK_ROWS
+) -> Iterator[bytes]:
+    """
+    Stream every matching streamer in id order
+
+    Rows are read from a server-side cursor chunk_rows at a time and encoded
+    as they arrive, so memory use does not depend on the number of rows. The
+    generator owns its session and closes it when exhausted or closed.
+
+    Args:
+        fmt: "ndjson" or "csv"
+        query: Only streamers ever found with this query
+        is_live: Only live (True) or offline (False) streamers
+        compress: Gzip the output
+        chunk_rows: Rows fetched and encoded per chunk
+
+    Yields:
+        Encoded (and optionally gzipped) chunks
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    stmt = select(*EXPORT_COLUMNS).order_by(Streamer.id)
+    if query:
+        stmt = stmt.where(Streamer.id.in_(streamers_for_query(query)))
+    if is_live is not None:
+        stmt = stmt.where(Streamer.is_live.is_(is_live))
+
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = gzip container
+    session = get_database().get_session()
+    exported = 0
+    try:
+        if fmt == "csv":
+            header = _csv_chunk([], header=True)
+            yield compressor.compress(header) if compressor else header
+
+        result = session.execute(stmt, execution_options={"yield_per": chunk_rows})
+        for rows in result.partitions():
+            chunk = _ndjson_chunk(rows) if fmt == "ndjson" else _csv_chunk(rows)
+            exported += len(rows)
+            if compressor:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+        if compressor:
+            yield compressor.flush()
+        logger.info(f"Exported {exported} streamers as {fmt}{' (gzip)' if compress else ''}")
+    finally:
+        session.close()
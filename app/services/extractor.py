@@ -0,0 +1,135 @@
+"""
+Single-pass extraction of TikAPI live search and recommend responses
+"""
+import json
+import logging
+from typing import List, NamedTuple, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+class LiveRecord(NamedTuple):
+    """One live stream found in a TikAPI response"""
+    display_id: str
+    room_id: Optional[str] = None
+    viewers: int = 0
+    title: Optional[str] = None
+
+
+class SearchResult(NamedTuple):
+    """Parsed live search response"""
+    records: List[LiveRecord]
+    room_ids: List[str]
+
+
+def _loads(payload: Union[bytes, str]):
+    """Decode a JSON payload with the fastest available backend"""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def response_payload(response) -> Union[bytes, str]:
+    """Raw body of a TikAPI response, preferring bytes to skip text decoding"""
+    content = getattr(response, "content", None)
+    return content if content is not None else response.text
+
+
+def _viewers(info: dict) -> int:
+    """Viewer count of a live room, 0 if not reported"""
+    viewers = info.get("user_count")
+    if viewers is None:
+        viewers = (info.get("stats") or {}).get("user_count")
+    try:
+        return int(viewers or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _room_id(info: dict) -> Optional[str]:
+    """Room ID of a live room object, if present"""
+    room_id = info.get("id_str") or info.get("id")
+    return str(room_id) if room_id else None
+
+
+def parse_search_response(payload: Union[bytes, str]) -> SearchResult:
+    """
+    Parse a live search response in one pass
+
+    Args:
+        payload: Response body (bytes or text) from user.live.search
+
+    Returns:
+        SearchResult with one record per streamer and every room ID listed
+        in the owners' own_room, in response order
+    """
+    records = []
+    room_ids = []
+    try:
+        datos = _loads(payload)
+
+        for item in datos.get("data", []):
+            live_info = item.get("live_info") or {}
+            owner = live_info.get("owner") or {}
+            own_room_ids = (owner.get("own_room") or {}).get("room_ids") or []
+            room_ids.extend(str(room_id) for room_id in own_room_ids)
+
+            display_id = owner.get("display_id")
+            if display_id:
+                records.append(LiveRecord(
+                    display_id=str(display_id),
+                    room_id=_room_id(live_info) or (str(own_room_ids[0]) if own_room_ids else None),
+                    viewers=_viewers(live_info),
+                    title=live_info.get("title")
+                ))
+
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Error procesando el JSON de búsqueda: {e}")
+
+    return SearchResult(records=records, room_ids=room_ids)
+
+
+def parse_recommend_response(payload: Union[bytes, str]) -> List[LiveRecord]:
+    """
+    Parse a live recommend response in one pass
+
+    Args:
+        payload: Response body (bytes or text) from user.live.recommend
+
+    Returns:
+        List of recommended live records, in response order
+    """
+    records = []
+    try:
+        datos = _loads(payload)
+
+        for item in datos.get("data", []):
+            display_id = (item.get("owner") or {}).get("display_id")
+            if display_id:
+                records.append(LiveRecord(
+                    display_id=str(display_id),
+                    room_id=_room_id(item),
+                    viewers=_viewers(item),
+                    title=item.get("title")
+                ))
+
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Error procesando el JSON de recomendados: {e}")
+
+    return records
+
+
+def unique_records(records: List[LiveRecord]) -> List[LiveRecord]:
+    """Drop repeated streamers, keeping the first record of each display ID"""
+    seen = {}
+    for record in records:
+        if record.display_id not in seen:
+            seen[record.display_id] = record
+    return list(seen.values())
@@ -0,0 +1,131 @@
+"""
+Sequenced feed of streamer changes, pushed to WebSocket clients
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Batch = Tuple[int, List[dict]]
+
+
+def sighting_deltas(rows: List[dict]) -> List[dict]:
+    """
+    Deltas for streamers stored by a scan
+
+    Args:
+        rows: Streamer dictionaries returned by record_scan
+
+    Returns:
+        One "new" or "updated" delta per streamer
+    """
+    deltas = []
+    for row in rows:
+        deltas.append({
+            "op": "new" if row["times_seen"] == 1 else "updated",
+            "id": row["id"],
+            "username": row["username"],
+            "query": row["query"],
+            "viewers": row["viewers"],
+            "times_seen": row["times_seen"],
+            "first_seen": row["first_seen"],
+            "last_seen": row["last_seen"]
+        })
+    return deltas
+
+
+def offline_deltas(streamers: List[Tuple[int, str]]) -> List[dict]:
+    """Deltas for (id, username) pairs the sweeper marked offline"""
+    return [{"op": "offline", "id": streamer_id, "username": username} for streamer_id, username in streamers]
+
+
+class LiveFeed:
+    """
+    Numbers batches of deltas and keeps the latest ones for resyncs
+
+    publish() may be called from any thread once the database transaction
+    has committed; delivery to the listener always happens on the event loop
+    given to attach(). A client that reconnects asks for everything after
+    the last sequence number it applied; since() returns None when those
+    batches already left the buffer and the client must reload instead.
+    """
+
+    def __init__(self, buffer_size: Optional[int] = None):
+        """
+        Args:
+            buffer_size: Batches kept for resyncs (default: WS_DELTA_BUFFER or 1000)
+        """
+        self.buffer_size = buffer_size if buffer_size is not None else int(os.getenv("WS_DELTA_BUFFER", "1000"))
+        # Numbering starts at the startup time in ms, so a sequence number
+        # from a previous run is never taken for one of this run
+        self.seq = int(time.time() * 1000)
+        self._buffer: deque = deque(maxlen=self.buffer_size)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[Callable[[int, List[dict]], None]] = None
+
+        self.published = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop, listener: Callable[[int, List[dict]], None]):
+        """Deliver future batches to listener(seq, deltas) on loop"""
+        self._loop = loop
+        self._listener = listener
+
+    def detach(self):
+        """Stop delivering batches"""
+        self._loop = None
+        self._listener = None
+
+    def publish(self, deltas: List[dict]) -> Optional[int]:
+        """
+        Number a batch of deltas, buffer it and hand it to the listener
+
+        Returns:
+            Sequence number of the batch, or None if there was nothing to publish
+        """
+        if not deltas:
+            return None
+        with self._lock:
+            self.seq += 1
+            seq = self.seq
+            self._buffer.append((seq, deltas))
+            self.published += len(deltas)
+            # Scheduling under the lock keeps delivery in sequence order
+            loop, listener = self._loop, self._listener
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(listener, seq, deltas)
+        return seq
+
+    def since(self, seq: int) -> Optional[List[Batch]]:
+        """
+        Batches published after seq
+
+        Returns:
+            The batches in order, or None if some were already dropped from
+            the buffer
+        """
+        with self._lock:
+            if seq == self.seq:
+                return []
+            if seq > self.seq or not self._buffer or self._buffer[0][0] > seq + 1:
+                return None
+            return [batch for batch in self._buffer if batch[0] > seq]
+
+    def stats(self) -> Dict:
+        """Sequence number and buffer usage"""
+        with self._lock:
+            return {
+                "seq": self.seq,
+                "buffered_batches": len(self._buffer),
+                "buffer_size": self.buffer_size,
+                "oldest_seq": self._buffer[0][0] if self._buffer else None,
+                "deltas_published": self.published
+            }
+
+
+live_feed = LiveFeed()
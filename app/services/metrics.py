@@ -0,0 +1,399 @@
+"""
+In-process metrics collectors rendered in the Prometheus text format
+"""
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+ROWS_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value) -> str:
+    """Escape a label value for the text format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    """Render {name="value",...}; extra is an already formatted pair such as le"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, using integers where exact"""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(ABC):
+    """Base class: a named family of samples keyed by label values"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values):
+        """Child for one combination of label values; cache it on hot paths"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child holding the samples of one combination of label values"""
+
+    def _default(self):
+        """The child of a metric without labels"""
+        return self.labels()
+
+    def render(self) -> List[str]:
+        """Text format lines, including HELP and TYPE"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    @abstractmethod
+    def _render_child(self, key: LabelValues, child) -> List[str]:
+        """Text format sample lines of one child"""
+
+
+class _Value:
+    """A single float behind a lock"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        """Increment the counter of a metric without labels"""
+        self._default().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _HistogramValue:
+    """Per-bucket counts (not cumulative until rendered), sum and count"""
+
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        """Observe the duration of the with block in seconds"""
+        return _Timer(self)
+
+
+class _Timer:
+    """Context manager behind time(); cheaper than a generator-based one"""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: _HistogramValue):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Observe a value on a metric without labels"""
+        self._default().observe(value)
+
+    def time(self):
+        """Time a with block on a metric without labels"""
+        return self._default().time()
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+Sample = Tuple[LabelValues, Optional[float]]
+
+
+class CallbackMetric:
+    """
+    Counter or gauge read from existing stats() at scrape time
+
+    Costs nothing on the hot path: the callback runs only when /metrics is
+    scraped and returns (label values, value) pairs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Sample]],
+        labelnames: Iterable[str] = (),
+        type: str = "gauge"
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.type = type
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, value in self.callback():
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(float(value))}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collects every metric for the /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric (replacing one with the same name) and return it"""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Sample]],
+        labelnames: Iterable[str] = (),
+        type: str = "gauge"
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, type))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Hot-path metrics
+
+TIKAPI_LATENCY = registry.histogram(
+    "tikapi_request_duration_seconds",
+    "TikAPI call latency, including rate limiter waits and 429 retries",
+    ["endpoint"]
+)
+TIKAPI_ERRORS = registry.counter(
+    "tikapi_errors_total",
+    "TikAPI calls that failed, by HTTP status (validation for SDK validation errors)",
+    ["endpoint", "status"]
+)
+SCAN_ROWS = registry.histogram(
+    "scan_rows_upserted",
+    "Streamers upserted per stored scan",
+    buckets=ROWS_BUCKETS
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"]
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds",
+    "Database statement latency by route template or background job",
+    ["route"],
+    buckets=DB_BUCKETS
+)
+JOB_DURATION = registry.histogram(
+    "scheduler_job_duration_seconds",
+    "Duration of scheduled jobs",
+    ["job"],
+    buckets=JOB_BUCKETS
+)
+
+# Route template or job name that database statements are attributed to;
+# the HTTP middleware stores the ASGI scope, whose route is resolved later
+_operation: ContextVar[Union[str, dict, None]] = ContextVar("metrics_operation", default=None)
+
+
+@contextmanager
+def operation(name: str):
+    """Attribute database statements in the with block to a background job"""
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def current_operation() -> str:
+    """Label of the route or job running in this context"""
+    current = _operation.get()
+    if current is None:
+        return "background"
+    if isinstance(current, str):
+        return current
+    route = current.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if started:
+        DB_QUERY_LATENCY.labels(current_operation()).observe(time.perf_counter() - started.pop())
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("metrics_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Time every statement run on a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests and scoping database metrics to the route"""
+
+    def __init__(self, app, exclude: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        token = _operation.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _operation.reset(token)
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"], getattr(route, "path", None) or "unmatched", status[0]
+            ).observe(time.perf_counter() - started)
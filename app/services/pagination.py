@@ -0,0 +1,107 @@
+"""
+Keyset (cursor) pagination and cached row counts for list endpoints
+"""
+import base64
+import os
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from sqlalchemy import Column, desc, tuple_
+from sqlalchemy.orm import Query
+from app.services.cache import TTLCache
+
+# Totals shown next to a page may lag writes by up to this many seconds
+_count_cache = TTLCache(maxsize=128, ttl=float(os.getenv("COUNT_CACHE_TTL", "30")))
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """
+    Encode the sort key of the last row of a page as an opaque cursor
+
+    Args:
+        timestamp: Sort column value of the row
+        row_id: Primary key of the row
+
+    Returns:
+        URL-safe cursor string
+    """
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def paginate(
+    db_query: Query,
+    sort_column: Column,
+    id_column: Column,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0
+) -> Tuple[List, Optional[str]]:
+    """
+    Fetch one page ordered by (sort_column, id) descending
+
+    With a cursor the page starts right after the cursor row using an index
+    range scan, so every page costs the same. Without one, offset is applied
+    for compatibility with older clients.
+
+    Args:
+        db_query: Filtered query to paginate
+        sort_column: Timestamp column to order by
+        id_column: Primary key column used as tie-breaker
+        limit: Page size
+        cursor: Cursor returned as next_cursor by the previous page
+        offset: Rows to skip when no cursor is given
+
+    Returns:
+        Tuple of (rows, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        db_query = db_query.filter(tuple_(sort_column, id_column) < (timestamp, row_id))
+
+    db_query = db_query.order_by(desc(sort_column), desc(id_column))
+    if offset and not cursor:
+        db_query = db_query.offset(offset)
+    rows = db_query.limit(limit).all()
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+def cached_count(key: Hashable, count: Callable[[], int]) -> int:
+    """
+    Row count served from a short-TTL cache
+
+    Args:
+        key: Cache key identifying the table and filters
+        count: Zero-argument callable running the COUNT query
+
+    Returns:
+        Row count, possibly up to COUNT_CACHE_TTL seconds old
+    """
+    return _count_cache.get_or_compute(key, count)
+
+
+def count_cache_stats() -> Dict:
+    """Hit/miss counters of the count cache"""
+    return _count_cache.stats()
@@ -0,0 +1,76 @@
+"""
+Interning of search query strings into the queries lookup table
+"""
+import threading
+from typing import Dict
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.database import SearchQuery
+
+_INSERT_IGNORE_DIALECTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+# Committed text -> id mappings. Ids created inside a transaction are kept in
+# session.info until it commits, so a rollback never leaves a dangling id here.
+_query_ids: Dict[str, int] = {}
+_query_ids_lock = threading.Lock()
+_PENDING_KEY = "pending_query_ids"
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_ids(session: Session):
+    """Move ids interned by a committed transaction into the shared cache"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        with _query_ids_lock:
+            _query_ids.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_ids(session: Session):
+    """Forget ids interned by a rolled back transaction"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def intern_query(db: Session, text: str) -> int:
+    """
+    Get the id of a query string, inserting it on first use
+
+    Args:
+        db: Database session (the caller owns the transaction)
+        text: Query string
+
+    Returns:
+        Id of the row in the queries table
+    """
+    with _query_ids_lock:
+        query_id = _query_ids.get(text)
+    if query_id is not None:
+        return query_id
+
+    pending = db.info.setdefault(_PENDING_KEY, {})
+    if text in pending:
+        return pending[text]
+
+    table = SearchQuery.__table__
+    insert_fn = _INSERT_IGNORE_DIALECTS.get(db.get_bind().dialect.name)
+    query_id = db.execute(select(table.c.id).where(table.c.text == text)).scalar()
+    if query_id is None:
+        if insert_fn is not None:
+            db.execute(insert_fn(table).values(text=text).on_conflict_do_nothing(index_elements=[table.c.text]))
+        else:
+            db.execute(table.insert().values(text=text))
+        query_id = db.execute(select(table.c.id).where(table.c.text == text)).scalar_one()
+
+    pending[text] = query_id
+    return query_id
+
+
+def clear_query_cache():
+    """Drop every cached mapping (e.g. after the queries table was rebuilt)"""
+    with _query_ids_lock:
+        _query_ids.clear()
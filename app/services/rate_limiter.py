@@ -0,0 +1,218 @@
+"""
+Shared rate limiting and 429-aware retries for TikAPI calls
+"""
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from tikapi import ResponseException
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+def _retry_after_seconds(exception: ResponseException) -> Optional[float]:
+    """Parse the Retry-After header of a 429 response (seconds or HTTP date)"""
+    response = getattr(exception, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every TikAPI call made with one set of credentials
+
+    Interactive callers are always served before background ones: a
+    background call only takes a token when no interactive call is waiting.
+    A 429 pauses the whole bucket for Retry-After (or an exponential backoff
+    with jitter) before the call is retried.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        burst: int = 10,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0
+    ):
+        """
+        Args:
+            rate: Sustained requests per second (0 disables throttling)
+            burst: Bucket capacity
+            max_retries: Retries after a 429 before giving up
+            backoff_base: First backoff delay in seconds when no Retry-After is sent
+            backoff_max: Upper bound for a single backoff delay
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self._cond = threading.Condition()
+
+        self.calls = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def _refill(self, now: float):
+        """Add tokens for the time elapsed; condition lock must be held"""
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Block until the caller may issue one request
+
+        Args:
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND
+
+        Raises:
+            ValueError: If priority is not one of the two levels
+        """
+        if priority not in self._waiting:
+            raise ValueError(f"Unknown rate limiter priority: {priority!r}")
+        with self._cond:
+            self._waiting[priority] += 1
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    if self._paused_until > now:
+                        delay = self._paused_until - now
+                    elif priority > PRIORITY_INTERACTIVE and self._waiting[PRIORITY_INTERACTIVE]:
+                        delay = 1.0 / self.rate if self.rate > 0 else 0.05
+                    elif self.rate <= 0:
+                        self.calls += 1
+                        return
+                    elif self._tokens >= 1:
+                        self._tokens -= 1
+                        self.calls += 1
+                        return
+                    else:
+                        delay = (1 - self._tokens) / self.rate
+
+                    if not waited:
+                        self.throttled += 1
+                        waited = True
+                    self._cond.wait(delay)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Record a 429 and stop handing out tokens for the given number of seconds"""
+        with self._cond:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Run a TikAPI call under the rate limit, retrying on 429
+
+        Args:
+            fn: TikAPI SDK method (e.g. user.live.search)
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND
+            *args, **kwargs: Passed to fn
+
+        Returns:
+            Whatever fn returns
+
+        Raises:
+            ResponseException: If the call still gets 429 after max_retries,
+                or fails with any other status
+            ValueError: If priority is not one of the two levels
+        """
+        attempt = 0
+        while True:
+            self.acquire(priority)
+            try:
+                return fn(*args, **kwargs)
+            except ResponseException as e:
+                if e.response is None or e.response.status_code != 429:
+                    raise
+
+                retry_after = _retry_after_seconds(e)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                self.pause(delay)
+
+                if attempt >= self.max_retries:
+                    logger.error(f"TikAPI rate limit persisted after {attempt} retries")
+                    raise
+
+                attempt += 1
+                with self._cond:
+                    self.retries += 1
+                logger.warning(f"TikAPI returned 429, retrying in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+
+    def stats(self) -> Dict:
+        """Counters for monitoring"""
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries
+            }
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str, account_key: str) -> RateLimiter:
+    """
+    Get the process-wide rate limiter for a set of TikAPI credentials
+
+    Settings come from TIKAPI_RATE_LIMIT, TIKAPI_RATE_BURST,
+    TIKAPI_MAX_RETRIES, TIKAPI_BACKOFF_BASE and TIKAPI_BACKOFF_MAX.
+    """
+    key = (api_key, account_key)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(
+                rate=float(os.getenv("TIKAPI_RATE_LIMIT", "5")),
+                burst=int(os.getenv("TIKAPI_RATE_BURST", "10")),
+                max_retries=int(os.getenv("TIKAPI_MAX_RETRIES", "3")),
+                backoff_base=float(os.getenv("TIKAPI_BACKOFF_BASE", "1")),
+                backoff_max=float(os.getenv("TIKAPI_BACKOFF_MAX", "30"))
+            )
+            _limiters[key] = limiter
+        return limiter
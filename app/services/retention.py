@@ -0,0 +1,284 @@
+"""
+Retention and compaction of scan_history and sightings
+"""
+import argparse
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.database import ScanHistory, ScanRollup, get_database
+from app.services.rollups import METRICS, hour_bucket
+from app.services.sightings import SIGHTING_RETENTION_DAYS, prune_sightings
+from app.services.statistics import invalidate_statistics
+
+logger = logging.getLogger(__name__)
+
+
+def _sqlite_pages(db: Session) -> Dict[str, int]:
+    """Page size, page count and free pages of the SQLite database file"""
+    connection = db.connection()
+    return {
+        name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")
+    }
+
+
+class RetentionJob:
+    """
+    Keeps raw scan history and sightings bounded
+
+    Scan history older than the retention window is first reconciled into the
+    hourly rollups (so statistics never lose old scans), then deleted in
+    small committed batches with a pause in between, so SQLite writers are
+    never blocked for long. Afterwards freed pages are returned to the file
+    system with incremental VACUUM and the planner statistics are refreshed.
+    """
+
+    def __init__(
+        self,
+        scan_history_days: Optional[int] = None,
+        sighting_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        batch_pause: Optional[float] = None,
+        vacuum_pages: Optional[int] = None
+    ):
+        """
+        Args:
+            scan_history_days: Days of raw scan history kept, 0 keeps everything
+                (default: SCAN_HISTORY_RETENTION_DAYS or 30)
+            sighting_days: Days of sightings kept, 0 keeps everything
+                (default: SIGHTING_RETENTION_DAYS or 90)
+            batch_size: Rows deleted per transaction (default: RETENTION_BATCH_SIZE or 5000)
+            batch_pause: Seconds slept between batches (default: RETENTION_BATCH_PAUSE or 0.05)
+            vacuum_pages: Free pages returned per run, 0 for all (default: RETENTION_VACUUM_PAGES or 0)
+        """
+        self.scan_history_days = (
+            scan_history_days if scan_history_days is not None
+            else int(os.getenv("SCAN_HISTORY_RETENTION_DAYS", "30"))
+        )
+        self.sighting_days = sighting_days if sighting_days is not None else SIGHTING_RETENTION_DAYS
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+        self.batch_pause = batch_pause if batch_pause is not None else float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+        self.vacuum_pages = vacuum_pages if vacuum_pages is not None else int(os.getenv("RETENTION_VACUUM_PAGES", "0"))
+        self.runs = 0
+        self.last_run: Optional[Dict] = None
+
+    def downsample(self, db: Session, cutoff: datetime) -> int:
+        """
+        Make sure the hourly rollups account for every scan before cutoff
+
+        The write path already maintains the rollups; this only adds scans
+        recorded before it did (or lost in a failed rollup write), so deleting
+        raw rows afterwards never changes rollup-based statistics.
+
+        Returns:
+            Number of rollup buckets created or topped up
+        """
+        raw = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        rows = db.query(
+            ScanHistory.timestamp, ScanHistory.query, ScanHistory.success, ScanHistory.streamers_found
+        ).filter(ScanHistory.timestamp < cutoff).yield_per(self.batch_size)
+        for timestamp, query, success, streamers_found in rows:
+            metrics = raw[(hour_bucket(timestamp), query)]
+            metrics["scans"] += 1
+            metrics["successful_scans" if success else "failed_scans"] += 1
+            metrics["streamers_found"] += streamers_found or 0
+        if not raw:
+            return 0
+
+        # Only the rollups of the buckets and queries still in raw history
+        buckets = [bucket for bucket, _ in raw]
+        existing = {
+            (rollup.bucket, rollup.query): rollup
+            for rollup in db.query(ScanRollup).filter(
+                ScanRollup.bucket.between(min(buckets), max(buckets)),
+                ScanRollup.query.in_({query for _, query in raw})
+            )
+        }
+        changed = 0
+        for (bucket, query), metrics in raw.items():
+            rollup = existing.get((bucket, query))
+            if rollup is None:
+                db.add(ScanRollup(bucket=bucket, query=query, **metrics))
+                changed += 1
+            elif rollup.scans < metrics["scans"]:
+                for metric in ("scans", "successful_scans", "failed_scans", "streamers_found"):
+                    setattr(rollup, metric, max(getattr(rollup, metric), metrics[metric]))
+                changed += 1
+        db.commit()
+        return changed
+
+    def prune_scan_history(self, db: Session, cutoff: datetime) -> int:
+        """
+        Delete scan history before cutoff in batches, committing each one
+
+        Returns:
+            Number of rows deleted
+        """
+        table = ScanHistory.__table__
+        expired_ids = (
+            select(table.c.id)
+            .where(table.c.timestamp < cutoff)
+            .order_by(table.c.timestamp)
+            .limit(self.batch_size)
+            .scalar_subquery()
+        )
+        statement = table.delete().where(table.c.id.in_(expired_ids))
+
+        deleted = 0
+        while True:
+            count = db.execute(statement).rowcount
+            db.commit()
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.batch_pause)  # Let waiting writers in
+        return deleted
+
+    def compact(self, db: Session) -> Optional[Dict]:
+        """
+        Return free pages to the file system and refresh planner statistics
+
+        Only SQLite databases created with auto_vacuum=INCREMENTAL can shrink
+        in place; older ones report their reclaimable bytes instead (run
+        `python -m app.services.retention vacuum` once to convert them).
+
+        Returns:
+            Compaction report, or None for non-SQLite databases
+        """
+        if db.get_bind().dialect.name != "sqlite":
+            return None
+
+        before = _sqlite_pages(db)
+        connection = db.connection()
+        if before["auto_vacuum"] == 2 and before["freelist_count"]:
+            pages = f"({self.vacuum_pages})" if self.vacuum_pages > 0 else ""
+            # A single step frees one page; executescript steps the pragma to completion
+            connection.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum{pages};")
+        connection.exec_driver_sql("ANALYZE")
+        db.commit()
+        after = _sqlite_pages(db)
+
+        return {
+            "incremental": before["auto_vacuum"] == 2,
+            "bytes_reclaimed": (before["page_count"] - after["page_count"]) * before["page_size"],
+            "reclaimable_bytes": after["freelist_count"] * after["page_size"],
+            "file_bytes": after["page_count"] * after["page_size"]
+        }
+
+    def apply(self, db: Session, now: Optional[datetime] = None) -> Dict:
+        """
+        Run downsampling, pruning and compaction once
+
+        Args:
+            db: Database session
+            now: Reference time (default: now)
+
+        Returns:
+            Report with rows deleted per table and bytes reclaimed
+        """
+        started = time.monotonic()
+        now = now or datetime.utcnow()
+
+        downsampled = scan_history_deleted = 0
+        if self.scan_history_days > 0:
+            cutoff = now - timedelta(days=self.scan_history_days)
+            downsampled = self.downsample(db, cutoff)
+            scan_history_deleted = self.prune_scan_history(db, cutoff)
+            if scan_history_deleted:
+                invalidate_statistics()
+
+        sightings_deleted = prune_sightings(db, self.sighting_days, self.batch_size, now=now)
+
+        compaction = None
+        if scan_history_deleted or sightings_deleted:
+            compaction = self.compact(db)
+
+        report = {
+            "timestamp": now.isoformat(),
+            "rollup_buckets_downsampled": downsampled,
+            "scan_history_deleted": scan_history_deleted,
+            "sightings_deleted": sightings_deleted,
+            "compaction": compaction,
+            "duration_seconds": round(time.monotonic() - started, 3)
+        }
+        self.runs += 1
+        self.last_run = report
+
+        if scan_history_deleted or sightings_deleted:
+            logger.info(
+                f"Retention: deleted {scan_history_deleted} scans and {sightings_deleted} sightings, "
+                f"reclaimed {compaction['bytes_reclaimed'] if compaction else 0} bytes"
+            )
+        return report
+
+    def run(self) -> Dict:
+        """Run once with a pooled session"""
+        db = get_database().get_session()
+        try:
+            return self.apply(db)
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        """Retention settings and the last report"""
+        return {
+            "scan_history_days": self.scan_history_days,
+            "sighting_days": self.sighting_days,
+            "runs": self.runs,
+            "last_run": self.last_run
+        }
+
+
+def enable_incremental_vacuum(engine) -> Dict:
+    """
+    Convert an existing SQLite database to auto_vacuum=INCREMENTAL
+
+    Runs a full VACUUM, which rewrites the file and blocks writers while it
+    runs; do it once, during a quiet period.
+
+    Args:
+        engine: SQLAlchemy engine of the SQLite database
+
+    Returns:
+        File size before and after in bytes
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        def pages(name):
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+        bytes_before = pages("page_count") * pages("page_size")
+        connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+        return {
+            "auto_vacuum": pages("auto_vacuum"),
+            "bytes_before": bytes_before,
+            "bytes_after": pages("page_count") * pages("page_size")
+        }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from app.models.database import init_database
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Apply retention or compact the database")
+    parser.add_argument("command", choices=["run", "vacuum"])
+    args = parser.parse_args()
+
+    database = init_database()
+    database.migrate()
+    if args.command == "vacuum":
+        print(enable_incremental_vacuum(database.engine))
+    else:
+        session = database.get_session()
+        try:
+            print(RetentionJob().apply(session))
+        finally:
+            session.close()
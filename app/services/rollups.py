@@ -0,0 +1,277 @@
+"""
+Hourly rollups of scan metrics
+
+The write path adds every scan to its (hour, query) bucket, so statistics for
+any window are answered by summing buckets instead of scanning scan_history.
+Run `python -m app.services.rollups backfill` once on existing databases.
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import and_, case, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.database import ScanHistory, ScanRollup, Streamer
+
+logger = logging.getLogger(__name__)
+
+_UPSERT_DIALECTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+METRICS = ("scans", "successful_scans", "failed_scans", "streamers_found", "new_streamers")
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    """Start of the hour containing timestamp"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def add_scan(
+    db: Session,
+    query: str,
+    scanned_at: datetime,
+    success: bool,
+    streamers_found: int = 0,
+    new_streamers: int = 0
+):
+    """
+    Add one scan to its hourly bucket; the caller owns the transaction
+
+    Args:
+        db: Database session
+        query: Search query scanned
+        scanned_at: Scan timestamp
+        success: Whether the scan succeeded
+        streamers_found: Streamers found by the scan
+        new_streamers: Streamers seen for the first time
+    """
+    values = {
+        "bucket": hour_bucket(scanned_at),
+        "query": query,
+        "scans": 1,
+        "successful_scans": 1 if success else 0,
+        "failed_scans": 0 if success else 1,
+        "streamers_found": streamers_found,
+        "new_streamers": new_streamers
+    }
+
+    insert_fn = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert_fn is not None:
+        table = ScanRollup.__table__
+        stmt = insert_fn(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.bucket, table.c.query],
+            set_={metric: table.c[metric] + stmt.excluded[metric] for metric in METRICS}
+        )
+        db.execute(stmt)
+        return
+
+    rollup = db.query(ScanRollup).filter(
+        ScanRollup.bucket == values["bucket"],
+        ScanRollup.query == query
+    ).first()
+    if rollup is None:
+        db.add(ScanRollup(**values))
+    else:
+        for metric in METRICS:
+            setattr(rollup, metric, getattr(rollup, metric) + values[metric])
+
+
+def window_metrics(db: Session, cutoff: datetime) -> Dict:
+    """
+    Scan metrics since cutoff, per query and in total
+
+    Whole hours come from the rollups. Scan counts for the partial hour at the
+    start of the window come from the (at most one hour of) raw scan_history
+    rows, so they match a raw computation exactly; new_streamers is counted
+    per whole hour. Once retention has pruned the raw rows of that hour, the
+    query's rollup for the whole hour is used instead.
+
+    Args:
+        db: Database session
+        cutoff: Start of the window
+
+    Returns:
+        Dictionary with "totals" and "by_query" metric dictionaries
+    """
+    first_full_bucket = hour_bucket(cutoff)
+    if first_full_bucket < cutoff:
+        first_full_bucket += timedelta(hours=1)
+
+    by_query = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+
+    rollup_rows = db.query(
+        ScanRollup.query,
+        *[func.sum(getattr(ScanRollup, metric)) for metric in METRICS]
+    ).filter(ScanRollup.bucket >= first_full_bucket).group_by(ScanRollup.query).all()
+    for query, *sums in rollup_rows:
+        for metric, value in zip(METRICS, sums):
+            by_query[query][metric] += value or 0
+
+    if first_full_bucket > cutoff:
+        # Raw rows of the whole first hour: the part inside the window is
+        # summed, and the hour's count shows whether retention pruned any
+        in_window = ScanHistory.timestamp >= cutoff
+        raw_rows = db.query(
+            ScanHistory.query,
+            func.count(ScanHistory.id),
+            func.sum(case((in_window, 1), else_=0)),
+            func.sum(case((and_(in_window, ScanHistory.success.is_(True)), 1), else_=0)),
+            func.sum(case((and_(in_window, ScanHistory.success.is_(False)), 1), else_=0)),
+            func.sum(case((in_window, ScanHistory.streamers_found), else_=0))
+        ).filter(
+            ScanHistory.timestamp >= hour_bucket(cutoff),
+            ScanHistory.timestamp < first_full_bucket
+        ).group_by(ScanHistory.query).all()
+        raw = {query: (hour_scans, sums) for query, hour_scans, *sums in raw_rows}
+
+        first_hour = {
+            rollup.query: rollup
+            for rollup in db.query(ScanRollup).filter(ScanRollup.bucket == hour_bucket(cutoff))
+        }
+        for query in raw.keys() | first_hour.keys():
+            hour_scans, sums = raw.get(query, (0, None))
+            rollup = first_hour.get(query)
+            if rollup is not None and hour_scans < rollup.scans:
+                # Raw rows pruned: fall back to the rollup of the whole hour
+                sums = [getattr(rollup, metric) for metric in METRICS[:4]]
+            for metric, value in zip(METRICS[:4], sums or ()):
+                by_query[query][metric] += value or 0
+            if rollup is not None:
+                by_query[query]["new_streamers"] += rollup.new_streamers or 0
+
+    totals = dict.fromkeys(METRICS, 0)
+    for metrics in by_query.values():
+        for metric in METRICS:
+            totals[metric] += metrics[metric]
+
+    return {
+        "totals": totals,
+        "by_query": [
+            {"query": query, **metrics}
+            for query, metrics in sorted(by_query.items(), key=lambda item: -item[1]["scans"])
+        ]
+    }
+
+
+def backfill(db: Session, batch_size: int = 10000) -> Dict:
+    """
+    Rebuild the rollups that scan_history still fully covers
+
+    Retention deletes raw scans after downsampling them, so rollups older
+    than the oldest remaining scan are the only record of those hours.
+    Buckets from the hour after the oldest scan on are rebuilt from
+    scan_history and streamers.first_seen; older buckets (including the
+    partly pruned hour of the oldest scan) keep their rollup, and only
+    (hour, query) pairs without one are filled in from the raw rows.
+
+    New streamers are attributed to the query stored on the streamer row,
+    which is the best information available for past scans.
+
+    Args:
+        db: Database session
+        batch_size: Rows fetched per round trip
+
+    Returns:
+        Dictionary with the number of scans read, buckets written and
+        older buckets kept
+    """
+    buckets = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+
+    scans = 0
+    for timestamp, query, success, streamers_found in db.query(
+        ScanHistory.timestamp, ScanHistory.query, ScanHistory.success, ScanHistory.streamers_found
+    ).yield_per(batch_size):
+        metrics = buckets[(hour_bucket(timestamp), query)]
+        metrics["scans"] += 1
+        metrics["successful_scans" if success else "failed_scans"] += 1
+        metrics["streamers_found"] += streamers_found or 0
+        scans += 1
+
+    for first_seen, query in db.query(Streamer.first_seen, Streamer.query).yield_per(batch_size):
+        buckets[(hour_bucket(first_seen), query)]["new_streamers"] += 1
+
+    # Without any scan left, no bucket is covered and every rollup is kept
+    oldest = db.query(func.min(ScanHistory.timestamp)).scalar()
+    covered_from = hour_bucket(oldest) + timedelta(hours=1) if oldest is not None else None
+
+    kept_rollups = db.query(ScanRollup.bucket, ScanRollup.query)
+    if covered_from is not None:
+        kept_rollups = kept_rollups.filter(ScanRollup.bucket < covered_from)
+        db.query(ScanRollup).filter(ScanRollup.bucket >= covered_from).delete(synchronize_session=False)
+    kept = {tuple(row) for row in kept_rollups}
+
+    rows = [
+        {"bucket": bucket, "query": query, **metrics}
+        for (bucket, query), metrics in buckets.items()
+        if (bucket, query) not in kept
+    ]
+    for start in range(0, len(rows), batch_size):
+        db.execute(ScanRollup.__table__.insert(), rows[start:start + batch_size])
+    db.commit()
+
+    logger.info(
+        f"Rollup backfill: {scans} scans into {len(rows)} hourly buckets, "
+        f"{len(kept)} older buckets kept"
+    )
+    return {"scans": scans, "buckets": len(rows), "kept": len(kept)}
+
+
+def verify(db: Session, hours: int = 24, now: Optional[datetime] = None) -> Dict:
+    """
+    Compare rollup-based scan counts with a raw scan_history computation
+
+    Args:
+        db: Database session
+        hours: Window to compare
+        now: Reference time (default: now)
+
+    Returns:
+        Dictionary with both results and whether they match
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=hours)
+    rollup = window_metrics(db, cutoff)["totals"]
+
+    scans, successful, failed, found = db.query(
+        func.count(ScanHistory.id),
+        func.coalesce(func.sum(case((ScanHistory.success.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((ScanHistory.success.is_(False), 1), else_=0)), 0),
+        func.coalesce(func.sum(ScanHistory.streamers_found), 0)
+    ).filter(ScanHistory.timestamp >= cutoff).one()
+    raw = {"scans": scans, "successful_scans": successful, "failed_scans": failed, "streamers_found": found}
+
+    return {
+        "hours": hours,
+        "raw": raw,
+        "rollup": {metric: rollup[metric] for metric in raw},
+        "match": all(rollup[metric] == raw[metric] for metric in raw)
+    }
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from app.models.database import init_database
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Maintain hourly scan rollups")
+    parser.add_argument("command", choices=["backfill", "verify"])
+    parser.add_argument("--hours", type=int, default=24, help="Window for verify")
+    args = parser.parse_args()
+
+    database = init_database()
+    database.migrate()
+    session = database.get_session()
+    try:
+        if args.command == "backfill":
+            print(backfill(session))
+        else:
+            print(verify(session, args.hours))
+    finally:
+        session.close()
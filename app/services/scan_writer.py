@@ -0,0 +1,291 @@
+"""
+Write-behind queue: a single writer task stores scan results in batches
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Union
+from app.models.database import get_database
+from app.services.extractor import LiveRecord
+from app.services.live_feed import live_feed, sighting_deltas
+from app.services.metrics import operation
+from app.services.statistics import invalidate_statistics
+from app.services.streamer_store import record_scan
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class PendingScan(NamedTuple):
+    """A scan waiting to be written, and the future its submitter awaits"""
+    query: str
+    records: List[LiveRecord]
+    scanned_at: datetime
+    error: Optional[str]
+    future: Optional[asyncio.Future]
+    enqueued_at: float
+
+
+class ScanWriter:
+    """
+    Coalesces scan results from searches and crawl cycles into batched transactions
+
+    Producers enqueue scans and await their stored rows; one writer task
+    drains the queue and writes up to batch_size scans per commit, waiting
+    at most flush_interval for a batch to fill. That keeps SQLite down to a
+    single writer instead of one short transaction per search. A full
+    queue blocks producers until the writer catches up.
+
+    On stop() new scans are written directly, and the writer keeps going
+    until the queue is empty and no producer is still waiting to enqueue.
+    """
+
+    def __init__(
+        self,
+        max_queued: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        """
+        Args:
+            max_queued: Scans queued before producers wait (default: WRITE_QUEUE_SIZE or 200)
+            batch_size: Scans written per transaction (default: WRITE_BATCH_SIZE or 50)
+            flush_interval: Seconds to wait for a batch to fill
+                (default: WRITE_FLUSH_INTERVAL or 0.2)
+        """
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("WRITE_QUEUE_SIZE", "200"))
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv("WRITE_BATCH_SIZE", "50"))
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else float(os.getenv("WRITE_FLUSH_INTERVAL", "0.2"))
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Producers waiting in queue.put() on a full queue
+        self._putting = 0
+
+        self.batches = 0
+        self.scans_written = 0
+        self.scans_failed = 0
+        self.last_batch: Optional[Dict] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the writer task is accepting scans"""
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self):
+        """Start the writer task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="scan-writer")
+        logger.info(
+            f"Scan writer started (batch {self.batch_size}, flush {self.flush_interval}s, "
+            f"queue {self.max_queued})"
+        )
+
+    async def stop(self):
+        """
+        Stop accepting scans, write everything queued or being enqueued, then stop
+
+        Scans the writer task could not write (because it failed) are
+        resolved with an exception instead of leaving their producers waiting.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        # Wake the writer if it is waiting on an empty queue
+        if self._queue.empty():
+            self._queue.put_nowait(None)
+        try:
+            await self._task
+        except Exception as e:
+            logger.error(f"Scan writer task failed: {e}", exc_info=True)
+        self._task = None
+
+        leftover = 0
+        while self._putting or not self._queue.empty():
+            while not self._queue.empty():
+                scan = self._queue.get_nowait()
+                if scan is not None and not scan.future.done():
+                    scan.future.set_exception(RuntimeError("Scan writer stopped before storing this scan"))
+                    leftover += 1
+            # Let producers blocked on the full queue finish their put
+            await asyncio.sleep(0)
+        if leftover:
+            logger.error(f"Scan writer stopped with {leftover} scans not written")
+        logger.info("Scan writer stopped")
+
+    async def submit(
+        self,
+        query: str,
+        records: List[LiveRecord],
+        scanned_at: Optional[datetime] = None,
+        error: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Store the outcome of one query scan through the queue
+
+        Waits while the queue is full. Without a running writer (CLI use,
+        after shutdown) the scan is written directly.
+
+        Args:
+            query: Search query that was scanned
+            records: Live records found (ignored for failed scans)
+            scanned_at: Scan timestamp (default: now)
+            error: Error message if the scan failed
+
+        Returns:
+            List of streamer dictionaries (empty for failed scans)
+        """
+        scanned_at = scanned_at or datetime.utcnow()
+        if not self.running:
+            scan = PendingScan(query, records, scanned_at, error, None, time.monotonic())
+            result = (await asyncio.to_thread(self._write, [scan]))[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with span("scan_writer.submit", query=query, records=len(records)):
+            future = asyncio.get_running_loop().create_future()
+            self._putting += 1
+            try:
+                await self._queue.put(PendingScan(query, records, scanned_at, error, future, time.monotonic()))
+            finally:
+                self._putting -= 1
+            return await future
+
+    async def submit_many(self, results: List[tuple]) -> List[List[dict]]:
+        """
+        Store several scans, e.g. a crawl cycle
+
+        Args:
+            results: (query, records, scanned_at, error) tuples
+
+        Returns:
+            Streamer dictionaries stored for each result
+        """
+        return list(await asyncio.gather(*(
+            self.submit(query, records, scanned_at, error)
+            for query, records, scanned_at, error in results
+        )))
+
+    def _drained(self) -> bool:
+        """Whether a stopping writer has nothing left to write"""
+        return self._stopping and self._queue.empty() and not self._putting
+
+    async def _run(self):
+        """Writer loop: collect a batch by size or time, write it, repeat until drained"""
+        loop = asyncio.get_running_loop()
+        while not self._drained():
+            scan = await self._queue.get()
+            if scan is None:  # stop() waking an idle writer
+                continue
+            batch = [scan]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    scan = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    # No point waiting for a batch to fill while shutting down
+                    if timeout <= 0 or self._stopping:
+                        break
+                    try:
+                        scan = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if scan is not None:
+                    batch.append(scan)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingScan]):
+        """Write a batch off the event loop and resolve its futures"""
+        started = time.monotonic()
+        try:
+            with operation("scan_writer"), span("scan_writer.write", scans=len(batch)):
+                results = await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            logger.error(f"Error writing scan batch: {e}", exc_info=True)
+            results = [e] * len(batch)
+
+        failed = 0
+        for scan, result in zip(batch, results):
+            if isinstance(result, Exception):
+                failed += 1
+                if not scan.future.done():
+                    scan.future.set_exception(result)
+            elif not scan.future.done():
+                scan.future.set_result(result)
+
+        self.batches += 1
+        self.scans_written += len(batch) - failed
+        self.scans_failed += failed
+        self.last_batch = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "scans": len(batch),
+            "failed": failed,
+            "max_wait_seconds": round(started - min(scan.enqueued_at for scan in batch), 3),
+            "duration_seconds": round(time.monotonic() - started, 3)
+        }
+
+    def _write(self, batch: List[PendingScan]) -> List[Union[List[dict], Exception]]:
+        """
+        Write a batch in one transaction and publish its streamer deltas
+
+        If the transaction fails, every scan is retried in its own
+        transaction so one bad scan only fails its own submitter.
+        """
+        db = get_database().get_session()
+        try:
+            try:
+                results = [
+                    record_scan(db, scan.query, scan.records, scanned_at=scan.scanned_at, error=scan.error)
+                    for scan in batch
+                ]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                if len(batch) == 1:
+                    return [e]
+                logger.warning(f"Scan batch of {len(batch)} failed ({e}), writing scans one by one")
+                results = []
+                for scan in batch:
+                    try:
+                        results.append(record_scan(
+                            db, scan.query, scan.records, scanned_at=scan.scanned_at, error=scan.error
+                        ))
+                        db.commit()
+                    except Exception as scan_error:
+                        db.rollback()
+                        results.append(scan_error)
+            invalidate_statistics()
+            live_feed.publish([
+                delta
+                for result in results if not isinstance(result, Exception)
+                for delta in sighting_deltas(result)
+            ])
+            return results
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        """Queue depth and batch counters"""
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "batches": self.batches,
+            "scans_written": self.scans_written,
+            "scans_failed": self.scans_failed,
+            "last_batch": self.last_batch
+        }
+
+
+scan_writer = ScanWriter()
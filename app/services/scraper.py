@@ -2,6 +2,7 @@
 TikTok Live Scraper Service using TikAPI
 This module wraps the TikAPI service to maintain backward compatibility
 """
+import asyncio
 import logging
 from typing import List
 from sqlalchemy.orm import Session
@@ -30,4 +31,5 @@ async def run_scraper_job(queries: List[str], db: Session, api_key: str = None,
         raise ValueError(error_msg)
 
     logger.info(f"Running scraper job with TikAPI for queries: {queries}")
-    return tikapi_run_scraper_job(queries, db, api_key, account_key)
+    # TikAPI and SQLAlchemy calls block, keep them off the event loop
+    return await asyncio.to_thread(tikapi_run_scraper_job, queries, db, api_key, account_key)
@@ -0,0 +1,189 @@
+"""
+Append-only sighting history and per-streamer activity timelines
+"""
+import calendar
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models.database import SearchQuery, Sighting
+
+logger = logging.getLogger(__name__)
+
+SIGHTING_RETENTION_DAYS = int(os.getenv("SIGHTING_RETENTION_DAYS", "90"))
+
+TIMELINE_BUCKETS = {"hour": 3600, "day": 86400}
+
+
+def to_epoch(timestamp: datetime) -> int:
+    """Naive UTC datetime -> Unix epoch seconds"""
+    return calendar.timegm(timestamp.utctimetuple())
+
+
+def from_epoch(seconds: int) -> datetime:
+    """Unix epoch seconds -> naive UTC datetime"""
+    return datetime.utcfromtimestamp(seconds)
+
+
+def record_sightings(
+    db: Session,
+    rows: List[dict],
+    query_id: int,
+    scan_id: Optional[int],
+    seen_at: datetime
+) -> int:
+    """
+    Append one sighting per streamer row with a single executemany INSERT
+
+    The caller owns the transaction.
+
+    Args:
+        db: Database session
+        rows: Streamer dictionaries returned by the upsert
+        query_id: Interned query id
+        scan_id: scan_history id of the scan
+        seen_at: Scan timestamp
+
+    Returns:
+        Number of sightings written
+    """
+    if not rows:
+        return 0
+
+    seen_at = to_epoch(seen_at)
+    db.execute(Sighting.__table__.insert(), [
+        {
+            "streamer_id": row["id"],
+            "scan_id": scan_id,
+            "query_id": query_id,
+            "seen_at": seen_at,
+            "viewers": row.get("viewers") or 0
+        }
+        for row in rows
+    ])
+    return len(rows)
+
+
+def streamer_timeline(
+    db: Session,
+    streamer_id: int,
+    since: datetime,
+    bucket: Optional[str] = None,
+    limit: int = 500
+) -> List[Dict]:
+    """
+    Activity of one streamer since a point in time, newest first
+
+    Reads a range of the (streamer_id, seen_at) index, so the cost depends
+    on the streamer's own sightings only, not on the table size.
+
+    Args:
+        db: Database session
+        streamer_id: Streamer id
+        since: Start of the window
+        bucket: None for raw sightings, "hour" or "day" to aggregate
+        limit: Maximum entries returned
+
+    Returns:
+        List of sighting (or bucket) dictionaries
+    """
+    window = (Sighting.streamer_id == streamer_id, Sighting.seen_at >= to_epoch(since))
+
+    if bucket is None:
+        rows = db.execute(
+            select(Sighting.seen_at, Sighting.viewers, Sighting.scan_id, SearchQuery.text)
+            .join(SearchQuery, SearchQuery.id == Sighting.query_id)
+            .where(*window)
+            .order_by(Sighting.streamer_id.desc(), Sighting.seen_at.desc())
+            .limit(limit)
+        ).all()
+        return [
+            {
+                "timestamp": from_epoch(seen_at).isoformat(),
+                "viewers": viewers,
+                "scan_id": scan_id,
+                "query": query
+            }
+            for seen_at, viewers, scan_id, query in rows
+        ]
+
+    size = TIMELINE_BUCKETS[bucket]
+    start = (Sighting.seen_at // size) * size
+    rows = db.execute(
+        select(
+            start.label("start"),
+            func.count(Sighting.id),
+            func.max(Sighting.viewers),
+            func.avg(Sighting.viewers)
+        )
+        .where(*window)
+        .group_by("start")
+        .order_by(start.desc())
+        .limit(limit)
+    ).all()
+    return [
+        {
+            "timestamp": from_epoch(int(bucket_start)).isoformat(),
+            "sightings": sightings,
+            "max_viewers": max_viewers,
+            "avg_viewers": round(float(avg_viewers or 0), 1)
+        }
+        for bucket_start, sightings, max_viewers, avg_viewers in rows
+    ]
+
+
+def prune_sightings(
+    db: Session,
+    retention_days: int = SIGHTING_RETENTION_DAYS,
+    batch_size: int = 5000,
+    now: Optional[datetime] = None
+) -> int:
+    """
+    Delete sightings older than the retention window in small batches
+
+    Rows are appended in (roughly) time order, so expired ones sit at the
+    start of the primary key and are found without a seen_at index. Batches
+    walk the primary key from the start; rows still inside the window (a scan
+    stored late) are stepped over, and pruning stops at the first batch with
+    nothing to delete. Every batch is committed on its own to keep SQLite
+    write locks short.
+
+    Args:
+        db: Database session
+        retention_days: Days of sightings to keep (0 keeps everything)
+        batch_size: Rows deleted per transaction
+        now: Reference time (default: now)
+
+    Returns:
+        Number of sightings deleted
+    """
+    if retention_days <= 0:
+        return 0
+
+    cutoff = to_epoch((now or datetime.utcnow()) - timedelta(days=retention_days))
+    table = Sighting.__table__
+    deleted = 0
+    last_id = 0
+    while True:
+        # Next rows by primary key, after the ones already looked at
+        rows = db.execute(
+            select(table.c.id, table.c.seen_at)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not any(seen_at < cutoff for _, seen_at in rows):
+            break
+
+        first_id, last_id = rows[0][0], rows[-1][0]
+        result = db.execute(
+            table.delete().where(table.c.id.between(first_id, last_id), table.c.seen_at < cutoff)
+        )
+        db.commit()
+        deleted += result.rowcount
+
+    if deleted:
+        logger.info(f"Pruned {deleted} sightings older than {retention_days} days")
+    return deleted
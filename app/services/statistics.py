@@ -0,0 +1,91 @@
+"""
+Aggregated scraping statistics for /api/statistics
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict
+from sqlalchemy import case, desc, func
+from sqlalchemy.orm import Session
+from app.models.database import Streamer, ScanHistory
+from app.services.cache import TTLCache
+from app.services.rollups import window_metrics
+from app.services.streamer_queries import streamer_counts_by_query
+
+# Dashboard polls are served from here; writers call invalidate_statistics()
+_statistics_cache = TTLCache(maxsize=32, ttl=float(os.getenv("STATISTICS_CACHE_TTL", "10")))
+
+
+def compute_statistics(db: Session, hours: int = 24) -> Dict:
+    """
+    Compute dashboard statistics
+
+    Scan counts are summed from the hourly rollups, so their cost does not
+    grow with scan_history.
+
+    Args:
+        db: Database session
+        hours: Window for scan statistics
+
+    Returns:
+        Statistics dictionary
+    """
+    cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+
+    # Streamer totals in one pass
+    total_streamers, live_streamers = db.query(
+        func.count(Streamer.id),
+        func.coalesce(func.sum(case((Streamer.is_live.is_(True), 1), else_=0)), 0)
+    ).one()
+
+    # Scan totals from the hourly rollups
+    scans = window_metrics(db, cutoff_time)
+
+    # Distinct streamers per query, from the association index
+    streamers_by_query = streamer_counts_by_query(db)
+
+    # Top streamers by times seen
+    top_streamers = db.query(Streamer).order_by(
+        desc(Streamer.times_seen)
+    ).limit(10).all()
+
+    # Recent scan history
+    scan_history = db.query(ScanHistory).filter(
+        ScanHistory.timestamp >= cutoff_time
+    ).order_by(desc(ScanHistory.timestamp)).limit(20).all()
+
+    return {
+        "total_streamers": total_streamers,
+        "live_streamers": live_streamers,
+        "recent_scans": scans["totals"]["scans"],
+        "successful_scans": scans["totals"]["successful_scans"],
+        "failed_scans": scans["totals"]["failed_scans"],
+        "new_streamers": scans["totals"]["new_streamers"],
+        "scans_by_query": scans["by_query"],
+        "streamers_by_query": streamers_by_query,
+        "top_streamers": [s.to_dict() for s in top_streamers],
+        "scan_history": [s.to_dict() for s in scan_history]
+    }
+
+
+def cached_statistics(db: Session, hours: int = 24) -> Dict:
+    """
+    Get dashboard statistics, served from a short-TTL cache
+
+    Args:
+        db: Database session
+        hours: Window for scan statistics
+
+    Returns:
+        Statistics dictionary
+    """
+    return _statistics_cache.get_or_compute(hours, lambda: compute_statistics(db, hours))
+
+
+def invalidate_statistics():
+    """Drop cached statistics after streamers or scans were written, including ones still being computed"""
+    _statistics_cache.clear()
+
+
+def statistics_cache_stats() -> Dict:
+    """Hit/miss counters of the statistics cache"""
+    return _statistics_cache.stats()
@@ -0,0 +1,375 @@
+"""
+In-process index of known streamers for the write path
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.models.database import Streamer
+
+logger = logging.getLogger(__name__)
+
+STREAMER_INDEX_ENABLED = os.getenv("STREAMER_INDEX", "true").lower() == "true"
+
+# The index only sees the writes of its own process. SQLite deployments have
+# one writer process; with PostgreSQL several processes may write, so every
+# write there reads the stored row back through the upsert's RETURNING.
+SINGLE_WRITER_DIALECTS = ("sqlite",)
+
+_EMPTY = 0
+_PENDING_KEY = "streamer_index_pending"
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(timestamp: datetime) -> int:
+    """Naive UTC datetime -> microseconds since the epoch (exact)"""
+    delta = timestamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _from_micros(micros: int) -> datetime:
+    """Microseconds since the epoch -> naive UTC datetime"""
+    seconds, micros = divmod(micros, 1000000)
+    return datetime.utcfromtimestamp(seconds).replace(microsecond=micros)
+
+
+def index_enabled_for(dialect_name: str) -> bool:
+    """Whether writes to a database of this dialect may go through the index"""
+    return STREAMER_INDEX_ENABLED and dialect_name in SINGLE_WRITER_DIALECTS
+
+
+class IndexEntry(NamedTuple):
+    """What the index knows about one streamer"""
+    id: int
+    times_seen: int
+    first_seen: datetime
+    last_seen: datetime
+    is_live: bool
+
+
+class StreamerIndex:
+    """
+    Username -> (id, times_seen, first_seen, last_seen, is_live) for every
+    known streamer, kept compact enough for millions of entries
+
+    Usernames are not stored: an open-addressing table maps the 64-bit hash
+    of a username to the streamer id, and the other fields live in typed
+    arrays indexed by id, about 55 bytes per streamer (up to twice that just
+    after the table or the arrays doubled). A hash collision can
+    only send a write down the UPDATE-by-id path for the wrong row; that
+    UPDATE also matches on username, so it changes nothing and the write
+    path falls back to the upsert.
+
+    Every write adds exactly one to times_seen, in the database and here.
+    An entry starts from the value the database returned for its first
+    write and later writes add one. A rolled back transaction drops the
+    entries it touched, since its reservation also moved last_seen and
+    is_live; their next sighting reloads them from the database. times_seen
+    0 means "unknown": the next sighting goes through the database.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity: Initial number of hash slots (rounded up to a power of two)
+        """
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self._capacity = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Empty table and arrays with counters at zero; lock must be held once shared"""
+        self._keys = array("q", bytes(8 * self._capacity))
+        self._slot_ids = array("q", bytes(8 * self._capacity))
+        self._count = 0
+
+        self._times_seen = array("I")
+        self._first_seen = array("q")  # Microseconds since the epoch
+        self._last_seen = array("q")
+        self._live = bytearray()
+
+        self.warmed = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(username: str) -> int:
+        """Non-zero 64-bit hash of a username"""
+        key = hash(username)
+        return key if key != _EMPTY else 1
+
+    def _slot(self, key: int) -> int:
+        """Slot holding key, or the empty slot where it belongs; lock must be held"""
+        keys = self._keys
+        mask = len(keys) - 1
+        slot = key & mask
+        while True:
+            current = keys[slot]
+            if current == key or current == _EMPTY:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow_table(self):
+        """Double the hash table; lock must be held"""
+        keys, slot_ids = self._keys, self._slot_ids
+        size = len(keys) * 2
+        self._keys = array("q", bytes(8 * size))
+        self._slot_ids = array("q", bytes(8 * size))
+        for key, streamer_id in zip(keys, slot_ids):
+            if key != _EMPTY:
+                slot = self._slot(key)
+                self._keys[slot] = key
+                self._slot_ids[slot] = streamer_id
+
+    def _ensure_id(self, streamer_id: int):
+        """Grow the per-id arrays to hold streamer_id; lock must be held"""
+        missing = streamer_id + 1 - len(self._times_seen)
+        if missing > 0:
+            missing = max(missing, len(self._times_seen))  # Amortized doubling
+            self._times_seen.extend(array("I", bytes(4 * missing)))
+            self._first_seen.extend(array("q", bytes(8 * missing)))
+            self._last_seen.extend(array("q", bytes(8 * missing)))
+            self._live.extend(bytes(missing))
+
+    def _lookup(self, username: str) -> Optional[int]:
+        """Id of a known username, else None; lock must be held"""
+        slot = self._slot(self._key(username))
+        if self._keys[slot] == _EMPTY:
+            return None
+        streamer_id = self._slot_ids[slot]
+        return streamer_id if self._times_seen[streamer_id] else None
+
+    def _entry(self, streamer_id: int) -> IndexEntry:
+        """Entry for an id; lock must be held"""
+        return IndexEntry(
+            streamer_id,
+            self._times_seen[streamer_id],
+            _from_micros(self._first_seen[streamer_id]),
+            _from_micros(self._last_seen[streamer_id]),
+            bool(self._live[streamer_id])
+        )
+
+    def _store(self, username: str, streamer_id: int) -> bool:
+        """
+        Point username at streamer_id; lock must be held
+
+        Returns:
+            True if the id has no valid entry yet
+        """
+        if (self._count + 1) * 2 > len(self._keys):
+            self._grow_table()
+        key = self._key(username)
+        slot = self._slot(key)
+        if self._keys[slot] == _EMPTY:
+            self._keys[slot] = key
+            self._count += 1
+        self._slot_ids[slot] = streamer_id
+        self._ensure_id(streamer_id)
+        return self._times_seen[streamer_id] == 0
+
+    def get(self, username: str) -> Optional[IndexEntry]:
+        """Entry of a username, or None if unknown"""
+        with self._lock:
+            streamer_id = self._lookup(username)
+            return self._entry(streamer_id) if streamer_id is not None else None
+
+    def load(self, rows: Iterable[Tuple[str, int, int, datetime, datetime, bool]]):
+        """
+        Add entries read from the database, keeping entries a write already set
+
+        Args:
+            rows: (username, id, times_seen, first_seen, last_seen, is_live) tuples
+        """
+        with self._lock:
+            for username, streamer_id, times_seen, first_seen, last_seen, is_live in rows:
+                if self._store(username, streamer_id):
+                    self._times_seen[streamer_id] = times_seen or 1
+                    self._first_seen[streamer_id] = _to_micros(first_seen)
+                    self._last_seen[streamer_id] = _to_micros(last_seen)
+                    self._live[streamer_id] = 1 if is_live else 0
+
+    def record_written(self, rows: Iterable[Tuple[str, int, int, datetime, datetime]]):
+        """
+        Apply rows returned by an upsert that added one sighting each
+
+        Must run before the writing transaction commits, so entries are set
+        in the order the database applied the writes.
+
+        Args:
+            rows: (username, id, times_seen, first_seen, last_seen) tuples
+                as returned by the database
+        """
+        with self._lock:
+            for username, streamer_id, times_seen, first_seen, last_seen in rows:
+                # times_seen 1 means this write created the row, even if a
+                # rolled back insert left counts on a reused id; a dropped
+                # entry may still hold a rolled back last_seen
+                if self._store(username, streamer_id) or times_seen == 1:
+                    self._times_seen[streamer_id] = times_seen or 1
+                    self._first_seen[streamer_id] = _to_micros(first_seen)
+                    self._last_seen[streamer_id] = _to_micros(last_seen)
+                else:
+                    # Already counted from an earlier write: count this one
+                    self._times_seen[streamer_id] += 1
+                    self._last_seen[streamer_id] = max(self._last_seen[streamer_id], _to_micros(last_seen))
+                self._live[streamer_id] = 1
+
+    def reserve(self, usernames: List[str], seen_at: datetime) -> Tuple[Dict[str, IndexEntry], List[str]]:
+        """
+        Split usernames into known and unknown, counting a sighting of the known ones
+
+        The caller must write the sighting of every known username, or hand
+        it to release().
+
+        Args:
+            usernames: Usernames seen by a scan
+            seen_at: Sighting timestamp
+
+        Returns:
+            Tuple of (username -> entry as it was before this sighting,
+            unknown usernames)
+        """
+        known = {}
+        unknown = []
+        seen_micros = _to_micros(seen_at)
+        with self._lock:
+            reserved = set()
+            for username in usernames:
+                streamer_id = self._lookup(username)
+                if streamer_id is None or streamer_id in reserved:
+                    # Unknown, or a second username on the same id (a hash
+                    # collision or a reused id): the database decides
+                    unknown.append(username)
+                    continue
+                reserved.add(streamer_id)
+                known[username] = self._entry(streamer_id)
+                self._times_seen[streamer_id] += 1
+                self._last_seen[streamer_id] = max(self._last_seen[streamer_id], seen_micros)
+                self._live[streamer_id] = 1
+            self.hits += len(known)
+            self.misses += len(unknown)
+        return known, unknown
+
+    def release(self, streamer_ids: Iterable[int]):
+        """
+        Drop entries whose counted sighting was not written
+
+        The reservation also set last_seen and is_live, which cannot be
+        undone safely while other writers may have reserved the same entry,
+        so the entry becomes unknown and its next sighting goes through the
+        database (which counts came_online and times_seen from stored rows).
+        """
+        with self._lock:
+            size = len(self._times_seen)
+            for streamer_id in streamer_ids:
+                if streamer_id < size:
+                    self._times_seen[streamer_id] = 0
+
+    def mark_offline(self, streamer_ids: Iterable[int], cutoff: Optional[datetime] = None):
+        """
+        Clear the live flag of streamers the sweeper marked offline
+
+        The sweeper calls this after its UPDATE committed. A sighting
+        reserved in between is written after that UPDATE and leaves the row
+        live, so entries seen at or after cutoff keep their flag.
+
+        Args:
+            streamer_ids: Ids returned by the sweeper's UPDATE
+            cutoff: The sweep's cutoff; entries last seen before it are cleared
+        """
+        cutoff_micros = _to_micros(cutoff) if cutoff is not None else None
+        with self._lock:
+            size = len(self._live)
+            for streamer_id in streamer_ids:
+                if streamer_id >= size:
+                    continue
+                if cutoff_micros is not None and self._last_seen[streamer_id] >= cutoff_micros:
+                    continue
+                self._live[streamer_id] = 0
+
+    def warm(self, db: Session, batch_size: int = 10000) -> int:
+        """
+        Load every streamer from the database
+
+        Entries written while warming are kept, not overwritten.
+
+        Returns:
+            Number of streamers loaded
+        """
+        started = time.monotonic()
+        loaded = 0
+        result = db.execute(
+            select(
+                Streamer.username, Streamer.id, Streamer.times_seen,
+                Streamer.first_seen, Streamer.last_seen, Streamer.is_live
+            ),
+            execution_options={"yield_per": batch_size}
+        )
+        for rows in result.partitions():
+            self.load(rows)
+            loaded += len(rows)
+
+        self.warmed = True
+        logger.info(f"Streamer index warmed with {loaded} streamers in {time.monotonic() - started:.1f}s")
+        return loaded
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._reset()
+
+    def memory_bytes(self) -> int:
+        """Approximate memory used by the table and arrays"""
+        with self._lock:
+            return (
+                self._keys.itemsize * len(self._keys)
+                + self._slot_ids.itemsize * len(self._slot_ids)
+                + self._times_seen.itemsize * len(self._times_seen)
+                + self._first_seen.itemsize * len(self._first_seen) * 2
+                + len(self._live)
+            )
+
+    def stats(self) -> Dict:
+        """Size and hit/miss counters"""
+        memory = self.memory_bytes()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": STREAMER_INDEX_ENABLED,
+                "warmed": self.warmed,
+                "entries": self._count,
+                "memory_bytes": memory,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+streamer_index = StreamerIndex()
+
+
+def track_writes(db: Session, streamer_ids: Iterable[int]):
+    """Remember ids counted in this transaction, to release them on rollback"""
+    db.info.setdefault(_PENDING_KEY, []).extend(streamer_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_writes(session: Session):
+    """Counted sightings are now durable"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _release_writes(session: Session):
+    """Drop the entries a rolled back transaction counted sightings for"""
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        streamer_index.release(pending)
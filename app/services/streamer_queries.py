@@ -0,0 +1,225 @@
+"""
+Streamer <-> query association: which queries found each streamer
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.database import SearchQuery, Sighting, Streamer, StreamerQuery
+from app.services.query_registry import intern_query
+from app.services.sightings import from_epoch
+
+logger = logging.getLogger(__name__)
+
+_UPSERT_DIALECTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def record_streamer_queries(db: Session, streamer_ids: List[int], query_id: int, seen_at: datetime):
+    """
+    Count one sighting of each streamer under a query
+
+    Sent as a single executemany upsert; the caller owns the transaction.
+
+    Args:
+        db: Database session
+        streamer_ids: Streamers found by the scan
+        query_id: Interned query id
+        seen_at: Scan timestamp
+    """
+    if not streamer_ids:
+        return
+
+    table = StreamerQuery.__table__
+    insert_fn = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert_fn is not None:
+        stmt = insert_fn(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.streamer_id, table.c.query_id],
+            set_={
+                "last_seen": stmt.excluded.last_seen,
+                "times_seen": table.c.times_seen + 1
+            }
+        )
+        db.execute(stmt, [
+            {
+                "streamer_id": streamer_id,
+                "query_id": query_id,
+                "first_seen": seen_at,
+                "last_seen": seen_at,
+                "times_seen": 1
+            }
+            for streamer_id in streamer_ids
+        ])
+        return
+
+    existing = {
+        association.streamer_id: association
+        for association in db.query(StreamerQuery).filter(
+            StreamerQuery.query_id == query_id,
+            StreamerQuery.streamer_id.in_(streamer_ids)
+        )
+    }
+    for streamer_id in streamer_ids:
+        association = existing.get(streamer_id)
+        if association:
+            association.last_seen = seen_at
+            association.times_seen += 1
+        else:
+            db.add(StreamerQuery(
+                streamer_id=streamer_id,
+                query_id=query_id,
+                first_seen=seen_at,
+                last_seen=seen_at,
+                times_seen=1
+            ))
+
+
+def query_id_subquery(text: str):
+    """Scalar subquery resolving a query string to its interned id"""
+    return select(SearchQuery.id).where(SearchQuery.text == text).scalar_subquery()
+
+
+def streamers_for_query(text: str):
+    """Subquery of the ids of every streamer found with a query"""
+    return select(StreamerQuery.streamer_id).where(StreamerQuery.query_id == query_id_subquery(text))
+
+
+def streamer_counts_by_query(db: Session) -> List[Dict]:
+    """
+    Number of distinct streamers found by each query
+
+    Read from the (query_id, streamer_id) index without touching streamers.
+
+    Returns:
+        List of {"query", "count"} dictionaries, largest first
+    """
+    counts = select(
+        StreamerQuery.query_id,
+        func.count().label("count")
+    ).group_by(StreamerQuery.query_id).subquery()
+
+    rows = db.execute(
+        select(SearchQuery.text, counts.c.count)
+        .join(counts, counts.c.query_id == SearchQuery.id)
+        .order_by(counts.c.count.desc())
+    ).all()
+    return [{"query": text, "count": count} for text, count in rows]
+
+
+def queries_for_streamer(db: Session, streamer_id: int) -> List[Dict]:
+    """
+    Every query that found a streamer, most recent first
+
+    Args:
+        db: Database session
+        streamer_id: Streamer id
+
+    Returns:
+        List of association dictionaries
+    """
+    rows = db.execute(
+        select(SearchQuery.text, StreamerQuery.times_seen, StreamerQuery.first_seen, StreamerQuery.last_seen)
+        .join(SearchQuery, SearchQuery.id == StreamerQuery.query_id)
+        .where(StreamerQuery.streamer_id == streamer_id)
+        .order_by(StreamerQuery.last_seen.desc())
+    ).all()
+    return [
+        {
+            "query": text,
+            "times_seen": times_seen,
+            "first_seen": first_seen.isoformat() if first_seen else None,
+            "last_seen": last_seen.isoformat() if last_seen else None
+        }
+        for text, times_seen, first_seen, last_seen in rows
+    ]
+
+
+def backfill(db: Session) -> Dict:
+    """
+    Add the associations the sightings table knows about and this one lacks
+
+    Only missing (streamer, query) pairs are inserted: existing rows, their
+    first_seen and their counts are kept, since sightings older than
+    SIGHTING_RETENTION_DAYS are pruned and can no longer rebuild them.
+    Streamers without sightings (recorded before sightings existed, or whose
+    sightings were pruned) get an association for their last query, which
+    is all that was stored for them.
+
+    Returns:
+        Dictionary with the number of candidate and added associations
+    """
+    aggregated = select(
+        Sighting.streamer_id,
+        Sighting.query_id,
+        func.min(Sighting.seen_at),
+        func.max(Sighting.seen_at),
+        func.count()
+    ).group_by(Sighting.streamer_id, Sighting.query_id)
+    rows = [
+        {
+            "streamer_id": streamer_id,
+            "query_id": query_id,
+            "first_seen": from_epoch(first_seen),
+            "last_seen": from_epoch(last_seen),
+            "times_seen": times_seen
+        }
+        for streamer_id, query_id, first_seen, last_seen, times_seen in db.execute(aggregated)
+    ]
+
+    with_sightings = select(Sighting.streamer_id).distinct()
+    without_sightings = db.execute(
+        select(Streamer.id, Streamer.query, Streamer.first_seen, Streamer.last_seen, Streamer.times_seen)
+        .where(Streamer.id.not_in(with_sightings))
+    ).all()
+    for streamer_id, query, first_seen, last_seen, times_seen in without_sightings:
+        rows.append({
+            "streamer_id": streamer_id,
+            "query_id": intern_query(db, query),
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+            "times_seen": times_seen or 1
+        })
+
+    before = db.query(StreamerQuery).count()
+    table = StreamerQuery.__table__
+    insert_fn = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert_fn is not None:
+        stmt = insert_fn(table).on_conflict_do_nothing(index_elements=[table.c.streamer_id, table.c.query_id])
+    else:
+        existing = {tuple(row) for row in db.execute(select(StreamerQuery.streamer_id, StreamerQuery.query_id))}
+        rows = [row for row in rows if (row["streamer_id"], row["query_id"]) not in existing]
+        stmt = table.insert()
+    for start in range(0, len(rows), 5000):
+        db.execute(stmt, rows[start:start + 5000])
+    db.commit()
+    added = db.query(StreamerQuery).count() - before
+
+    logger.info(f"Streamer/query backfill: {added} of {len(rows)} associations added")
+    return {"associations": len(rows), "added": added}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from app.models.database import init_database
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Maintain the streamer/query association")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    database = init_database()
+    database.migrate()
+    session = database.get_session()
+    try:
+        print(backfill(session))
+    finally:
+        session.close()
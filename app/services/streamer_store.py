@@ -0,0 +1,369 @@
+"""
+Bulk write path for streamer sightings
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, event, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.database import Streamer, ScanHistory
+from app.services.extractor import LiveRecord
+from app.services import rollups
+from app.services.metrics import SCAN_ROWS
+from app.services.query_registry import intern_query
+from app.services.sightings import record_sightings
+from app.services.streamer_queries import record_streamer_queries
+from app.services.streamer_index import index_enabled_for, streamer_index, track_writes
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement; 500 rows x 7 columns stays well below SQLite's
+# bound parameter limit
+UPSERT_BATCH_SIZE = 500
+
+_UPSERT_DIALECTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+# Offline -> live transitions committed by the write path since the last sweep
+_came_online = 0
+_came_online_lock = threading.Lock()
+_CAME_ONLINE_KEY = "came_online_pending"
+
+
+def _count_came_online(db: Session, count: int):
+    """Count offline -> live transitions, published when the transaction commits"""
+    if count:
+        db.info[_CAME_ONLINE_KEY] = db.info.get(_CAME_ONLINE_KEY, 0) + count
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_came_online(session: Session):
+    """Add the transitions of a committed transaction to the counter"""
+    global _came_online
+    count = session.info.pop(_CAME_ONLINE_KEY, 0)
+    if count:
+        with _came_online_lock:
+            _came_online += count
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_came_online(session: Session):
+    """Rolled back sightings did not bring anyone online"""
+    session.info.pop(_CAME_ONLINE_KEY, None)
+
+
+def pop_came_online() -> int:
+    """Return and reset the number of streamers that came back online"""
+    global _came_online
+    with _came_online_lock:
+        count, _came_online = _came_online, 0
+        return count
+
+
+def _row_to_dict(row) -> dict:
+    """Convert a streamers row to the same shape as Streamer.to_dict()"""
+    return {
+        "id": row.id,
+        "username": row.username,
+        "query": row.query,
+        "viewers": row.viewers,
+        "first_seen": row.first_seen.isoformat() if row.first_seen else None,
+        "last_seen": row.last_seen.isoformat() if row.last_seen else None,
+        "times_seen": row.times_seen,
+        "is_live": row.is_live
+    }
+
+
+def _upsert_batch(
+    db: Session,
+    insert_fn,
+    query: str,
+    usernames: List[str],
+    seen_at: datetime,
+    viewers: Optional[Dict[str, int]]
+) -> list:
+    """Insert or update one batch of streamers with INSERT ... ON CONFLICT"""
+    table = Streamer.__table__
+
+    # Offline streamers seen again (unique username index lookup)
+    _count_came_online(db, db.execute(
+        select(func.count()).select_from(table).where(
+            table.c.username.in_(usernames),
+            table.c.is_live.is_(False)
+        )
+    ).scalar())
+    stmt = insert_fn(table)
+    update = {
+        "last_seen": stmt.excluded.last_seen,
+        "times_seen": func.coalesce(table.c.times_seen, 0) + 1,
+        "is_live": True,
+        "query": stmt.excluded.query
+    }
+    if viewers is not None:
+        update["viewers"] = stmt.excluded.viewers
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.username],
+        set_=update
+    ).returning(*table.c)
+    # executemany with RETURNING is sent as batched multi-row INSERTs
+    # ("insertmanyvalues") and the compiled statement is cached
+    params = [
+        {
+            "username": username,
+            "query": query,
+            "viewers": viewers.get(username, 0) if viewers is not None else 0,
+            "first_seen": seen_at,
+            "last_seen": seen_at,
+            "times_seen": 1,
+            "is_live": True
+        }
+        for username in usernames
+    ]
+    return db.execute(stmt, params).all()
+
+
+def _record_written(db: Session, rows: list):
+    """Count upserted rows in the streamer index"""
+    streamer_index.record_written(
+        (row.username, row.id, row.times_seen, row.first_seen, row.last_seen)
+        for row in rows
+    )
+    track_writes(db, [row.id for row in rows])
+
+
+def _update_known_batch(
+    db: Session,
+    insert_fn,
+    query: str,
+    usernames: List[str],
+    seen_at: datetime,
+    viewers: Dict[str, int]
+) -> List[dict]:
+    """
+    Record a sighting of one batch using the streamer index
+
+    Streamers the index knows are updated by primary key with a plain
+    executemany UPDATE and their response rows are built from the index, so
+    no SELECT or RETURNING is needed for them. Only unknown usernames go
+    through INSERT ... ON CONFLICT.
+    """
+    known, unknown = streamer_index.reserve(usernames, seen_at)
+
+    rows = []
+    if known:
+        table = Streamer.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam("b_id"), table.c.username == bindparam("b_username"))
+            .values(
+                last_seen=seen_at,
+                times_seen=func.coalesce(table.c.times_seen, 0) + 1,
+                is_live=True,
+                query=query,
+                viewers=bindparam("b_viewers")
+            )
+        )
+        try:
+            updated = db.execute(stmt, [
+                {"b_id": entry.id, "b_username": username, "b_viewers": viewers.get(username, 0)}
+                for username, entry in known.items()
+            ]).rowcount
+            if updated != len(known):
+                # Entries that no longer match a row (hash collision, or a
+                # write not visible to this transaction): upsert them instead
+                present = set(db.execute(
+                    select(table.c.id, table.c.username)
+                    .where(table.c.id.in_([entry.id for entry in known.values()]))
+                ).tuples())
+                stale = [username for username, entry in known.items() if (entry.id, username) not in present]
+                streamer_index.release(known.pop(username).id for username in stale)
+                unknown.extend(stale)
+        except Exception:
+            streamer_index.release(entry.id for entry in known.values())
+            raise
+        track_writes(db, [entry.id for entry in known.values()])
+        _count_came_online(db, sum(1 for entry in known.values() if not entry.is_live))
+
+        rows.extend(
+            {
+                "id": entry.id,
+                "username": username,
+                "query": query,
+                "viewers": viewers.get(username, 0),
+                "first_seen": entry.first_seen.isoformat(),
+                "last_seen": seen_at.isoformat(),
+                "times_seen": entry.times_seen + 1,
+                "is_live": True
+            }
+            for username, entry in known.items()
+        )
+
+    if unknown:
+        upserted = _upsert_batch(db, insert_fn, query, unknown, seen_at, viewers)
+        _record_written(db, upserted)
+        rows.extend(_row_to_dict(row) for row in upserted)
+    return rows
+
+
+def _upsert_batch_orm(
+    db: Session,
+    query: str,
+    usernames: List[str],
+    seen_at: datetime,
+    viewers: Optional[Dict[str, int]]
+) -> list:
+    """Fallback for dialects without INSERT ... ON CONFLICT support"""
+    existing = {
+        streamer.username: streamer
+        for streamer in db.query(Streamer).filter(Streamer.username.in_(usernames))
+    }
+    _count_came_online(db, sum(1 for streamer in existing.values() if streamer.is_live is False))
+
+    rows = []
+    for username in usernames:
+        streamer = existing.get(username)
+        if streamer:
+            streamer.last_seen = seen_at
+            streamer.times_seen = (streamer.times_seen or 0) + 1
+            streamer.is_live = True
+            streamer.query = query
+            if viewers is not None:
+                streamer.viewers = viewers.get(username, 0)
+        else:
+            streamer = Streamer(
+                username=username,
+                query=query,
+                viewers=viewers.get(username, 0) if viewers is not None else 0,
+                first_seen=seen_at,
+                last_seen=seen_at,
+                times_seen=1,
+                is_live=True
+            )
+            db.add(streamer)
+        rows.append(streamer)
+    db.flush()
+    return rows
+
+
+def upsert_streamers(
+    db: Session,
+    query: str,
+    usernames: List[str],
+    seen_at: Optional[datetime] = None,
+    viewers: Optional[Dict[str, int]] = None
+) -> List[dict]:
+    """
+    Record a sighting of each username, inserting new streamers in bulk
+
+    On SQLite, once the streamer index is warm, known streamers are updated
+    by id and only unknown usernames are upserted; on PostgreSQL every
+    username goes through the upsert. New streamers are created with
+    times_seen=1; existing ones get last_seen, is_live and query refreshed
+    and times_seen incremented. The caller owns the transaction and must
+    commit.
+
+    Args:
+        db: Database session
+        query: Search query the streamers were found with
+        usernames: Usernames seen (duplicates are ignored)
+        seen_at: Sighting timestamp (default: now)
+        viewers: Viewer count per username; when omitted, stored counts are kept
+
+    Returns:
+        List of streamer dictionaries in the order of usernames
+    """
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return []
+
+    seen_at = seen_at or datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    insert_fn = _UPSERT_DIALECTS.get(dialect)
+    # Only a single writer process (SQLite) can trust its index. Without
+    # viewer counts the stored ones are kept, and the index does not hold
+    # them, so those writes take the RETURNING path too.
+    track_index = index_enabled_for(dialect)
+    use_index = track_index and streamer_index.warmed and insert_fn is not None and viewers is not None
+
+    rows_by_username = {}
+    for start in range(0, len(usernames), UPSERT_BATCH_SIZE):
+        batch = usernames[start:start + UPSERT_BATCH_SIZE]
+        if use_index:
+            for row in _update_known_batch(db, insert_fn, query, batch, seen_at, viewers):
+                rows_by_username[row["username"]] = row
+            continue
+        if insert_fn is not None:
+            rows = _upsert_batch(db, insert_fn, query, batch, seen_at, viewers)
+            if track_index:
+                _record_written(db, rows)
+        else:
+            rows = _upsert_batch_orm(db, query, batch, seen_at, viewers)
+        for row in rows:
+            rows_by_username[row.username] = _row_to_dict(row)
+
+    logger.info(f"Upserted {len(usernames)} streamers for query '{query}'")
+    return [rows_by_username[username] for username in usernames]
+
+
+def record_scan(
+    db: Session,
+    query: str,
+    records: List[LiveRecord],
+    scanned_at: Optional[datetime] = None,
+    error: Optional[str] = None
+) -> List[dict]:
+    """
+    Store the outcome of one query scan: streamer upserts, scan history,
+    one sighting row per streamer, the streamer/query association and the
+    hourly rollup
+
+    The caller owns the transaction, so several scans can share one commit.
+
+    Args:
+        db: Database session
+        query: Search query that was scanned
+        records: Live records found (ignored for failed scans)
+        scanned_at: Scan timestamp (default: now)
+        error: Error message if the scan failed
+
+    Returns:
+        List of streamer dictionaries (empty for failed scans)
+    """
+    scanned_at = scanned_at or datetime.utcnow()
+
+    rows = []
+    if error is None:
+        with span("store.upsert_streamers", query=query, records=len(records)):
+            rows = upsert_streamers(
+                db, query, [record.display_id for record in records],
+                seen_at=scanned_at,
+                viewers={record.display_id: record.viewers for record in records}
+            )
+        SCAN_ROWS.observe(len(rows))
+
+    scan = ScanHistory(
+        timestamp=scanned_at,
+        query=query,
+        streamers_found=len(rows),
+        success=error is None,
+        error_message=error
+    )
+    db.add(scan)
+    if rows:
+        db.flush()  # Assigns scan.id for the sightings
+        query_id = intern_query(db, query)
+        record_sightings(db, rows, query_id, scan.id, scanned_at)
+        record_streamer_queries(db, [row["id"] for row in rows], query_id, scanned_at)
+    rollups.add_scan(
+        db, query, scanned_at,
+        success=error is None,
+        streamers_found=len(rows),
+        new_streamers=sum(1 for row in rows if row["times_seen"] == 1)
+    )
+    return rows
@@ -0,0 +1,125 @@
+"""
+Live-status sweeper: marks streamers offline when they stop being seen
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.models.database import Streamer, get_database
+from app.services.statistics import invalidate_statistics
+from app.services.streamer_index import streamer_index
+from app.services.live_feed import live_feed, offline_deltas
+from app.services.streamer_store import pop_came_online
+
+logger = logging.getLogger(__name__)
+
+
+class LiveStatusSweeper:
+    """
+    Flips is_live to False for streamers not seen within the live window
+
+    Each batch is one set-based UPDATE over at most batch_size rows picked
+    through the (is_live, last_seen) index, so a sweep only touches streamers
+    that actually went offline and never holds the write lock for long.
+    """
+
+    def __init__(self, window_minutes: Optional[float] = None, batch_size: Optional[int] = None):
+        """
+        Args:
+            window_minutes: Streamers not seen for this long are offline
+                (default: LIVE_WINDOW_MINUTES or 30)
+            batch_size: Rows updated per statement (default: SWEEP_BATCH_SIZE or 5000)
+        """
+        self.window_minutes = (
+            window_minutes if window_minutes is not None else float(os.getenv("LIVE_WINDOW_MINUTES", "30"))
+        )
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv("SWEEP_BATCH_SIZE", "5000"))
+        self.sweeps = 0
+        self.last_sweep: Optional[Dict] = None
+
+    def sweep(self, db: Session, now: Optional[datetime] = None) -> Dict:
+        """
+        Mark stale streamers offline in batches, committing after each batch
+
+        Args:
+            db: Database session
+            now: Reference time (default: now)
+
+        Returns:
+            Dictionary with went_offline / came_online transition counts
+        """
+        started = time.monotonic()
+        cutoff = (now or datetime.utcnow()) - timedelta(minutes=self.window_minutes)
+
+        stale_ids = (
+            select(Streamer.id)
+            .where(Streamer.is_live.is_(True), Streamer.last_seen < cutoff)
+            .limit(self.batch_size)
+            .scalar_subquery()
+        )
+        statement = (
+            update(Streamer)
+            .where(Streamer.id.in_(stale_ids))
+            .values(is_live=False)
+            .execution_options(synchronize_session=False)
+        )
+
+        # RETURNING tells the streamer index and WebSocket clients which
+        # streamers went offline
+        returning = db.get_bind().dialect.update_returning
+        if returning:
+            statement = statement.returning(Streamer.id, Streamer.username)
+
+        went_offline = 0
+        while True:
+            result = db.execute(statement)
+            if returning:
+                offline = result.tuples().all()
+                updated = len(offline)
+            else:
+                updated = result.rowcount
+            db.commit()
+            if returning:
+                streamer_index.mark_offline((streamer_id for streamer_id, _ in offline), cutoff)
+                live_feed.publish(offline_deltas(offline))
+            went_offline += updated
+            if updated < self.batch_size:
+                break
+        if went_offline:
+            invalidate_statistics()
+
+        report = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "cutoff": cutoff.isoformat(),
+            "went_offline": went_offline,
+            "came_online": pop_came_online(),
+            "duration_seconds": round(time.monotonic() - started, 3)
+        }
+        self.sweeps += 1
+        self.last_sweep = report
+
+        if report["went_offline"] or report["came_online"]:
+            logger.info(
+                f"Live sweep: {report['went_offline']} went offline, "
+                f"{report['came_online']} came online"
+            )
+        return report
+
+    def run(self) -> Dict:
+        """Run one sweep with a pooled session"""
+        db = get_database().get_session()
+        try:
+            return self.sweep(db)
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        """Sweep counters and the last report"""
+        return {
+            "window_minutes": self.window_minutes,
+            "sweeps": self.sweeps,
+            "last_sweep": self.last_sweep
+        }
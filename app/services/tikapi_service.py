@@ -1,106 +1,502 @@
 """
 TikTok Live Scraper Service using TikAPI
 """
-import json
+import asyncio
 import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, Iterator, List, Dict, NamedTuple, Optional, Tuple
 from tikapi import TikAPI, ValidationException, ResponseException
 from sqlalchemy.orm import Session
-from app.models.database import Streamer, ScanHistory
+from app.services.cache import TTLCache
+from app.services.extractor import (
+    LiveRecord, SearchResult, parse_search_response, parse_recommend_response,
+    response_payload, unique_records
+)
+from app.services.metrics import TIKAPI_ERRORS, TIKAPI_LATENCY
+from app.services.rate_limiter import (
+    RateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, get_rate_limiter
+)
+from app.services.statistics import invalidate_statistics
+from app.services.streamer_store import record_scan
+from app.services.tracing import propagate, span
 
 logger = logging.getLogger(__name__)
 
+_search_latency = TIKAPI_LATENCY.labels("search")
+_recommend_latency = TIKAPI_LATENCY.labels("recommend")
+
+
+def _cache_from_env(prefix: str, default_ttl: float, default_size: int) -> Optional[TTLCache]:
+    """Build a TTLCache from <prefix>_TTL / <prefix>_SIZE; a TTL of 0 disables it"""
+    ttl = float(os.getenv(f"{prefix}_TTL", str(default_ttl)))
+    if ttl <= 0:
+        return None
+    return TTLCache(maxsize=int(os.getenv(f"{prefix}_SIZE", str(default_size))), ttl=ttl)
+
+
+class SearchStep(NamedTuple):
+    """One stage of a progressive live search"""
+    stage: str
+    records: List[LiveRecord]
+    room_id: Optional[str]
+    rooms_done: int
+    rooms_total: int
+
+
+class LiveSearch(NamedTuple):
+    """Records of one live search, and whether every room answered"""
+    records: List[LiveRecord]
+    complete: bool
+
+
+def _is_complete(search: LiveSearch) -> bool:
+    """Only searches where every recommend call succeeded are cached"""
+    return search.complete
+
 
 class TikAPIService:
     """Service for fetching TikTok Live streams using TikAPI"""
 
-    def __init__(self, api_key: str, account_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        account_key: str,
+        max_rooms: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        recommend_timeout: Optional[float] = None,
+        search_cache: Optional[TTLCache] = None,
+        recommend_cache: Optional[TTLCache] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
         """
         Initialize TikAPI service
 
         Args:
             api_key: TikAPI API key
             account_key: TikAPI account key
+            max_rooms: Number of rooms to fetch recommendations for
+                (default: TIKAPI_MAX_ROOMS or 5)
+            max_workers: Concurrent recommend calls; 1 disables the fan-out
+                (default: TIKAPI_RECOMMEND_WORKERS or 5)
+            recommend_timeout: Seconds to wait for all recommend calls of one search
+                (default: TIKAPI_RECOMMEND_TIMEOUT or 15)
+            search_cache: Cache of search results keyed by query
+                (default: built from SEARCH_CACHE_TTL / SEARCH_CACHE_SIZE)
+            recommend_cache: Cache of recommendations keyed by room ID
+                (default: built from RECOMMEND_CACHE_TTL / RECOMMEND_CACHE_SIZE)
+            rate_limiter: Limiter wrapping every TikAPI call
+                (default: the shared limiter for these credentials)
         """
         self.api_key = api_key
         self.account_key = account_key
         self.api = TikAPI(api_key)
         self.user = self.api.user(accountKey=account_key)
-        logger.info("TikAPI service initialized")
 
-    def _extract_room_ids(self, json_texto: str) -> List[str]:
+        self.max_rooms = max_rooms if max_rooms is not None else int(os.getenv("TIKAPI_MAX_ROOMS", "5"))
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv("TIKAPI_RECOMMEND_WORKERS", "5"))
+        self.recommend_timeout = (
+            recommend_timeout if recommend_timeout is not None
+            else float(os.getenv("TIKAPI_RECOMMEND_TIMEOUT", "15"))
+        )
+        self._executor = (
+            ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tikapi-recommend")
+            if self.max_workers > 1 else None
+        )
+        self.search_cache = search_cache if search_cache is not None else _cache_from_env("SEARCH_CACHE", 60, 256)
+        self.recommend_cache = (
+            recommend_cache if recommend_cache is not None else _cache_from_env("RECOMMEND_CACHE", 120, 2048)
+        )
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(api_key, account_key)
+        logger.info(
+            f"TikAPI service initialized (max_rooms={self.max_rooms}, "
+            f"workers={self.max_workers}, timeout={self.recommend_timeout}s)"
+        )
+
+    def _recommend(self, room_id, priority: int = PRIORITY_INTERACTIVE) -> List[LiveRecord]:
+        """Call user.live.recommend for one room and parse the response"""
+        with _recommend_latency.time(), span("tikapi.recommend", room_id=str(room_id)):
+            response = self.rate_limiter.call(self.user.live.recommend, room_id=str(room_id), priority=priority)
+        records = parse_recommend_response(response_payload(response))
+        logger.info(f"Found {len(records)} recommended streamers for room {room_id}")
+        return records
+
+    def _fetch_recommended(
+        self,
+        room_id,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> List[LiveRecord]:
         """
-        Extract room IDs from search response
+        Fetch recommended streamers for a single room, using the room cache
 
         Args:
-            json_texto: JSON response text from TikAPI
+            room_id: Live room ID
+            max_age: Only reuse cached recommendations younger than this (seconds)
+            priority: Rate limiter priority
 
         Returns:
-            List of room IDs
+            List of recommended live records, or None if the call failed
         """
         try:
-            datos = json.loads(json_texto)
-            room_ids = []
+            if self.recommend_cache is None:
+                return self._recommend(room_id, priority)
+            return self.recommend_cache.get_or_compute(
+                str(room_id), lambda: self._recommend(room_id, priority), max_age=max_age
+            )
+
+        except ValidationException as e:
+            TIKAPI_ERRORS.labels("recommend", "validation").inc()
+            logger.error(f"Validation error for room {room_id}: {e}, field: {e.field}")
+
+        except ResponseException as e:
+            TIKAPI_ERRORS.labels("recommend", e.response.status_code).inc()
+            logger.error(f"Response error for room {room_id}: {e}, status: {e.response.status_code}")
+
+        return None
+
+    def _iter_recommendations(
+        self,
+        room_ids: List,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Iterator[Tuple[str, Optional[List[LiveRecord]]]]:
+        """
+        Fetch recommendations for several rooms, concurrently when enabled
 
-            for item in datos.get("data", []):
-                room_info = item.get("live_info", {}).get("owner", {}).get("own_room", {})
-                ids = room_info.get("room_ids", [])
-                room_ids.extend(ids)
+        All calls share one deadline of recommend_timeout seconds, counted
+        from submission, however many rooms there are.
 
-            return room_ids
+        Args:
+            room_ids: Live room IDs (duplicates are fetched once)
+            max_age: Only reuse cached recommendations younger than this (seconds)
+            priority: Rate limiter priority
+
+        Yields:
+            (room_id, records) in completion order; records is None for rooms
+            whose call failed or timed out
+        """
+        room_ids = list(dict.fromkeys(room_ids))
+        if self._executor is None or len(room_ids) <= 1:
+            for room_id in room_ids:
+                yield room_id, self._fetch_recommended(room_id, max_age, priority)
+            return
+
+        futures = {
+            self._executor.submit(propagate(self._fetch_recommended), room_id, max_age, priority): room_id
+            for room_id in room_ids
+        }
+        remaining = dict(futures)
+        try:
+            for future in as_completed(futures, timeout=self.recommend_timeout):
+                room_id = remaining.pop(future)
+                try:
+                    records = future.result()
+                except Exception as e:
+                    logger.error(f"Error fetching recommendations for room {room_id}: {e}")
+                    records = None
+                yield room_id, records
+        except FutureTimeoutError:
+            for future, room_id in remaining.items():
+                future.cancel()
+                logger.error(f"Timeout after {self.recommend_timeout}s fetching recommendations for room {room_id}")
+                yield room_id, None
+
+    def _fetch_recommendations(
+        self,
+        room_ids: List,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> List[Optional[List[LiveRecord]]]:
+        """
+        Fetch recommendations for several rooms under one deadline
 
-        except json.JSONDecodeError:
-            logger.error("Error: El texto proporcionado no es un JSON válido.")
-            return []
+        Args:
+            room_ids: Live room IDs
+            max_age: Only reuse cached recommendations younger than this (seconds)
+            priority: Rate limiter priority
 
-    def _extract_display_ids(self, json_str: str) -> List[str]:
+        Returns:
+            One list of live records per room, in the same order as room_ids;
+            None for rooms whose call failed or timed out
+        """
+        results = dict(self._iter_recommendations(room_ids, max_age, priority))
+        return [results[room_id] for room_id in room_ids]
+
+    def search_live_records(
+        self,
+        query: str,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> List[LiveRecord]:
         """
-        Extract display IDs from search response
+        Search for live streams by query and get recommended streams
+
+        Results are cached per query; concurrent identical searches share a
+        single upstream call. A search where a recommend call failed or timed
+        out is returned but not cached, so the next search retries it.
 
         Args:
-            json_str: JSON response text from TikAPI
+            query: Search query
+            max_age: Only reuse cached results younger than this many seconds
+                (0 forces a fresh search)
+            priority: Rate limiter priority; scheduled scans use PRIORITY_BACKGROUND
 
         Returns:
-            List of display IDs (usernames)
+            List of live records, one per unique streamer, in discovery order
+
+        Raises:
+            Exception: If rate limit is reached or other API errors occur
+        """
+        query = query.strip()
+        if self.search_cache is None:
+            return self._search_live_records(query, max_age, priority).records
+        return self.search_cache.get_or_compute(
+            query, lambda: self._search_live_records(query, max_age, priority),
+            max_age=max_age, cache_if=_is_complete
+        ).records
+
+    def _search(self, query: str, priority: int = PRIORITY_INTERACTIVE) -> SearchResult:
+        """
+        Run user.live.search and parse the response
+
+        Raises:
+            Exception: If rate limit is reached or other API errors occur
         """
-        display_ids = []
         try:
-            datos = json.loads(json_str)
+            logger.info(f"Searching for live streams with query: {query}")
+            with _search_latency.time(), span("tikapi.search", query=query):
+                response = self.rate_limiter.call(self.user.live.search, query=query, priority=priority)
 
-            for item in datos.get("data", []):
-                display_id = item.get("live_info", {}).get("owner", {}).get("display_id")
-                if display_id:
-                    display_ids.append(str(display_id))
+        except ValidationException as e:
+            TIKAPI_ERRORS.labels("search", "validation").inc()
+            logger.error(f"Validation error searching for '{query}': {e}, field: {e.field}")
+            raise Exception(f"Validation error: {e}")
 
-        except (json.JSONDecodeError, TypeError) as e:
-            logger.error(f"Error procesando el JSON: {e}")
+        except ResponseException as e:
+            TIKAPI_ERRORS.labels("search", e.response.status_code).inc()
+            logger.error(f"Response error searching for '{query}': {e}, status: {e.response.status_code}")
+            if e.response.status_code == 429:
+                raise Exception("Rate limit alcanzado. Por favor espera unos minutos antes de hacer otra búsqueda.")
+            elif e.response.status_code == 401:
+                raise Exception("Credenciales de TikAPI inválidas. Verifica tu API key y account key.")
+            else:
+                raise Exception(f"Error de API: {e} (status: {e.response.status_code})")
 
-        return display_ids
+        # Parse the search payload once for streamers and room IDs
+        search = parse_search_response(response_payload(response))
+        logger.info(f"Found {len(search.records)} streamers and {len(search.room_ids)} room IDs from search")
+        return search
+
+    def _search_live_records(
+        self,
+        query: str,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        on_step: Optional[Callable[[SearchStep], None]] = None
+    ) -> LiveSearch:
+        """
+        Uncached search + recommendations for search_live_records and iter_live_records
 
-    def _extract_display_ids_recommended(self, json_str: str) -> List[str]:
+        Args:
+            query: Search query
+            max_age: Only reuse cached recommendations younger than this (seconds)
+            priority: Rate limiter priority
+            on_step: Called with each progressive SearchStep as results arrive
+        """
+        search = self._search(query, priority)
+        room_ids = list(dict.fromkeys(search.room_ids[:self.max_rooms]))
+        seen = set()
+
+        def report(stage: str, records: List[LiveRecord], room_id: Optional[str], rooms_done: int):
+            if on_step is None:
+                return
+            fresh = [record for record in unique_records(records) if record.display_id not in seen]
+            seen.update(record.display_id for record in fresh)
+            on_step(SearchStep(stage, fresh, room_id, rooms_done, len(room_ids)))
+
+        report("search", search.records, None, 0)
+
+        recommended: Dict[str, Optional[List[LiveRecord]]] = {}
+        for room_id, records in self._iter_recommendations(room_ids, max_age, priority):
+            recommended[room_id] = records
+            report("recommendations", records or [], room_id, len(recommended))
+
+        # Merge in room order, so the result does not depend on which call
+        # finished first; remove duplicates while preserving order
+        all_records = list(search.records)
+        for room_id in room_ids:
+            all_records.extend(recommended[room_id] or [])
+        records = unique_records(all_records)
+        logger.info(f"Total unique streamers found for '{query}': {len(records)}")
+
+        failed = sum(1 for room_records in recommended.values() if room_records is None)
+        if failed:
+            logger.warning(f"Not caching results for '{query}': {failed} rooms without recommendations")
+        return LiveSearch(records, complete=failed == 0)
+
+    def iter_live_records(
+        self,
+        query: str,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Iterator[SearchStep]:
         """
-        Extract display IDs from recommended response
+        Progressive variant of search_live_records
+
+        Yields the direct search results as soon as the search call returns,
+        then the recommendations of each room as that call completes (in
+        completion order, not room order). Every step carries only streamers
+        not yielded before.
+
+        The search runs through the search cache exactly like
+        search_live_records (same deadline, coalescing and completeness
+        rule), in a background thread that feeds the steps back. When the
+        result comes from the cache, or from an identical search already in
+        flight, it is yielded as a single "cached" step.
 
         Args:
-            json_str: JSON response text from TikAPI
+            query: Search query
+            max_age: Only reuse cached results younger than this many seconds
+                (0 forces a fresh search)
+            priority: Rate limiter priority
 
-        Returns:
-            List of display IDs (usernames)
+        Yields:
+            SearchStep with stage "cached", "search" or "recommendations"
+
+        Raises:
+            Exception: If rate limit is reached or other API errors occur
         """
-        display_ids = []
-        try:
-            datos = json.loads(json_str)
+        query = query.strip()
+        steps: queue.Queue = queue.Queue()
 
-            for item in datos.get("data", []):
-                display_id = item.get("owner", {}).get("display_id")
-                if display_id:
-                    display_ids.append(str(display_id))
+        def compute() -> LiveSearch:
+            return self._search_live_records(query, max_age, priority, on_step=steps.put)
 
-        except (json.JSONDecodeError, TypeError) as e:
-            logger.error(f"Error procesando el JSON: {e}")
+        def run():
+            try:
+                if self.search_cache is None:
+                    steps.put(compute())
+                else:
+                    steps.put(self.search_cache.get_or_compute(query, compute, max_age=max_age, cache_if=_is_complete))
+            except BaseException as e:
+                steps.put(e)
+
+        # Not the recommend executor: its workers run the fan-out this waits on
+        threading.Thread(target=propagate(run), name="tikapi-stream", daemon=True).start()
+
+        streamed = False
+        while True:
+            item = steps.get()
+            if isinstance(item, SearchStep):
+                streamed = True
+                yield item
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                if not streamed:
+                    yield SearchStep("cached", item.records, None, 0, 0)
+                return
+
+    def expand_live_graph(
+        self,
+        query: str,
+        max_hops: int = 2,
+        call_budget: Optional[int] = None,
+        min_new_ratio: Optional[float] = None,
+        max_age: Optional[float] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Tuple[List[LiveRecord], Dict]:
+        """
+        Breadth-first discovery through the recommendation graph
 
-        return display_ids
+        Hop 1 fetches recommendations for the rooms returned by the search;
+        each further hop follows the rooms of the streamers recommended in the
+        previous hop. A room is never fetched twice in one crawl.
+
+        Args:
+            query: Search query
+            max_hops: Number of recommendation hops
+            call_budget: Maximum TikAPI calls, including the search
+                (default: EXPANSION_CALL_BUDGET or 30)
+            min_new_ratio: Stop when a hop yields a smaller fraction of new
+                streamers than this (default: EXPANSION_MIN_NEW_RATIO or 0.1)
+            max_age: Only reuse cached recommendations younger than this (seconds)
+            priority: Rate limiter priority
+
+        Returns:
+            Tuple of (unique live records in discovery order, expansion report)
+
+        Raises:
+            Exception: If the search call fails
+        """
+        query = query.strip()
+        if call_budget is None:
+            call_budget = int(os.getenv("EXPANSION_CALL_BUDGET", "30"))
+        if min_new_ratio is None:
+            min_new_ratio = float(os.getenv("EXPANSION_MIN_NEW_RATIO", "0.1"))
+
+        search = self._search(query, priority)
+        calls = 1
+        found = {record.display_id: record for record in search.records}
+        visited_rooms = set()
+        frontier = list(dict.fromkeys(search.room_ids))
+        hops = []
+        stop_reason = "max_hops"
+
+        for hop in range(1, max_hops + 1):
+            rooms = [room_id for room_id in frontier if room_id not in visited_rooms]
+            if not rooms:
+                stop_reason = "frontier_exhausted"
+                break
+            remaining = call_budget - calls
+            if remaining <= 0:
+                stop_reason = "budget_exhausted"
+                break
+            rooms = rooms[:remaining]
+            visited_rooms.update(rooms)
+            calls += len(rooms)
+
+            returned = 0
+            new_records = []
+            for recommended in self._fetch_recommendations(rooms, max_age, priority):
+                recommended = recommended or []
+                returned += len(recommended)
+                for record in recommended:
+                    if record.display_id not in found:
+                        found[record.display_id] = record
+                        new_records.append(record)
+
+            new_ratio = len(new_records) / returned if returned else 0.0
+            hops.append({
+                "hop": hop,
+                "rooms": len(rooms),
+                "returned": returned,
+                "new_streamers": len(new_records),
+                "new_ratio": round(new_ratio, 3)
+            })
+            logger.info(f"Hop {hop} for '{query}': {len(rooms)} rooms, {len(new_records)} new streamers")
+
+            if new_ratio < min_new_ratio:
+                stop_reason = "low_yield"
+                break
+
+            frontier = [record.room_id for record in new_records if record.room_id]
+
+        records = list(found.values())
+        report = {
+            "calls": calls,
+            "unique_streamers": len(records),
+            "streamers_per_call": round(len(records) / calls, 2),
+            "rooms_visited": len(visited_rooms),
+            "hops": hops,
+            "stop_reason": stop_reason
+        }
+        logger.info(f"Expansion for '{query}': {report['unique_streamers']} streamers with {calls} calls ({stop_reason})")
+        return records, report
 
     def search_live_streamers(self, query: str) -> List[str]:
         """
@@ -115,140 +511,164 @@ class TikAPIService:
         Raises:
             Exception: If rate limit is reached or other API errors occur
         """
-        all_display_ids = []
+        return [record.display_id for record in self.search_live_records(query)]
 
-        try:
-            # Search for live streams
-            logger.info(f"Searching for live streams with query: {query}")
-            response = self.user.live.search(query=query)
-
-            # Extract display IDs from search results
-            search_display_ids = self._extract_display_ids(response.text)
-            all_display_ids.extend(search_display_ids)
-            logger.info(f"Found {len(search_display_ids)} streamers from search")
+    async def search_live_records_async(self, query: str, max_age: Optional[float] = None) -> List[LiveRecord]:
+        """
+        Non-blocking variant of search_live_records for use on the event loop
 
-            # Extract room IDs for recommendations (limit to first 5 for speed)
-            room_ids = self._extract_room_ids(response.text)
-            logger.info(f"Found {len(room_ids)} room IDs, using first 5 for recommendations")
+        The TikAPI SDK is built on blocking requests calls, so the search runs
+        in a worker thread and the event loop stays free for other requests.
 
-            # Get recommended streamers for each room (limited to 5 for faster results)
-            for room_id in room_ids[:5]:
-                try:
-                    response1 = self.user.live.recommend(room_id=str(room_id))
-                    recommended_ids = self._extract_display_ids_recommended(response1.text)
-                    all_display_ids.extend(recommended_ids)
-                    logger.info(f"Found {len(recommended_ids)} recommended streamers for room {room_id}")
+        Args:
+            query: Search query
+            max_age: Only reuse cached results younger than this many seconds
 
-                except ValidationException as e:
-                    logger.error(f"Validation error for room {room_id}: {e}, field: {e.field}")
+        Returns:
+            List of live records, one per unique streamer
+        """
+        return await asyncio.to_thread(self.search_live_records, query, max_age)
 
-                except ResponseException as e:
-                    logger.error(f"Response error for room {room_id}: {e}, status: {e.response.status_code}")
+    def rate_limit_stats(self) -> Dict:
+        """Counters of the shared TikAPI rate limiter"""
+        return self.rate_limiter.stats()
 
-        except ValidationException as e:
-            logger.error(f"Validation error searching for '{query}': {e}, field: {e.field}")
-            raise Exception(f"Validation error: {e}")
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the search and recommendation caches"""
+        return {
+            "search": self.search_cache.stats() if self.search_cache is not None else None,
+            "recommend": self.recommend_cache.stats() if self.recommend_cache is not None else None
+        }
 
-        except ResponseException as e:
-            logger.error(f"Response error searching for '{query}': {e}, status: {e.response.status_code}")
-            if e.response.status_code == 429:
-                raise Exception("Rate limit alcanzado. Por favor espera unos minutos antes de hacer otra búsqueda.")
-            elif e.response.status_code == 401:
-                raise Exception("Credenciales de TikAPI inválidas. Verifica tu API key y account key.")
-            else:
-                raise Exception(f"Error de API: {e} (status: {e.response.status_code})")
+    def _scrape_query(self, query: str) -> tuple:
+        """Search one query for a scrape cycle; returns (query, records, scanned_at, error)"""
+        logger.info(f"Scraping query: {query}")
+        try:
+            records = self.search_live_records(query, priority=PRIORITY_BACKGROUND)
+            return query, records, datetime.utcnow(), None
+        except Exception as e:
+            logger.error(f"Error scraping query '{query}': {e}")
+            return query, [], datetime.utcnow(), str(e)
 
-        # Remove duplicates while preserving order
-        unique_display_ids = list(dict.fromkeys(all_display_ids))
-        logger.info(f"Total unique streamers found for '{query}': {len(unique_display_ids)}")
+    def fetch_queries(self, queries: List[str], max_concurrency: Optional[int] = None) -> List[tuple]:
+        """
+        Search multiple queries in parallel without storing anything
 
-        return unique_display_ids
+        Args:
+            queries: List of search queries
+            max_concurrency: Queries searched at the same time
+                (default: SCRAPE_CONCURRENCY or 4)
 
-    def scrape_multiple_queries(self, queries: List[str], db: Session) -> Dict:
+        Returns:
+            List of (query, records, scanned_at, error) tuples in query order
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+
+        if max_concurrency > 1 and len(queries) > 1:
+            with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tikapi-query") as executor:
+                return list(executor.map(propagate(self._scrape_query), queries))
+        return [self._scrape_query(query) for query in queries]
+
+    def scrape_multiple_queries(
+        self,
+        queries: List[str],
+        db: Session,
+        max_concurrency: Optional[int] = None
+    ) -> Dict:
         """
-        Scrape multiple queries and store results in database
+        Scrape multiple queries in parallel and store results in one transaction
 
         Args:
             queries: List of search queries
             db: Database session
+            max_concurrency: Queries searched at the same time
+                (default: SCRAPE_CONCURRENCY or 4)
 
         Returns:
             Dictionary with scraping statistics
         """
-        total_found = 0
-        total_new = 0
-        total_updated = 0
-        errors = []
+        # Fetch every query first, under the concurrency budget
+        results = self.fetch_queries(queries, max_concurrency)
 
-        for query in queries:
-            try:
-                logger.info(f"Scraping query: {query}")
-                usernames = self.search_live_streamers(query)
-
-                # Update database
-                for username in usernames:
-                    existing = db.query(Streamer).filter(
-                        Streamer.username == username
-                    ).first()
-
-                    if existing:
-                        # Update existing streamer
-                        existing.last_seen = datetime.utcnow()
-                        existing.times_seen += 1
-                        existing.is_live = True
-                        existing.query = query  # Update with latest query
-                        total_updated += 1
-                        logger.info(f"Updated streamer: {username}")
-                    else:
-                        # Create new streamer
-                        new_streamer = Streamer(
-                            username=username,
-                            query=query,
-                            viewers=0,  # TikAPI doesn't provide viewer count in this endpoint
-                            first_seen=datetime.utcnow(),
-                            last_seen=datetime.utcnow(),
-                            times_seen=1,
-                            is_live=True
-                        )
-                        db.add(new_streamer)
-                        total_new += 1
-                        logger.info(f"Added new streamer: {username}")
-
-                total_found += len(usernames)
-
-                # Record scan history
-                scan = ScanHistory(
-                    timestamp=datetime.utcnow(),
-                    query=query,
-                    streamers_found=len(usernames),
-                    success=True
-                )
-                db.add(scan)
-                db.commit()
-
-            except Exception as e:
-                error_msg = f"Error scraping query '{query}': {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-
-                # Record failed scan
-                scan = ScanHistory(
-                    timestamp=datetime.utcnow(),
-                    query=query,
-                    streamers_found=0,
-                    success=False,
-                    error_message=str(e)
-                )
-                db.add(scan)
-                db.commit()
+        # Then write the whole cycle in a single transaction
+        try:
+            rows = [
+                record_scan(db, query, records, scanned_at=scanned_at, error=error)
+                for query, records, scanned_at, error in results
+            ]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        invalidate_statistics()
 
-        return {
-            "total_found": total_found,
-            "total_new": total_new,
-            "total_updated": total_updated,
-            "queries_processed": len(queries),
-            "errors": errors
-        }
+        return summarize_scrape(results, rows)
+
+
+def summarize_scrape(results: List[tuple], rows: List[List[dict]]) -> Dict:
+    """
+    Scraping statistics for a stored cycle
+
+    Args:
+        results: (query, records, scanned_at, error) tuples from fetch_queries
+        rows: Streamer dictionaries stored for each result
+
+    Returns:
+        Dictionary with scraping statistics
+    """
+    total_found = 0
+    total_new = 0
+    total_updated = 0
+    errors = []
+
+    for (query, _, _, error), query_rows in zip(results, rows):
+        if error is not None:
+            errors.append(f"Error scraping query '{query}': {error}")
+
+        new_count = sum(1 for row in query_rows if row["times_seen"] == 1)
+        total_found += len(query_rows)
+        total_new += new_count
+        total_updated += len(query_rows) - new_count
+        if error is None:
+            logger.info(f"Query '{query}': {new_count} new, {len(query_rows) - new_count} updated streamers")
+
+    return {
+        "total_found": total_found,
+        "total_new": total_new,
+        "total_updated": total_updated,
+        "queries_processed": len(results),
+        "errors": errors
+    }
+
+
+_services: Dict[tuple, TikAPIService] = {}
+_services_lock = threading.Lock()
+
+
+def get_tikapi_service(api_key: Optional[str] = None, account_key: Optional[str] = None) -> Optional[TikAPIService]:
+    """
+    Get the shared, long-lived TikAPIService for a set of credentials
+
+    Args:
+        api_key: TikAPI API key (default: TIKAPI_KEY)
+        account_key: TikAPI account key (default: TIKAPI_ACCOUNT_KEY)
+
+    Returns:
+        TikAPIService instance, or None if credentials are not configured
+    """
+    api_key = api_key or os.getenv("TIKAPI_KEY")
+    account_key = account_key or os.getenv("TIKAPI_ACCOUNT_KEY")
+    if not api_key or not account_key:
+        return None
+
+    key = (api_key, account_key)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = TikAPIService(api_key=api_key, account_key=account_key)
+            _services[key] = service
+        return service
 
 
 def run_scraper_job(queries: List[str], db: Session, api_key: str, account_key: str):
@@ -264,7 +684,7 @@ def run_scraper_job(queries: List[str], db: Session, api_key: str, account_key:
     Returns:
         Dictionary with scraping statistics
     """
-    service = TikAPIService(api_key=api_key, account_key=account_key)
+    service = get_tikapi_service(api_key=api_key, account_key=account_key)
     results = service.scrape_multiple_queries(queries, db)
     logger.info(f"Scraping completed: {results}")
     return results
@@ -0,0 +1,423 @@
+"""
+Request-scoped tracing: nested spans across routes, TikAPI calls and the database
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_MODES = ("memory", "otel", "off")
+
+
+class Span:
+    """One timed operation inside a trace"""
+
+    __slots__ = ("name", "span_id", "parent_id", "trace", "start", "end", "attributes", "error")
+
+    def __init__(self, name: str, trace: "Trace", parent_id: Optional[int], attributes: Dict):
+        self.name = name
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value):
+        """Attach a value shown in the slow-trace breakdown and exported to OpenTelemetry"""
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        """Mark the span as failed without raising"""
+        self.error = str(error)
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to end (or to now while running)"""
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Trace:
+    """Spans of one root operation, in start order"""
+
+    __slots__ = ("trace_id", "root", "spans", "dropped", "started_ns", "max_spans")
+
+    def __init__(self, max_spans: int):
+        self.trace_id = random.getrandbits(128)
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.started_ns = time.time_ns()
+        self.max_spans = max_spans
+
+    def add(self, span: Span) -> bool:
+        """Keep a span unless the trace is full"""
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def breakdown(self) -> List[Dict]:
+        """Spans with depth, offset and duration, parents before children"""
+        children: Dict[Optional[int], List[Span]] = {}
+        for span in self.spans:
+            children.setdefault(span.parent_id, []).append(span)
+
+        rows = []
+        stack = [(self.root, 0)]
+        while stack:
+            span, depth = stack.pop()
+            rows.append({
+                "name": span.name,
+                "depth": depth,
+                "offset_ms": round((span.start - self.root.start) * 1000, 1),
+                "duration_ms": round(span.duration * 1000, 1),
+                "attributes": span.attributes,
+                "error": span.error
+            })
+            for child in sorted(children.get(span.span_id, []), key=lambda s: s.start, reverse=True):
+                stack.append((child, depth + 1))
+        return rows
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": f"{self.trace_id:032x}",
+            "name": self.root.name,
+            "started_at": datetime.utcfromtimestamp(self.started_ns / 1e9).isoformat(),
+            "duration_ms": round(self.root.duration * 1000, 1),
+            "dropped_spans": self.dropped,
+            "spans": self.breakdown()
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    """Context manager that makes a span current for the with block"""
+
+    __slots__ = ("tracer", "name", "attributes", "span", "token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = self.tracer.start_span(self.name, self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, traceback):
+        _current_span.reset(self.token)
+        if exc is not None and self.span.error is None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        self.tracer.end_span(self.span)
+
+
+class _NoopSpan:
+    """Stands in for spans while tracing is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class OpenTelemetryExporter:
+    """
+    Replays finished traces as OpenTelemetry spans
+
+    Spans are created after the fact with their recorded timestamps, so the
+    in-process tracer stays the only thing on the hot path. The OTLP/HTTP
+    endpoint comes from the standard OTEL_EXPORTER_OTLP_* variables.
+    """
+
+    def __init__(self):
+        from opentelemetry import trace as otel_trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        self._otel_trace = otel_trace
+        self.provider = TracerProvider(
+            resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "tiktok-live-monitor")})
+        )
+        self.provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self.tracer = self.provider.get_tracer(__name__)
+
+    def export(self, trace: Trace):
+        """Send a finished trace"""
+        wall_start_ns = trace.started_ns
+        origin = trace.root.start
+        otel_spans = {}
+        for span in sorted(trace.spans, key=lambda s: s.start):
+            parent = otel_spans.get(span.parent_id)
+            context = self._otel_trace.set_span_in_context(parent) if parent is not None else None
+            otel_span = self.tracer.start_span(
+                span.name,
+                context=context,
+                start_time=wall_start_ns + int((span.start - origin) * 1e9),
+                attributes={key: value for key, value in span.attributes.items() if value is not None}
+            )
+            if span.error is not None:
+                otel_span.set_status(self._otel_trace.Status(self._otel_trace.StatusCode.ERROR, span.error))
+            otel_spans[span.span_id] = otel_span
+        for span in trace.spans:
+            otel_spans[span.span_id].end(end_time=wall_start_ns + int((span.duration + span.start - origin) * 1e9))
+
+    def shutdown(self):
+        self.provider.shutdown()
+
+
+class Tracer:
+    """
+    Records spans per trace and reports the slow ones
+
+    A span started with no current span begins a new trace; nested spans,
+    including those in thread-pool work started through propagate(), join
+    it. When the root span ends, a trace slower than slow_threshold is
+    logged with its per-span breakdown and kept for /api/traces/slow.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        slow_threshold: Optional[float] = None,
+        buffer_size: Optional[int] = None,
+        max_spans: Optional[int] = None
+    ):
+        """
+        Args:
+            mode: "memory", "otel" (also export to OpenTelemetry) or "off"
+                (default: TRACING or memory)
+            slow_threshold: Seconds after which a trace is logged
+                (default: TRACE_SLOW_SECONDS or 5)
+            buffer_size: Slow traces kept in memory (default: TRACE_BUFFER or 50)
+            max_spans: Spans recorded per trace (default: TRACE_MAX_SPANS or 1000)
+        """
+        mode = (mode or os.getenv("TRACING", "memory")).lower()
+        if mode not in TRACING_MODES:
+            logger.warning(f"Unknown TRACING mode '{mode}', using memory")
+            mode = "memory"
+        self.slow_threshold = (
+            slow_threshold if slow_threshold is not None else float(os.getenv("TRACE_SLOW_SECONDS", "5"))
+        )
+        self.buffer_size = buffer_size if buffer_size is not None else int(os.getenv("TRACE_BUFFER", "50"))
+        self.max_spans = max_spans if max_spans is not None else int(os.getenv("TRACE_MAX_SPANS", "1000"))
+        self._slow: deque = deque(maxlen=self.buffer_size)
+        self._lock = threading.Lock()
+
+        self.exporter: Optional[OpenTelemetryExporter] = None
+        if mode == "otel":
+            try:
+                self.exporter = OpenTelemetryExporter()
+            except ImportError:
+                logger.warning(
+                    "TRACING=otel needs opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http; "
+                    "keeping traces in memory only"
+                )
+                mode = "memory"
+        self.mode = mode
+        self.enabled = mode != "off"
+
+        self.traces = 0
+        self.slow_traces = 0
+
+    def span(self, name: str, **attributes):
+        """Context manager timing the with block as a span of the current trace"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _SpanScope(self, name, attributes)
+
+    def start_span(self, name: str, attributes: Optional[Dict] = None, parent: Optional[Span] = None) -> Span:
+        """Start a span without making it current; end it with end_span()"""
+        parent = parent if parent is not None else _current_span.get()
+        if parent is None:
+            trace = Trace(self.max_spans)
+            span = Span(name, trace, None, attributes or {})
+            trace.root = span
+            trace.spans.append(span)
+        else:
+            span = Span(name, parent.trace, parent.span_id, attributes or {})
+            parent.trace.add(span)
+        return span
+
+    def start_child(self, name: str, attributes: Optional[Dict] = None) -> Optional[Span]:
+        """Start a span only inside an existing trace (used for database statements)"""
+        parent = _current_span.get()
+        if parent is None or not self.enabled:
+            return None
+        span = Span(name, parent.trace, parent.span_id, attributes or {})
+        return span if parent.trace.add(span) else None
+
+    def end_span(self, span: Span):
+        """Finish a span; finishing the root span completes the trace"""
+        span.end = time.perf_counter()
+        if span.trace.root is span:
+            self._finish(span.trace)
+
+    def _finish(self, trace: Trace):
+        """Log and keep a slow trace, and export it when OpenTelemetry is on"""
+        duration = trace.root.duration
+        slow = duration >= self.slow_threshold
+        with self._lock:
+            self.traces += 1
+            if slow:
+                self.slow_traces += 1
+                self._slow.append(trace)
+
+        if slow:
+            lines = [f"Slow trace {duration:.2f}s: {trace.root.name} ({len(trace.spans)} spans)"]
+            for row in trace.breakdown():
+                attributes = " ".join(f"{key}={value}" for key, value in row["attributes"].items())
+                error = f" ERROR {row['error']}" if row["error"] else ""
+                lines.append(
+                    f"  {row['offset_ms']:>9.1f}ms {row['duration_ms']:>9.1f}ms  "
+                    f"{'  ' * row['depth']}{row['name']} {attributes}{error}".rstrip()
+                )
+            if trace.dropped:
+                lines.append(f"  ... {trace.dropped} more spans not recorded")
+            logger.warning("\n".join(lines))
+
+        if self.exporter is not None:
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                logger.error(f"Error exporting trace to OpenTelemetry: {e}")
+
+    def slow(self, limit: Optional[int] = None) -> List[Dict]:
+        """Most recent slow traces first"""
+        with self._lock:
+            traces = list(self._slow)
+        traces.reverse()
+        return [trace.to_dict() for trace in traces[:limit]]
+
+    def shutdown(self):
+        """Flush spans waiting in the OpenTelemetry exporter"""
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+    def stats(self) -> Dict:
+        """Mode and trace counters"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "slow_threshold": self.slow_threshold,
+                "traces": self.traces,
+                "slow_traces": self.slow_traces,
+                "buffered_slow_traces": len(self._slow)
+            }
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    """Time the with block as a span of the current trace (a new trace if there is none)"""
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """The running span, or a no-op stand-in outside any trace"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Bind fn to the caller's trace context for work handed to a thread pool
+
+    ThreadPoolExecutor does not carry context variables into its threads;
+    each call runs in its own copy of the captured context, so the wrapper
+    may be used with executor.map().
+    """
+    context = copy_context()
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_span = tracer.start_child("db.query", {"statement": " ".join(statement.split())[:200]})
+    if db_span is not None:
+        if executemany:
+            db_span.attributes["executemany"] = True
+        conn.info.setdefault("trace_spans", []).append(db_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        tracer.end_span(spans.pop())
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get("trace_spans") if connection is not None else None
+    if spans:
+        db_span = spans.pop()
+        db_span.set_error(exception_context.original_exception)
+        tracer.end_span(db_span)
+
+
+def instrument_engine(engine):
+    """Record every statement run inside a trace as a db.query span"""
+    from sqlalchemy import event
+
+    if not tracer.enabled or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class TracingMiddleware:
+    """ASGI middleware running every HTTP request in its own trace"""
+
+    def __init__(self, app, exclude=("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                request_span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        with span(f"{scope['method']} {scope['path']}", **{"http.method": scope["method"]}) as request_span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    request_span.name = f"{scope['method']} {route}"
+                    request_span.set_attribute("http.route", route)
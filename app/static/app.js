@@ -6,6 +6,13 @@ class TikTokMonitor {
         this.currentPage = 1;
         this.pageSize = 20;
         this.totalStreamers = 0;
+        this.pageCursors = [null]; // next_cursor of each loaded page
+        this.streamers = []; // rows of the current page
+        this.lastSeq = null; // last delta batch applied
+        this.awaitingSubscribed = false;
+        this.loadingStreamers = false;
+        this.deltasDuringLoad = [];
+        this.statsTimer = null;
         this.charts = {};
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
@@ -17,7 +24,7 @@ class TikTokMonitor {
         this.connectWebSocket();
         this.setupEventListeners();
         this.loadInitialData();
-        this.startAutoRefresh();
+        this.startHeartbeat();
     }
 
     // WebSocket Connection
@@ -33,6 +40,8 @@ class TikTokMonitor {
                 this.updateConnectionStatus(true);
                 this.reconnectAttempts = 0;
                 this.showToast('Conectado al servidor', 'success');
+                // Resume the delta stream where it stopped
+                this.subscribe(this.lastSeq);
             };
 
             this.ws.onmessage = (event) => {
@@ -86,6 +95,27 @@ class TikTokMonitor {
                 this.showToast(`Nuevo streamer: @${message.data.username}`, 'info');
                 this.loadStreamers();
                 break;
+            case 'subscribed':
+                if (this.awaitingSubscribed) {
+                    // Fresh subscription: reload once, deltas keep it current
+                    this.awaitingSubscribed = false;
+                    this.lastSeq = message.seq;
+                    this.loadStreamers();
+                }
+                break;
+            case 'resync_required':
+                // Missed deltas are gone: reload and continue from here
+                this.lastSeq = message.seq;
+                this.loadStreamers();
+                this.loadStatistics();
+                break;
+            case 'deltas':
+                if (this.lastSeq !== null && message.seq <= this.lastSeq) break;
+                this.lastSeq = message.seq;
+                if (this.loadingStreamers) this.deltasDuringLoad.push(...message.deltas);
+                this.applyDeltas(message.deltas);
+                this.scheduleStatisticsRefresh();
+                break;
             case 'pong':
                 // Heartbeat response
                 break;
@@ -94,6 +124,82 @@ class TikTokMonitor {
         }
     }
 
+    subscribe(since) {
+        if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return false;
+
+        const query = document.getElementById('filter-query').value;
+        this.awaitingSubscribed = since === null;
+        this.ws.send(JSON.stringify({
+            action: 'subscribe',
+            query: query || null,
+            since: since
+        }));
+        return true;
+    }
+
+    applyDeltas(deltas) {
+        const status = document.getElementById('filter-status').value;
+        let changed = false;
+
+        deltas.forEach(delta => {
+            const index = this.streamers.findIndex(s => s.username === delta.username);
+
+            if (delta.op === 'offline') {
+                if (index === -1) return;
+                if (status === 'true') {
+                    this.streamers.splice(index, 1);
+                    this.totalStreamers--;
+                } else {
+                    this.streamers[index].is_live = false;
+                }
+                changed = true;
+                return;
+            }
+
+            // New and updated streamers are live
+            if (status === 'false') {
+                if (index !== -1) {
+                    this.streamers.splice(index, 1);
+                    this.totalStreamers--;
+                    changed = true;
+                }
+                return;
+            }
+
+            const { op, ...fields } = delta;
+            const row = { ...(index !== -1 ? this.streamers[index] : {}), ...fields, is_live: true };
+            if (op === 'new') this.totalStreamers++;
+
+            if (this.currentPage === 1) {
+                // Most recently seen first, like /api/streamers
+                if (index !== -1) this.streamers.splice(index, 1);
+                this.streamers.unshift(row);
+                changed = true;
+            } else if (index !== -1) {
+                this.streamers[index] = row;
+                changed = true;
+            }
+        });
+
+        if (!changed) return;
+        if (this.currentPage === 1) {
+            this.streamers.length = Math.min(this.streamers.length, this.pageSize);
+            // Rows moved between pages: later pages fall back to offsets
+            this.pageCursors = [null];
+        }
+        this.renderStreamers(this.streamers);
+        this.updatePagination();
+    }
+
+    scheduleStatisticsRefresh() {
+        // At most one statistics reload per 5 seconds of deltas
+        if (this.statsTimer) return;
+        this.statsTimer = setTimeout(() => {
+            this.statsTimer = null;
+            this.loadStatistics();
+        }, 5000);
+    }
+
     updateConnectionStatus(connected) {
         const indicator = document.getElementById('status-indicator');
         const text = document.getElementById('status-text');
@@ -118,11 +224,14 @@ class TikTokMonitor {
 
         document.getElementById('filter-query').addEventListener('change', () => {
             this.currentPage = 1;
-            this.loadStreamers();
+            this.pageCursors = [null];
+            // The new subscription reloads the page once it is active
+            if (!this.subscribe(null)) this.loadStreamers();
         });
 
         document.getElementById('filter-status').addEventListener('change', () => {
             this.currentPage = 1;
+            this.pageCursors = [null];
             this.loadStreamers();
         });
 
@@ -174,22 +283,37 @@ class TikTokMonitor {
             const query = document.getElementById('filter-query').value;
             const status = document.getElementById('filter-status').value;
             const offset = (this.currentPage - 1) * this.pageSize;
+            const cursor = this.pageCursors[this.currentPage - 1];
 
-            let url = `/api/streamers?limit=${this.pageSize}&offset=${offset}`;
+            // Follow the cursor of the previous page; offset only as a fallback
+            let url = `/api/streamers?limit=${this.pageSize}`;
+            url += cursor ? `&cursor=${encodeURIComponent(cursor)}` : `&offset=${offset}`;
             if (query) url += `&query=${encodeURIComponent(query)}`;
             if (status) url += `&is_live=${status}`;
 
+            // Deltas that arrive meanwhile are applied again on top of the response
+            this.loadingStreamers = true;
+            this.deltasDuringLoad = [];
+
             const response = await fetch(url);
             const data = await response.json();
 
             if (data.success) {
                 this.totalStreamers = data.total;
-                this.renderStreamers(data.data);
+                this.pageCursors[this.currentPage] = data.next_cursor;
+                this.streamers = data.data;
+                this.renderStreamers(this.streamers);
                 this.updatePagination();
+
+                const pending = this.deltasDuringLoad;
+                this.loadingStreamers = false;
+                if (pending.length) this.applyDeltas(pending);
             }
         } catch (error) {
             console.error('Error loading streamers:', error);
             this.showToast('Error cargando streamers', 'error');
+        } finally {
+            this.loadingStreamers = false;
         }
     }
 
@@ -426,11 +550,8 @@ class TikTokMonitor {
         window.open(`https://www.tiktok.com/@${username}`, '_blank');
     }
 
-    startAutoRefresh() {
-        // Auto-refresh every 2 minutes
-        setInterval(() => {
-            this.loadStreamers();
-        }, 120000);
+    startHeartbeat() {
+        // Streamer changes are pushed as deltas, no periodic reloads
 
         // Send WebSocket ping every 30 seconds
         setInterval(() => {
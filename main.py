@@ -7,14 +7,28 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from dotenv import load_dotenv
 
-from app.models.database import Database
-from app.services.scraper import run_scraper_job
+from app.models.database import init_database, close_database, get_database
+from app.services.crawler import Crawler, parse_query_intervals
+from app.services.statistics import statistics_cache_stats
+from app.services.pagination import count_cache_stats
+from app.services.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, JOB_DURATION, MetricsMiddleware, instrument_engine, operation, registry
+)
+from app.services import tracing
+from app.services.tracing import TracingMiddleware, span, tracer
+from app.services.sweeper import LiveStatusSweeper
+from app.services.retention import RetentionJob
+from app.services.streamer_index import index_enabled_for, streamer_index
+from app.services.scan_writer import scan_writer
+from app.services.live_feed import live_feed
 from app.api.routes import router, broadcast_update
+from app.api.websocket import manager
+from app.services.tikapi_service import get_tikapi_service
 
 # Load environment variables
 load_dotenv()
@@ -31,69 +45,166 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global instances
-db_instance = Database(os.getenv("DATABASE_URL", "sqlite:///./tiktok_monitor.db"))
 scheduler = AsyncIOScheduler()
 
 
 # Configuration
 SEARCH_QUERIES = os.getenv("SEARCH_QUERIES", "gaming,music,cooking").split(",")
 SCRAPE_INTERVAL_MINUTES = int(os.getenv("SCRAPE_INTERVAL_MINUTES", "5"))
+SEARCH_QUERY_INTERVALS = parse_query_intervals(os.getenv("SEARCH_QUERY_INTERVALS", ""))
+SCRAPE_JITTER_SECONDS = float(os.getenv("SCRAPE_JITTER_SECONDS", "30"))
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+SCRAPE_TICK_SECONDS = int(os.getenv("SCRAPE_TICK_SECONDS", "30"))
+ENABLE_SCHEDULER = os.getenv("ENABLE_SCHEDULER", "false").lower() == "true"
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "60"))
+RETENTION_INTERVAL_MINUTES = int(os.getenv("RETENTION_INTERVAL_MINUTES", "60"))
 TIKAPI_KEY = os.getenv("TIKAPI_KEY")
 TIKAPI_ACCOUNT_KEY = os.getenv("TIKAPI_ACCOUNT_KEY")
 
+crawler = Crawler(
+    SEARCH_QUERIES,
+    interval_minutes=SCRAPE_INTERVAL_MINUTES,
+    query_intervals=SEARCH_QUERY_INTERVALS,
+    jitter_seconds=SCRAPE_JITTER_SECONDS,
+    max_concurrency=SCRAPE_CONCURRENCY,
+    api_key=TIKAPI_KEY,
+    account_key=TIKAPI_ACCOUNT_KEY
+)
+sweeper = LiveStatusSweeper()
+retention = RetentionJob()
 
-async def scheduled_scrape_job():
-    """Scheduled job to scrape TikTok live streams"""
-    logger.info(f"Starting scheduled scrape job for queries: {SEARCH_QUERIES}")
 
+async def scheduled_scrape_job():
+    """Scheduled job: scan every query that is due and notify WebSocket clients"""
     try:
         # Validate TikAPI credentials
         if not TIKAPI_KEY or not TIKAPI_ACCOUNT_KEY:
             logger.error("TikAPI credentials not configured. Please set TIKAPI_KEY and TIKAPI_ACCOUNT_KEY environment variables.")
             return
 
-        # Get database session
-        db = db_instance.get_session()
-
-        # Run scraper with TikAPI credentials
-        results = await run_scraper_job(
-            SEARCH_QUERIES,
-            db,
-            api_key=TIKAPI_KEY,
-            account_key=TIKAPI_ACCOUNT_KEY
-        )
-
-        logger.info(f"Scrape job completed: {results}")
+        with span("job.crawler"):
+            report = await crawler.run_cycle()
+        if report is None:
+            return
+        JOB_DURATION.labels("crawler").observe(report["duration_seconds"])
 
         # Broadcast update to WebSocket clients
         await broadcast_update("scan_complete", {
-            "results": results,
-            "queries": SEARCH_QUERIES
+            "results": report["results"],
+            "queries": report["queries"],
+            "duration_seconds": report["duration_seconds"]
         })
 
-        db.close()
-
     except Exception as e:
         logger.error(f"Error in scheduled scrape job: {e}", exc_info=True)
 
 
+async def scheduled_sweep_job():
+    """Scheduled job: mark streamers that are no longer seen as offline"""
+    try:
+        with operation("live_sweeper"), JOB_DURATION.labels("live_sweeper").time(), span("job.live_sweeper"):
+            await asyncio.to_thread(sweeper.run)
+    except Exception as e:
+        logger.error(f"Error in live-status sweep: {e}", exc_info=True)
+
+
+async def scheduled_retention_job():
+    """Scheduled job: prune old scan history and sightings, then compact"""
+    try:
+        with operation("retention"), JOB_DURATION.labels("retention").time(), span("job.retention"):
+            await asyncio.to_thread(retention.run)
+    except Exception as e:
+        logger.error(f"Error in retention job: {e}", exc_info=True)
+
+
+def warm_streamer_index():
+    """Load known streamers into the in-memory index used by the write path"""
+    db = get_database().get_session()
+    try:
+        streamer_index.warm(db)
+    except Exception as e:
+        logger.error(f"Error warming streamer index: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events"""
     # Startup
     logger.info("Starting TikTok Live Monitor...")
 
-    # Initialize database
-    db_instance.create_tables()
-    logger.info("Database tables created")
+    # Initialize the shared database engine and pool
+    db_instance = init_database(os.getenv("DATABASE_URL", "sqlite:///./tiktok_monitor.db"))
+    db_instance.migrate()
+    logger.info("Database schema up to date")
+    instrument_engine(db_instance.engine)
+    tracing.instrument_engine(db_instance.engine)
+
+    # Writes use the database until the index is warm, so startup doesn't wait
+    use_index = index_enabled_for(db_instance.engine.dialect.name)
+    if use_index:
+        warm_task = asyncio.create_task(asyncio.to_thread(warm_streamer_index))
+
+    # Single writer for search and crawl results; the changes it commits are
+    # pushed to subscribed WebSocket clients
+    live_feed.attach(asyncio.get_running_loop(), manager.publish_deltas)
+    scan_writer.start()
+
+    # Live-status sweeps run for manual searches too
+    scheduler.add_job(
+        scheduled_sweep_job,
+        IntervalTrigger(seconds=SWEEP_INTERVAL_SECONDS),
+        id="live_sweeper",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+
+    # Scan history / sighting retention, in small batches
+    scheduler.add_job(
+        scheduled_retention_job,
+        IntervalTrigger(minutes=RETENTION_INTERVAL_MINUTES),
+        id="retention",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+
+    if ENABLE_SCHEDULER:
+        # The tick only runs queries that are due; max_instances=1 plus the
+        # crawler's own guard skip ticks while a cycle is still running
+        scheduler.add_job(
+            scheduled_scrape_job,
+            IntervalTrigger(seconds=SCRAPE_TICK_SECONDS),
+            id="crawler",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        logger.info(
+            f"Crawler enabled for {len(crawler.queries)} queries "
+            f"(every {SCRAPE_INTERVAL_MINUTES} min, concurrency {SCRAPE_CONCURRENCY})"
+        )
+    else:
+        # No automatic scraping - only manual searches
+        logger.info("Automatic scraping disabled - use manual search only")
 
-    # No automatic scraping - only manual searches
-    logger.info("Automatic scraping disabled - use manual search only")
+    scheduler.start()
 
     yield
 
     # Shutdown
     logger.info("Shutting down TikTok Live Monitor...")
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    # Store every scan still queued before the pool goes away
+    await scan_writer.stop()
+    live_feed.detach()
+    if use_index:
+        await warm_task
+    close_database()
+    tracer.shutdown()
 
 
 # Create FastAPI app
@@ -106,6 +217,8 @@ app = FastAPI(
 
 # Include API routes
 app.include_router(router)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -127,15 +240,86 @@ async def search_page():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    service = get_tikapi_service()
     return {
         "status": "healthy",
         "scheduler_running": scheduler.running,
         "queries": SEARCH_QUERIES,
         "scrape_interval": f"{SCRAPE_INTERVAL_MINUTES} minutes",
-        "tikapi_configured": bool(TIKAPI_KEY and TIKAPI_ACCOUNT_KEY)
+        "crawler": crawler.stats(),
+        "live_sweeper": sweeper.stats(),
+        "retention": retention.stats(),
+        "streamer_index": streamer_index.stats(),
+        "scan_writer": scan_writer.stats(),
+        "websocket": manager.stats(),
+        "live_feed": live_feed.stats(),
+        "tracing": tracer.stats(),
+        "tikapi_configured": bool(TIKAPI_KEY and TIKAPI_ACCOUNT_KEY),
+        "cache": service.cache_stats() if service is not None else None,
+        "statistics_cache": statistics_cache_stats(),
+        "rate_limit": service.rate_limit_stats() if service is not None else None
     }
 
 
+def _cache_samples(field: str):
+    """One sample per cache for a field of TTLCache.stats()"""
+    service = get_tikapi_service()
+    caches = dict(service.cache_stats()) if service is not None else {}
+    caches["statistics"] = statistics_cache_stats()
+    caches["count"] = count_cache_stats()
+    caches["streamer_index"] = streamer_index.stats()
+    return [((name,), stats[field]) for name, stats in caches.items() if stats is not None]
+
+
+def _rate_limit_samples(field: str):
+    """The shared rate limiter's counter for a field of RateLimiter.stats()"""
+    service = get_tikapi_service()
+    return [((), service.rate_limit_stats()[field])] if service is not None else []
+
+
+# Collected from component stats() when /metrics is scraped
+registry.callback("cache_hits_total", "Cache hits", lambda: _cache_samples("hits"), ["cache"], "counter")
+registry.callback("cache_misses_total", "Cache misses", lambda: _cache_samples("misses"), ["cache"], "counter")
+registry.callback(
+    "cache_hit_ratio", "Cache hits over lookups since startup", lambda: _cache_samples("hit_rate"), ["cache"]
+)
+registry.callback(
+    "tikapi_rate_limited_total", "TikAPI 429 responses, including retried ones",
+    lambda: _rate_limit_samples("rate_limited"), type="counter"
+)
+registry.callback(
+    "tikapi_retries_total", "TikAPI calls retried after a 429",
+    lambda: _rate_limit_samples("retries"), type="counter"
+)
+registry.callback(
+    "tikapi_throttled_total", "TikAPI calls that waited for a rate limiter token",
+    lambda: _rate_limit_samples("throttled"), type="counter"
+)
+registry.callback("websocket_connections", "Connected WebSocket clients", lambda: [((), manager.active_connections)])
+registry.callback(
+    "websocket_dropped_messages_total", "WebSocket messages dropped from full client queues",
+    lambda: [((), manager.dropped)], type="counter"
+)
+registry.callback(
+    "websocket_evicted_total", "WebSocket clients disconnected for slow sends",
+    lambda: [((), manager.evicted)], type="counter"
+)
+registry.callback("scan_writer_queued", "Scans waiting for the writer", lambda: [((), scan_writer.stats()["queued"])])
+registry.callback(
+    "crawler_skipped_cycles_total", "Crawl ticks skipped because a cycle was still running",
+    lambda: [((), crawler.skipped_cycles)], type="counter"
+)
+registry.callback(
+    "streamer_index_entries", "Streamers in the in-memory index", lambda: [((), streamer_index.stats()["entries"])]
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,60 @@
+"""
+Alembic environment: runs migrations against DATABASE_URL, or against the
+connection handed over by Database.migrate()
+"""
+import os
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from app.models.database import Base, DEFAULT_DATABASE_URL
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("connection") is None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def _configure(**kwargs):
+    """Shared options; batch mode lets ALTERs work on SQLite"""
+    context.configure(
+        target_metadata=target_metadata,
+        render_as_batch=True,
+        compare_type=True,
+        **kwargs
+    )
+
+
+def run_migrations_offline():
+    """Emit the migration SQL instead of running it (alembic upgrade --sql)"""
+    _configure(
+        url=os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL),
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations on a live connection"""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
+    engine = create_engine(os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL))
+    with engine.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,118 @@
+"""initial schema
+
+Baseline: the schema previously created by Base.metadata.create_all, plus the
+index on streamers.times_seen. Databases created before migrations existed
+are brought up to this schema and stamped by Database.migrate().
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 23:39:02.801755
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'streamers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('query', sa.String(), nullable=False),
+        sa.Column('viewers', sa.Integer(), nullable=True),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.Column('times_seen', sa.Integer(), nullable=True),
+        sa.Column('is_live', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_streamers_id', 'streamers', ['id'])
+    op.create_index('ix_streamers_username', 'streamers', ['username'], unique=True)
+    op.create_index('ix_streamers_query', 'streamers', ['query'])
+    op.create_index('ix_streamers_is_live_last_seen', 'streamers', ['is_live', 'last_seen'])
+    op.create_index('ix_streamers_last_seen_id', 'streamers', ['last_seen', 'id'])
+    op.create_index('ix_streamers_times_seen', 'streamers', ['times_seen'])
+
+    op.create_table(
+        'scan_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('query', sa.String(), nullable=False),
+        sa.Column('streamers_found', sa.Integer(), nullable=True),
+        sa.Column('success', sa.Boolean(), nullable=True),
+        sa.Column('error_message', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scan_history_id', 'scan_history', ['id'])
+    op.create_index('ix_scan_history_timestamp', 'scan_history', ['timestamp'])
+    op.create_index('ix_scan_history_timestamp_id', 'scan_history', ['timestamp', 'id'])
+
+    op.create_table(
+        'scan_rollups_hourly',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('query', sa.String(), nullable=False),
+        sa.Column('scans', sa.Integer(), nullable=False),
+        sa.Column('successful_scans', sa.Integer(), nullable=False),
+        sa.Column('failed_scans', sa.Integer(), nullable=False),
+        sa.Column('streamers_found', sa.Integer(), nullable=False),
+        sa.Column('new_streamers', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('bucket', 'query', name='uq_scan_rollups_bucket_query')
+    )
+    op.create_index('ix_scan_rollups_hourly_id', 'scan_rollups_hourly', ['id'])
+
+    op.create_table(
+        'queries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('text')
+    )
+
+    op.create_table(
+        'streamer_queries',
+        sa.Column('streamer_id', sa.Integer(), nullable=False),
+        sa.Column('query_id', sa.Integer(), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.Column('times_seen', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['query_id'], ['queries.id']),
+        sa.ForeignKeyConstraint(['streamer_id'], ['streamers.id']),
+        sa.PrimaryKeyConstraint('streamer_id', 'query_id')
+    )
+    op.create_index('ix_streamer_queries_query_streamer', 'streamer_queries', ['query_id', 'streamer_id'])
+
+    op.create_table(
+        'sightings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('streamer_id', sa.Integer(), nullable=False),
+        sa.Column('scan_id', sa.Integer(), nullable=True),
+        sa.Column('query_id', sa.Integer(), nullable=False),
+        sa.Column('seen_at', sa.Integer(), nullable=False),
+        sa.Column('viewers', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['query_id'], ['queries.id']),
+        sa.ForeignKeyConstraint(['streamer_id'], ['streamers.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sightings_streamer_seen_at', 'sightings', ['streamer_id', 'seen_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sightings')
+    op.drop_table('streamer_queries')
+    op.drop_table('queries')
+    op.drop_table('scan_rollups_hourly')
+    op.drop_table('scan_history')
+    op.drop_table('streamers')
@@ -5,64 +5,15 @@ Busca streamers en vivo y muestra sus display_ids en terminal
 """
 import os
 import sys
-import json
 from dotenv import load_dotenv
 from tikapi import TikAPI, ValidationException, ResponseException
+from app.services.extractor import (
+    parse_search_response, parse_recommend_response, response_payload
+)
 
 # Load environment variables
 load_dotenv()
 
-def extraer_room_ids(json_texto):
-    """Extract room IDs from TikAPI search response"""
-    try:
-        datos = json.loads(json_texto)
-        room_ids = []
-
-        for item in datos.get("data", []):
-            room_info = item.get("live_info", {}).get("owner", {}).get("own_room", {})
-            ids = room_info.get("room_ids", [])
-            room_ids.extend(ids)
-
-        return room_ids
-
-    except json.JSONDecodeError:
-        print("❌ Error: El texto proporcionado no es un JSON válido.")
-        return []
-
-def extraer_display_ids(json_str):
-    """Extract display IDs from TikAPI search response"""
-    display_ids = []
-    try:
-        datos = json.loads(json_str)
-
-        for item in datos.get("data", []):
-            display_id = item.get("live_info", {}).get("owner", {}).get("display_id")
-            if display_id:
-                print(f"  📺 @{display_id}")
-                display_ids.append(display_id)
-
-    except (json.JSONDecodeError, TypeError) as e:
-        print(f"❌ Error procesando el JSON: {e}")
-
-    return display_ids
-
-def extraer_display_ids_recommended(json_str, lista=None):
-    """Extract display IDs from TikAPI recommended response"""
-    if lista is None:
-        lista = []
-    try:
-        datos = json.loads(json_str)
-
-        for item in datos.get("data", []):
-            display_id = item.get("owner", {}).get("display_id")
-            if display_id:
-                lista.append(str(display_id))
-
-    except (json.JSONDecodeError, TypeError) as e:
-        print(f"❌ Error procesando el JSON: {e}")
-
-    return lista
-
 def main():
     """Main function"""
     print("=" * 70)
@@ -93,11 +44,16 @@ def main():
         print("\n1️⃣ Buscando transmisiones en vivo...")
         response = user.live.search(query=query)
 
+        # Parse the search response once for streamers and room IDs
+        search = parse_search_response(response_payload(response))
+
         print("\n📋 Streamers de búsqueda directa:")
-        search_display_ids = extraer_display_ids(response.text)
+        search_display_ids = [record.display_id for record in search.records]
+        for display_id in search_display_ids:
+            print(f"  📺 @{display_id}")
 
-        # Extract room IDs for recommendations
-        respose_rooms_ids = extraer_room_ids(response.text)
+        # Room IDs for recommendations
+        respose_rooms_ids = search.room_ids
         print(f"\n🏠 Encontrados {len(respose_rooms_ids)} rooms para obtener recomendaciones")
 
         # Get recommended streamers
@@ -107,7 +63,10 @@ def main():
             try:
                 print(f"   Procesando room {i}/{len(respose_rooms_ids)}...", end="\r")
                 response1 = user.live.recommend(room_id=str(room_id))
-                extraer_display_ids_recommended(response1.text, lista)
+                lista.extend(
+                    record.display_id
+                    for record in parse_recommend_response(response_payload(response1))
+                )
             except ValidationException as e:
                 print(f"\n   ⚠️  Validation error en room {room_id}: {e.field}")
             except ResponseException as e:
@@ -0,0 +1,59 @@
+"""
+Benchmark helpers: timings are collected and printed after the run
+
+    python -m pytest -q --run-slow tests/benchmarks
+"""
+import statistics
+import time
+import pytest
+from fastapi import FastAPI
+from app.api.routes import router
+
+_results = []
+
+
+class Bench:
+    """Times a callable and records one summary line per measurement"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def time(self, fn, repeat: int = 5) -> list:
+        """Run fn repeat times and return the elapsed seconds of each run"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def report(self, label: str, value: float, unit: str = "ms"):
+        _results.append(f"{self.name}: {label} = {value:.2f} {unit}")
+
+    def report_timings(self, label: str, timings: list):
+        self.report(f"{label} median", statistics.median(timings) * 1000)
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def make_app() -> FastAPI:
+    """The API routes without main's lifespan (scheduler, log file, writer task)"""
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+@pytest.fixture
+def bench(request):
+    return Bench(request.node.name)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if _results:
+        terminalreporter.section("benchmarks")
+        for line in _results:
+            terminalreporter.write_line(line)
@@ -0,0 +1,61 @@
+"""
+/api/streamers latency while live searches run at the same time
+"""
+import asyncio
+import time
+import httpx
+import pytest
+from app.api import routes
+from app.services.cache import TTLCache
+from app.services.streamer_store import upsert_streamers
+from tests.benchmarks.conftest import make_app, percentile
+from tests.conftest import FakeLive
+
+pytestmark = pytest.mark.slow
+
+SEARCHES = 10
+REQUESTS = 200
+
+
+def test_streamers_p99_with_concurrent_searches(database, make_service, monkeypatch, bench):
+    session = database.get_session()
+    upsert_streamers(session, "seed", [f"user{i}" for i in range(2000)], viewers={})
+    session.commit()
+    session.close()
+
+    # Every search blocks on 0.2s SDK calls: search, then one wave of recommends
+    service = make_service(
+        FakeLive(rooms=5, latency=0.2), max_workers=5, recommend_timeout=5, recommend_cache=TTLCache(ttl=0)
+    )
+    monkeypatch.setattr(routes, "get_tikapi_service", lambda: service)
+
+    async def list_streamers(client, count: int, while_pending=()) -> list:
+        latencies = []
+        while len(latencies) < count or any(not task.done() for task in while_pending):
+            started = time.perf_counter()
+            response = await client.get("/api/streamers", params={"limit": 50})
+            latencies.append(time.perf_counter() - started)
+            assert response.json()["success"]
+        return latencies
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            idle = await list_streamers(client, REQUESTS)
+
+            searches = [
+                asyncio.create_task(client.post("/api/search-live", params={"query": f"load{i}"}))
+                for i in range(SEARCHES)
+            ]
+            # Keep listing until the last search has been stored
+            loaded = await list_streamers(client, REQUESTS // 4, while_pending=searches)
+            responses = await asyncio.gather(*searches)
+            assert all(response.json()["success"] for response in responses)
+            return idle, loaded
+
+    idle, loaded = asyncio.run(scenario())
+
+    bench.report("idle p99", percentile(idle, 99) * 1000)
+    bench.report(f"p99 with {SEARCHES} searches", percentile(loaded, 99) * 1000)
+    # A search blocking the loop would stall requests behind its SDK calls
+    assert percentile(loaded, 99) < 0.2
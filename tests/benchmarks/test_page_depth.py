@@ -0,0 +1,47 @@
+"""
+Page 1 vs page 1000 of /api/streamers ordering: offset vs cursor
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.database import Streamer
+from app.services.pagination import encode_cursor, paginate
+
+pytestmark = pytest.mark.slow
+
+PAGE_SIZE = 100
+PAGES = 1000
+T0 = datetime(2024, 1, 1)
+
+
+def test_deep_cursor_page_costs_the_same_as_page_one(session, bench):
+    rows = PAGE_SIZE * PAGES + PAGE_SIZE
+    session.execute(Streamer.__table__.insert(), [
+        {
+            "username": f"user{i}", "query": "q", "viewers": i % 50, "times_seen": 1, "is_live": True,
+            # Groups of equal timestamps exercise the id tie-breaker
+            "first_seen": T0, "last_seen": T0 + timedelta(seconds=i // 3)
+        }
+        for i in range(rows)
+    ])
+    session.commit()
+
+    def page(cursor=None, offset=0):
+        return paginate(session.query(Streamer), Streamer.last_seen, Streamer.id, PAGE_SIZE, cursor=cursor, offset=offset)
+
+    offset = PAGE_SIZE * (PAGES - 1)
+    # The cursor a client holds after reading page 999
+    before = session.query(Streamer).order_by(Streamer.last_seen.desc(), Streamer.id.desc()).offset(offset - 1).first()
+    cursor = encode_cursor(before.last_seen, before.id)
+    assert [row.id for row in page(cursor=cursor)[0]] == [row.id for row in page(offset=offset)[0]]
+
+    timings = {
+        "offset page 1": bench.time(lambda: page()),
+        f"offset page {PAGES}": bench.time(lambda: page(offset=offset)),
+        f"cursor page {PAGES}": bench.time(lambda: page(cursor=cursor)),
+    }
+    for label, runs in timings.items():
+        bench.report_timings(label, runs)
+
+    # The cursor page is an index range scan; the offset page walks the skipped rows
+    assert min(timings[f"cursor page {PAGES}"]) < min(timings[f"offset page {PAGES}"])
+    assert min(timings[f"cursor page {PAGES}"]) < 5 * max(timings["offset page 1"])
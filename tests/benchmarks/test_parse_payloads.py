@@ -0,0 +1,58 @@
+"""
+Parsing recorded TikAPI payloads: the old per-field passes vs the extractor
+"""
+import json
+from pathlib import Path
+import pytest
+from app.services.extractor import parse_recommend_response, parse_search_response
+
+pytestmark = pytest.mark.slow
+
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+SEARCH = (FIXTURES / "tikapi_search_live.json").read_bytes()
+RECOMMEND = (FIXTURES / "tikapi_recommend_live.json").read_bytes()
+ROUNDS = 200
+
+
+def _old_search(text: str):
+    """Display IDs and room IDs the way the service read them: one json.loads each"""
+    display_ids = [
+        str(item.get("live_info", {}).get("owner", {}).get("display_id"))
+        for item in json.loads(text).get("data", [])
+        if item.get("live_info", {}).get("owner", {}).get("display_id")
+    ]
+    room_ids = []
+    for item in json.loads(text).get("data", []):
+        room_ids.extend(item.get("live_info", {}).get("owner", {}).get("own_room", {}).get("room_ids", []))
+    return display_ids, room_ids
+
+
+def _old_recommend(text: str):
+    return [
+        str(item.get("owner", {}).get("display_id"))
+        for item in json.loads(text).get("data", [])
+        if item.get("owner", {}).get("display_id")
+    ]
+
+
+def test_extractor_parses_recorded_payloads_in_one_pass(bench):
+    # The SDK handed the old helpers response.text; the extractor reads the bytes
+    search_text, recommend_text = SEARCH.decode(), RECOMMEND.decode()
+
+    display_ids, room_ids = _old_search(search_text)
+    result = parse_search_response(SEARCH)
+    assert [record.display_id for record in result.records] == display_ids
+    assert result.room_ids == [str(room_id) for room_id in room_ids]
+    assert [record.display_id for record in parse_recommend_response(RECOMMEND)] == _old_recommend(recommend_text)
+
+    timings = {
+        "old search": bench.time(lambda: [_old_search(search_text) for _ in range(ROUNDS)]),
+        "extractor search": bench.time(lambda: [parse_search_response(SEARCH) for _ in range(ROUNDS)]),
+        "old recommend": bench.time(lambda: [_old_recommend(recommend_text) for _ in range(ROUNDS)]),
+        "extractor recommend": bench.time(lambda: [parse_recommend_response(RECOMMEND) for _ in range(ROUNDS)]),
+    }
+    for label, runs in timings.items():
+        bench.report(f"{label} per payload", min(runs) / ROUNDS * 1000)
+
+    # Decoding once instead of twice
+    assert min(timings["extractor search"]) < min(timings["old search"])
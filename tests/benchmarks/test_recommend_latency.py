@@ -0,0 +1,30 @@
+"""
+Search latency against the TikAPI stub, sequential vs fan-out recommends
+"""
+import itertools
+import pytest
+from app.services.cache import TTLCache
+from tests.conftest import FakeLive
+
+pytestmark = pytest.mark.slow
+
+LATENCY = 0.05
+
+
+@pytest.mark.parametrize("rooms", [5, 20, 50])
+def test_fan_out_keeps_search_latency_flat(make_service, bench, rooms):
+    queries = itertools.count()
+    medians = {}
+    for workers in (1, rooms):
+        service = make_service(
+            FakeLive(rooms=rooms, latency=LATENCY), max_rooms=rooms, max_workers=workers,
+            recommend_timeout=60, recommend_cache=TTLCache(ttl=0)
+        )
+        # A new query per run and no recommend cache: every call reaches the stub
+        timings = bench.time(lambda: service.search_live_records(f"q{next(queries)}"), repeat=3)
+        bench.report_timings(f"{workers} worker(s)", timings)
+        medians[workers] = min(timings)
+
+    # One search plus one wave of recommends instead of one call per room
+    assert medians[1] >= LATENCY * (rooms + 1)
+    assert medians[rooms] < LATENCY * 4
@@ -0,0 +1,59 @@
+"""
+/api/streamers requests per second: engine per request vs the shared pool
+"""
+import asyncio
+import time
+import httpx
+import pytest
+from app.api import routes
+from app.models.database import Database
+from app.services.streamer_store import upsert_streamers
+from tests.benchmarks.conftest import make_app
+
+pytestmark = pytest.mark.slow
+
+DURATION = 2.0
+
+
+def _per_request_db(url: str):
+    """What get_db did before the process-wide Database: a new engine per request"""
+    def get_db():
+        database = Database(url)
+        session = database.get_session()
+        try:
+            yield session
+        finally:
+            session.close()
+            database.dispose()
+    return get_db
+
+
+def _requests_per_second(app) -> float:
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            done = 0
+            deadline = time.perf_counter() + DURATION
+            while time.perf_counter() < deadline:
+                response = await client.get("/api/streamers", params={"limit": 20, "count": False})
+                assert response.json()["success"]
+                done += 1
+            return done / DURATION
+
+    return asyncio.run(scenario())
+
+
+def test_shared_pool_serves_more_requests_per_second(database, bench):
+    session = database.get_session()
+    upsert_streamers(session, "seed", [f"user{i}" for i in range(500)], viewers={})
+    session.commit()
+    session.close()
+
+    before_app = make_app()
+    before_app.dependency_overrides[routes.get_db] = _per_request_db(database.database_url)
+    before = _requests_per_second(before_app)
+    after = _requests_per_second(make_app())
+
+    bench.report("engine per request", before, "req/s")
+    bench.report("shared pool", after, "req/s")
+    assert after > before
@@ -0,0 +1,59 @@
+"""
+Streamer upserts at 1k/10k usernames: per-row SELECT vs the bulk paths
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.database import Streamer
+from app.services.streamer_index import streamer_index
+from app.services.streamer_store import upsert_streamers
+
+pytestmark = pytest.mark.slow
+
+T0 = datetime(2024, 1, 1)
+
+
+def _per_row(db, query: str, usernames: list, seen_at: datetime):
+    """The write path before bulk upserts: one SELECT (and flush) per username"""
+    for username in usernames:
+        existing = db.query(Streamer).filter(Streamer.username == username).first()
+        if existing:
+            existing.last_seen = seen_at
+            existing.times_seen += 1
+            existing.is_live = True
+            existing.query = query
+        else:
+            db.add(Streamer(
+                username=username, query=query, viewers=0,
+                first_seen=seen_at, last_seen=seen_at, times_seen=1, is_live=True
+            ))
+            db.flush()
+
+
+@pytest.mark.parametrize("count", [1000, 10000])
+def test_bulk_upsert_timings(database, bench, count):
+    seen_at = iter(T0 + timedelta(minutes=i) for i in range(100))
+    session = database.get_session()
+
+    def run(write, usernames):
+        def step():
+            write(session, "q", usernames, next(seen_at))
+            session.commit()
+        return bench.time(step, repeat=1)[0]
+
+    def bulk(db, query, usernames, at):
+        upsert_streamers(db, query, usernames, seen_at=at, viewers={})
+
+    timings = {
+        "per-row insert": run(_per_row, [f"old{i}" for i in range(count)]),
+        "per-row update": run(_per_row, [f"old{i}" for i in range(count)]),
+        "bulk insert": run(bulk, [f"new{i}" for i in range(count)]),
+        "bulk update": run(bulk, [f"new{i}" for i in range(count)]),
+    }
+    streamer_index.warm(session)
+    timings["indexed update"] = run(bulk, [f"new{i}" for i in range(count)])
+    session.close()
+
+    for label, seconds in timings.items():
+        bench.report(label, seconds * 1000)
+    assert timings["bulk insert"] < timings["per-row insert"]
+    assert timings["bulk update"] < timings["per-row update"]
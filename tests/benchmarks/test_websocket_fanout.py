@@ -0,0 +1,93 @@
+"""
+Delta fan-out to 1,000 subscribed WebSocket clients, a few of them stalled
+"""
+import asyncio
+import json
+import time
+import pytest
+from app.api.websocket import ConnectionManager
+from app.services.live_feed import live_feed
+from tests.benchmarks.conftest import percentile
+
+pytestmark = pytest.mark.slow
+
+CLIENTS = 1000
+SLOW_CLIENTS = 10
+QUERIES = 10
+BATCHES = 100
+
+
+class SimulatedWebSocket:
+    """Counts delivered delta batches; a slow socket never finishes a send"""
+
+    def __init__(self, delivered: dict, send_delay: float = 0.0):
+        self.delivered = delivered
+        self.send_delay = send_delay
+        self.seqs = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.send_delay)
+        message = json.loads(text)
+        if message["type"] == "deltas":
+            self.seqs.append(message["seq"])
+            self.delivered["count"] += 1
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+def test_fanout_to_1000_clients(bench):
+    async def scenario():
+        manager = ConnectionManager(queue_size=16, send_timeout=2)
+        delivered = {"count": 0}
+        fast = [SimulatedWebSocket(delivered) for _ in range(CLIENTS - SLOW_CLIENTS)]
+        slow = [SimulatedWebSocket(delivered, send_delay=60) for _ in range(SLOW_CLIENTS)]
+        for i, websocket in enumerate(fast + slow):
+            await manager.connect(websocket)
+            await manager.subscribe(websocket, query=f"q{i % QUERIES}")
+        await asyncio.sleep(0.05)
+
+        live_feed.attach(asyncio.get_running_loop(), manager.publish_deltas)
+        publish, delivery, seqs = [], [], []
+        started_all = time.perf_counter()
+        try:
+            for batch in range(BATCHES):
+                deltas = [
+                    {"op": "updated", "query": f"q{i}", "username": f"user{batch}-{i}", "viewers": batch}
+                    for i in range(QUERIES)
+                ]
+                target = delivered["count"] + len(fast)
+                started = time.perf_counter()
+                seqs.append(live_feed.publish(deltas))
+                # The listener runs on the next loop iteration
+                await asyncio.sleep(0)
+                publish.append(time.perf_counter() - started)
+                while delivered["count"] < target:
+                    await asyncio.sleep(0)
+                delivery.append(time.perf_counter() - started)
+        finally:
+            live_feed.detach()
+        elapsed = time.perf_counter() - started_all
+
+        # Stalled sends are evicted once they pass send_timeout
+        await asyncio.sleep(manager.send_timeout + 0.5)
+        return manager, fast, slow, publish, delivery, seqs, elapsed
+
+    manager, fast, slow, publish, delivery, seqs, elapsed = asyncio.run(scenario())
+
+    bench.report("publish p99", percentile(publish, 99) * 1000)
+    bench.report("delivery to all clients p50", percentile(delivery, 50) * 1000)
+    bench.report("delivery to all clients p99", percentile(delivery, 99) * 1000)
+    bench.report("messages per second", BATCHES * len(fast) / elapsed, unit="msg/s")
+    bench.report("dropped for stalled clients", manager.dropped, unit="messages")
+
+    # Stalled clients cost the others nothing: every batch, in order
+    assert all(websocket.seqs == seqs for websocket in fast)
+    assert manager.dropped > 0
+    assert manager.evicted == SLOW_CLIENTS and all(websocket.closed for websocket in slow)
+    assert manager.active_connections == len(fast)
+    assert percentile(delivery, 99) < 0.5
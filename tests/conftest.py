@@ -0,0 +1,162 @@
+"""
+Shared fixtures: a throwaway database and a TikAPI stub
+
+Tests run on SQLite. Modules parametrized with
+``pytest.mark.parametrize("database_url", BACKENDS, indirect=True)`` also run
+on PostgreSQL when TEST_POSTGRES_URL (or a postgresql DATABASE_URL) points
+at a disposable database; its public schema is dropped around each test.
+
+Benchmarks are marked ``slow`` and only run with ``--run-slow``.
+"""
+import json
+import os
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, text
+from app.models.database import close_database, init_database
+from app.services.query_registry import clear_query_cache
+from app.services.rate_limiter import RateLimiter
+from app.services.streamer_index import streamer_index
+from app.services.tikapi_service import TikAPIService
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="also run the benchmarks marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: benchmark or load test, skipped without --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="benchmark: run with --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+def _response(data: list) -> SimpleNamespace:
+    """Minimal stand-in for a TikAPI SDK response"""
+    payload = json.dumps({"data": data})
+    return SimpleNamespace(text=payload, content=payload.encode(), status_code=200, headers={})
+
+
+class FakeLive:
+    """
+    Stand-in for user.live with configurable latency and failures
+
+    The search returns streamers s0..s{rooms-1}, each with its own room
+    (1000, 1001, ...); recommend returns three streamers per room.
+    """
+
+    def __init__(self, rooms: int = 5, latency: float = 0.0, room_latency=None, failing_rooms=()):
+        self.rooms = rooms
+        self.latency = latency
+        self.room_latency = room_latency or {}
+        self.failing_rooms = set(failing_rooms)
+        self.search_calls = 0
+        self.recommend_calls = 0
+
+    def search(self, query, **kwargs):
+        self.search_calls += 1
+        time.sleep(self.latency)
+        return _response([
+            {"live_info": {
+                "title": f"live {i}",
+                "user_count": i,
+                "owner": {"display_id": f"s{i}", "own_room": {"room_ids": [1000 + i]}}
+            }}
+            for i in range(self.rooms)
+        ])
+
+    def recommend(self, room_id, **kwargs):
+        self.recommend_calls += 1
+        time.sleep(self.room_latency.get(str(room_id), self.latency))
+        if str(room_id) in self.failing_rooms:
+            raise RuntimeError(f"room {room_id} failed")
+        return _response([
+            {"id_str": f"{room_id}{j}", "title": "rec", "user_count": j, "owner": {"display_id": f"r{room_id}-{j}"}}
+            for j in range(3)
+        ])
+
+
+@pytest.fixture
+def make_service():
+    """Build TikAPIService instances backed by a FakeLive, without throttling"""
+    services = []
+
+    def make(live: FakeLive = None, **kwargs) -> TikAPIService:
+        kwargs.setdefault("rate_limiter", RateLimiter(rate=0))
+        service = TikAPIService("test-key", "test-account", **kwargs)
+        service.user = SimpleNamespace(live=live or FakeLive())
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        if service._executor is not None:
+            service._executor.shutdown(wait=False, cancel_futures=True)
+
+
+BACKENDS = ["sqlite", "postgresql"]
+
+
+def _postgres_url():
+    """URL of the PostgreSQL test database, if one is configured"""
+    url = os.getenv("TEST_POSTGRES_URL") or os.getenv("DATABASE_URL", "")
+    return url if url.startswith("postgresql") else None
+
+
+def _reset_postgres(url: str):
+    """Drop everything in the public schema"""
+    engine = create_engine(url)
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("DROP SCHEMA public CASCADE"))
+            connection.execute(text("CREATE SCHEMA public"))
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def database_url(request, tmp_path):
+    """URL of an empty database: a SQLite file, or the PostgreSQL test database"""
+    backend = getattr(request, "param", "sqlite")
+    if backend == "sqlite":
+        yield f"sqlite:///{tmp_path / 'test.db'}"
+        return
+
+    url = _postgres_url()
+    if url is None:
+        pytest.skip("set TEST_POSTGRES_URL to run against PostgreSQL")
+    try:
+        _reset_postgres(url)
+    except Exception as e:  # driver missing or server unreachable
+        pytest.skip(f"PostgreSQL not available: {e}")
+    yield url
+    _reset_postgres(url)
+
+
+@pytest.fixture
+def database(database_url):
+    """The shared Database pointed at a fresh, migrated database"""
+    close_database()
+    streamer_index.clear()
+    clear_query_cache()
+    db = init_database(database_url)
+    db.migrate()
+    yield db
+    close_database()
+    streamer_index.clear()
+    clear_query_cache()
+
+
+@pytest.fixture
+def session(database):
+    """A session on the test database"""
+    db = database.get_session()
+    yield db
+    db.close()
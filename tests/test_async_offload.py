@@ -0,0 +1,52 @@
+"""
+TikAPI work runs off the event loop on one shared service
+"""
+import asyncio
+import threading
+from app.services import tikapi_service
+from tests.conftest import FakeLive
+
+
+def test_async_search_does_not_block_the_event_loop(make_service):
+    service = make_service(FakeLive(rooms=2, latency=0.2), max_workers=2)
+    search_threads = []
+    search = service.user.live.search
+    service.user.live.search = lambda **kwargs: search_threads.append(threading.current_thread()) or search(**kwargs)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        records = await service.search_live_records_async("gaming")
+        task.cancel()
+        return records, ticks
+
+    records, ticks = asyncio.run(scenario())
+
+    assert len(records) == 2 + 2 * 3
+    assert search_threads and search_threads[0] is not threading.main_thread()
+    # The loop kept running during the ~0.4s of blocking SDK calls
+    assert ticks >= 10
+
+
+def test_service_is_shared_per_credentials(monkeypatch):
+    monkeypatch.setattr(tikapi_service, "_services", {})
+    monkeypatch.delenv("TIKAPI_KEY", raising=False)
+    monkeypatch.delenv("TIKAPI_ACCOUNT_KEY", raising=False)
+
+    assert tikapi_service.get_tikapi_service() is None
+    first = tikapi_service.get_tikapi_service("k" * 20, "a" * 20)
+    try:
+        assert tikapi_service.get_tikapi_service("k" * 20, "a" * 20) is first
+        monkeypatch.setenv("TIKAPI_KEY", "k" * 20)
+        monkeypatch.setenv("TIKAPI_ACCOUNT_KEY", "a" * 20)
+        assert tikapi_service.get_tikapi_service() is first
+    finally:
+        if first._executor is not None:
+            first._executor.shutdown(wait=False)
@@ -0,0 +1,117 @@
+"""
+TTLCache coalescing and invalidation
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.services.cache import TTLCache
+
+
+def test_concurrent_misses_share_one_compute():
+    cache = TTLCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get_or_compute, "k", compute) for _ in range(4)]
+        while cache.stats()["coalesced"] < 3:
+            time.sleep(0.01)
+        release.set()
+        assert [future.result() for future in futures] == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_value_computed_before_clear_is_not_stored():
+    cache = TTLCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def stale_compute():
+        started.set()
+        release.wait(2)
+        return "stale"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(cache.get_or_compute, "k", stale_compute)
+        started.wait(2)
+        # A write lands and invalidates while the compute is still reading
+        cache.clear()
+        # Callers after the invalidation do not join the stale compute
+        assert cache.get_or_compute("k", lambda: "fresh") == "fresh"
+        release.set()
+        assert future.result() == "stale"
+
+    assert cache.get("k") == "fresh"
+
+
+def test_invalidate_key_discards_in_flight_value():
+    cache = TTLCache(ttl=60)
+    cache.get_or_compute("k", lambda: 1)
+
+    def compute():
+        cache.invalidate("k")
+        return 2
+
+    cache.invalidate("k")
+    assert cache.get_or_compute("k", compute) == 2
+    assert cache.get("k") is None
+    assert cache.get_or_compute("k", lambda: 3) == 3
+    assert cache.get("k") == 3
+
+
+def test_invalidating_one_key_keeps_other_loads():
+    cache = TTLCache(ttl=60)
+    started = {key: threading.Event() for key in ("a", "b")}
+    release = threading.Event()
+
+    def compute(key):
+        started[key].set()
+        release.wait(2)
+        return f"{key}-value"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(cache.get_or_compute, key, lambda key=key: compute(key)) for key in ("a", "b")]
+        for event in started.values():
+            event.wait(2)
+        cache.invalidate("a")
+        release.set()
+        assert [future.result() for future in futures] == ["a-value", "b-value"]
+
+    # Only the invalidated key's load was discarded
+    assert cache.get("a") is None
+    assert cache.get("b") == "b-value"
+
+
+def test_invalidate_then_reload_while_old_load_finishes():
+    cache = TTLCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(2)
+        return "stale"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(cache.get_or_compute, "k", slow)
+        started.wait(2)
+        cache.invalidate("k")
+        assert cache.get_or_compute("k", lambda: "fresh") == "fresh"
+        # No pending load: nothing to outdate, the stored value stays
+        cache.invalidate("other")
+        release.set()
+        assert future.result() == "stale"
+
+    assert cache.get("k") == "fresh"
+
+
+def test_cache_if_skips_store():
+    cache = TTLCache(ttl=60)
+    assert cache.get_or_compute("k", lambda: -1, cache_if=lambda value: value >= 0) == -1
+    assert cache.get("k") is None
+    assert cache.get_or_compute("k", lambda: 5, cache_if=lambda value: value >= 0) == 5
+    assert cache.get("k") == 5
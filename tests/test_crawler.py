@@ -0,0 +1,116 @@
+"""
+Scheduled crawler: due queries, jitter, overlapping ticks and cycle reports
+"""
+import asyncio
+import pytest
+from app.models.database import ScanHistory
+from app.services import crawler as crawler_module
+from app.services.crawler import Crawler, parse_query_intervals
+from tests.conftest import FakeLive
+
+
+def test_parse_query_intervals_skips_invalid_pairs():
+    assert parse_query_intervals("gaming=10, music=2.5,bad,x=y") == {"gaming": 10.0, "music": 2.5}
+
+
+def test_each_query_is_due_on_its_own_interval_with_jitter():
+    crawler = Crawler(["a", "b"], interval_minutes=1, query_intervals={"b": 3}, jitter_seconds=5)
+    start = max(crawler._next_due.values())
+    # The first scans are spread over the jitter window
+    assert crawler.due_queries(start) == ["a", "b"]
+
+    for _ in range(50):
+        crawler._schedule_next(["a", "b"], start)
+        assert start + 55 <= crawler._next_due["a"] <= start + 65
+        assert start + 175 <= crawler._next_due["b"] <= start + 185
+
+    assert crawler.due_queries(start + 54) == []
+    assert crawler.due_queries(start + 66) == ["a"]
+    assert crawler.due_queries(start + 186) == ["a", "b"]
+
+
+def test_jitter_never_schedules_into_the_past():
+    crawler = Crawler(["a"], interval_minutes=0, jitter_seconds=30)
+    for _ in range(50):
+        crawler._schedule_next(["a"], 1000.0)
+        assert crawler._next_due["a"] >= 1000.0
+
+
+def test_tick_is_skipped_while_a_cycle_runs(monkeypatch):
+    crawler = Crawler(["a"], interval_minutes=1)
+    crawler._next_due["a"] = 0
+    release = asyncio.Event()
+
+    async def slow_scrape(queries):
+        await release.wait()
+        return {"total_found": 0, "total_new": 0, "total_updated": 0, "queries_processed": 1, "errors": []}
+
+    monkeypatch.setattr(crawler, "_scrape", slow_scrape)
+
+    async def scenario():
+        first = asyncio.create_task(crawler.run_cycle())
+        await asyncio.sleep(0.01)
+        assert crawler.stats()["running"]
+        assert await crawler.run_cycle() is None
+        release.set()
+        return await first
+
+    report = asyncio.run(scenario())
+
+    assert report["queries"] == ["a"]
+    stats = crawler.stats()
+    assert (stats["cycles"], stats["skipped_cycles"], stats["running"]) == (1, 1, False)
+    # Not due again until the interval has passed
+    assert crawler.due_queries() == []
+
+
+def test_cycle_report_counts_stored_streamers(database, make_service, monkeypatch):
+    service = make_service(FakeLive(rooms=2))
+    monkeypatch.setattr(crawler_module, "get_tikapi_service", lambda *args: service)
+    crawler = Crawler(["gaming", "music"], interval_minutes=10, max_concurrency=2)
+    crawler._next_due = dict.fromkeys(crawler.queries, 0)
+
+    report = asyncio.run(crawler.run_cycle())
+
+    # Two search hits and three recommendations per room, shared by both queries
+    results = report["results"]
+    assert (results["total_found"], results["total_new"], results["total_updated"]) == (16, 8, 8)
+    assert results["queries_processed"] == 2 and results["errors"] == []
+    assert report["queries"] == ["gaming", "music"]
+    assert report["overran_interval"] is False
+    assert report["streamers_per_second"] > 0
+    assert crawler.last_cycle is report
+
+    session = database.get_session()
+    assert sorted(scan.query for scan in session.query(ScanHistory)) == ["gaming", "music"]
+    session.close()
+
+
+def test_failed_query_is_reported_without_failing_the_cycle(database, make_service, monkeypatch):
+    service = make_service(FakeLive(rooms=1))
+    search = service.user.live.search
+
+    def search_or_fail(query, **kwargs):
+        if query == "broken":
+            raise RuntimeError("search failed")
+        return search(query, **kwargs)
+
+    service.user.live.search = search_or_fail
+    monkeypatch.setattr(crawler_module, "get_tikapi_service", lambda *args: service)
+    crawler = Crawler(["ok", "broken"], interval_minutes=10)
+    crawler._next_due = dict.fromkeys(crawler.queries, 0)
+
+    report = asyncio.run(crawler.run_cycle())
+
+    assert report["results"]["total_found"] == 4
+    assert len(report["results"]["errors"]) == 1 and "broken" in report["results"]["errors"][0]
+
+
+def test_missing_credentials_fail_the_cycle(monkeypatch):
+    monkeypatch.setattr(crawler_module, "get_tikapi_service", lambda *args: None)
+    crawler = Crawler(["a"], interval_minutes=1)
+    crawler._next_due["a"] = 0
+
+    with pytest.raises(ValueError):
+        asyncio.run(crawler.run_cycle())
+    assert not crawler.stats()["running"]
@@ -0,0 +1,32 @@
+"""
+One engine and connection pool per process
+"""
+from sqlalchemy import text
+from app.models import database as database_module
+from app.models.database import close_database, get_database, init_database
+
+
+def test_database_is_shared_until_closed(tmp_path):
+    close_database()
+    try:
+        first = init_database(f"sqlite:///{tmp_path / 'a.db'}")
+        assert init_database(f"sqlite:///{tmp_path / 'b.db'}") is first
+        assert get_database() is first
+
+        close_database()
+        assert database_module._database is None
+        second = init_database(f"sqlite:///{tmp_path / 'b.db'}")
+        assert second is not first and second.database_url.endswith("b.db")
+    finally:
+        close_database()
+
+
+def test_sqlite_connections_get_the_pragmas(tmp_path):
+    close_database()
+    try:
+        db = init_database(f"sqlite:///{tmp_path / 'p.db'}")
+        with db.engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    finally:
+        close_database()
@@ -0,0 +1,77 @@
+"""
+Streaming NDJSON/CSV export of streamers
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app.models.database import Streamer
+from app.services.export import export_streamers
+from app.services.extractor import LiveRecord
+from app.services.streamer_queries import streamers_for_query
+from app.services.streamer_store import record_scan
+
+T0 = datetime(2024, 1, 1, 12, 0, 0, 250000)
+
+
+@pytest.fixture
+def streamers(session):
+    """Twenty streamers found by two queries, a few of them offline"""
+    record_scan(session, "a", [LiveRecord(f"u{i}", viewers=i) for i in range(0, 14)], scanned_at=T0)
+    record_scan(
+        session, "b", [LiveRecord(f"u{i}", viewers=i * 2) for i in range(10, 20)],
+        scanned_at=T0 + timedelta(minutes=5)
+    )
+    session.execute(update(Streamer).where(Streamer.id % 4 == 0).values(is_live=False))
+    session.commit()
+    return session
+
+
+def _expected(db, query=None, is_live=None):
+    rows = db.query(Streamer).order_by(Streamer.id)
+    if query:
+        rows = rows.filter(Streamer.id.in_(streamers_for_query(query)))
+    if is_live is not None:
+        rows = rows.filter(Streamer.is_live.is_(is_live))
+    return [streamer.to_dict() for streamer in rows]
+
+
+def _read(chunks, fmt, compress=False):
+    body = b"".join(chunks)
+    if compress:
+        body = gzip.decompress(body)
+    if fmt == "ndjson":
+        return [json.loads(line) for line in body.decode().splitlines()]
+    rows = list(csv.DictReader(io.StringIO(body.decode())))
+    return [
+        {
+            **row,
+            "id": int(row["id"]),
+            "viewers": int(row["viewers"]),
+            "times_seen": int(row["times_seen"]),
+            "is_live": row["is_live"] == "True"
+        }
+        for row in rows
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("filters", [{}, {"query": "b"}, {"is_live": False}, {"query": "a", "is_live": True}])
+def test_export_streams_the_query_result(streamers, fmt, compress, filters):
+    chunks = list(export_streamers(fmt, compress=compress, chunk_rows=3, **filters))
+
+    assert _read(chunks, fmt, compress) == _expected(streamers, **filters)
+
+
+def test_export_is_chunked(streamers):
+    chunks = list(export_streamers("ndjson", chunk_rows=3))
+    assert len(chunks) == 7  # 20 rows, 3 per chunk
+
+
+def test_export_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        next(export_streamers("xml"))
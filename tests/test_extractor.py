@@ -0,0 +1,47 @@
+"""
+Single-pass parsing of TikAPI responses
+"""
+import json
+from app.services.extractor import (
+    LiveRecord, parse_recommend_response, parse_search_response, unique_records
+)
+
+
+def test_parse_search_response_reads_records_and_rooms():
+    payload = json.dumps({"data": [
+        {"live_info": {
+            "id_str": "55", "title": "hola", "stats": {"user_count": "12"},
+            "owner": {"display_id": "ana", "own_room": {"room_ids": [55, 56]}}
+        }},
+        {"live_info": {"owner": {"display_id": "bob", "own_room": {"room_ids": [77]}}}},
+        {"live_info": {"owner": {"own_room": {"room_ids": [88]}}}},
+        {"other": True}
+    ]}).encode()
+
+    result = parse_search_response(payload)
+    assert result.records == [
+        LiveRecord("ana", room_id="55", viewers=12, title="hola"),
+        LiveRecord("bob", room_id="77", viewers=0, title=None),
+    ]
+    assert result.room_ids == ["55", "56", "77", "88"]
+
+
+def test_parse_recommend_response_accepts_text_and_bytes():
+    body = {"data": [
+        {"id": 9, "user_count": 3, "title": "t", "owner": {"display_id": "cid"}},
+        {"id": 10, "owner": {}}
+    ]}
+    expected = [LiveRecord("cid", room_id="9", viewers=3, title="t")]
+    assert parse_recommend_response(json.dumps(body)) == expected
+    assert parse_recommend_response(json.dumps(body).encode()) == expected
+
+
+def test_malformed_payloads_yield_nothing():
+    assert parse_search_response(b"not json") == ([], [])
+    assert parse_search_response(b'{"data": [1]}') == ([], [])
+    assert parse_recommend_response(b"[]") == []
+
+
+def test_unique_records_keeps_first_per_streamer():
+    records = [LiveRecord("a", "1"), LiveRecord("b", "2"), LiveRecord("a", "3")]
+    assert unique_records(records) == [LiveRecord("a", "1"), LiveRecord("b", "2")]
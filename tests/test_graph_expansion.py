@@ -0,0 +1,89 @@
+"""
+Multi-hop discovery through the recommendation graph
+"""
+from tests.conftest import FakeLive, _response
+
+
+class SharedRecommendations(FakeLive):
+    """Every room recommends the same three streamers, each in a new room"""
+
+    def recommend(self, room_id, **kwargs):
+        self.recommend_calls += 1
+        return _response([
+            {"id_str": f"{room_id}{j}", "user_count": j, "owner": {"display_id": f"shared-{j}"}}
+            for j in range(3)
+        ])
+
+
+class RoomsPointBack(FakeLive):
+    """Recommended streamers live in the rooms the search already returned"""
+
+    def recommend(self, room_id, **kwargs):
+        self.recommend_calls += 1
+        return _response([
+            {"id_str": str(1000 + j), "user_count": j, "owner": {"display_id": f"r{room_id}-{j}"}}
+            for j in range(self.rooms)
+        ])
+
+
+def test_hop_limit_stops_a_fully_new_graph(make_service):
+    live = FakeLive(rooms=2)
+    service = make_service(live)
+
+    records, report = service.expand_live_graph("gaming", max_hops=2, call_budget=100, min_new_ratio=0)
+
+    # 2 searched rooms, 2 * 3 recommended in hop 1, 6 * 3 in hop 2
+    assert [(hop["rooms"], hop["new_streamers"]) for hop in report["hops"]] == [(2, 6), (6, 18)]
+    assert report["stop_reason"] == "max_hops"
+    assert report["calls"] == 1 + live.recommend_calls == 9
+    assert len(records) == report["unique_streamers"] == 2 + 6 + 18
+    assert len({record.display_id for record in records}) == len(records)
+
+
+def test_call_budget_includes_the_search(make_service):
+    live = FakeLive(rooms=3)
+    service = make_service(live)
+
+    _, report = service.expand_live_graph("gaming", max_hops=3, call_budget=6, min_new_ratio=0)
+
+    # Hop 1 takes 3 calls, hop 2 gets the 2 left of its 9 rooms
+    assert [hop["rooms"] for hop in report["hops"]] == [3, 2]
+    assert report["stop_reason"] == "budget_exhausted"
+    assert report["calls"] == 6 and live.recommend_calls == 5
+
+
+def test_visited_rooms_are_not_fetched_again(make_service):
+    live = RoomsPointBack(rooms=2)
+    service = make_service(live)
+
+    records, report = service.expand_live_graph("gaming", max_hops=4, call_budget=100, min_new_ratio=0)
+
+    assert live.recommend_calls == 2
+    assert report["rooms_visited"] == 2
+    assert report["stop_reason"] == "frontier_exhausted"
+    assert len(records) == 2 + 2 * 2
+
+
+def test_low_yield_hop_stops_the_crawl(make_service):
+    live = SharedRecommendations(rooms=2)
+    service = make_service(live)
+
+    records, report = service.expand_live_graph("gaming", max_hops=5, call_budget=100, min_new_ratio=0.1)
+
+    # Hop 1: 6 returned, 3 new; hop 2: only streamers already found
+    assert [(hop["returned"], hop["new_streamers"]) for hop in report["hops"]] == [(6, 3), (9, 0)]
+    assert report["stop_reason"] == "low_yield"
+    assert len(records) == 2 + 3
+
+
+def test_query_is_stripped_like_a_plain_search(make_service):
+    live = FakeLive(rooms=1)
+    searched = []
+    search = live.search
+    live.search = lambda query, **kwargs: searched.append(query) or search(query, **kwargs)
+    service = make_service(live)
+
+    service.expand_live_graph("  gaming \n", max_hops=1, call_budget=10, min_new_ratio=0)
+    service.search_live_records(" gaming ")
+
+    assert searched == ["gaming", "gaming"]
@@ -0,0 +1,154 @@
+"""
+Prometheus text exposition, label children and request/database instrumentation
+"""
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+from app.services.metrics import (
+    DB_QUERY_LATENCY, HTTP_LATENCY, Counter, Histogram, MetricsMiddleware, MetricsRegistry, _Metric,
+    current_operation, instrument_engine, operation
+)
+
+
+def _count(histogram: Histogram, *labels) -> int:
+    """Observations of one child, 0 if it does not exist yet"""
+    child = histogram._children.get(tuple(labels))
+    return sum(child.counts) if child is not None else 0
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests served", ["method", "path"])
+    requests.labels("GET", '/a"b\\c\nd').inc(2)
+    requests.labels("GET", "/").inc()
+    registry.counter("restarts_total", "Restarts").inc(0.5)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1, 0.5))
+    for value in (0.05, 0.1, 0.7, 3):
+        latency.observe(value)
+    registry.callback("queue_depth", "Queued items", lambda: [(("a",), 3), (("b",), None)], ["queue"])
+
+    assert registry.render() == "\n".join([
+        "# HELP requests_total Requests served",
+        "# TYPE requests_total counter",
+        'requests_total{method="GET",path="/"} 1',
+        'requests_total{method="GET",path="/a\\"b\\\\c\\nd"} 2',
+        "# HELP restarts_total Restarts",
+        "# TYPE restarts_total counter",
+        "restarts_total 0.5",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        # Buckets are sorted and cumulative; a value on a bound counts in it
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="0.5"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.85",
+        "latency_seconds_count 4",
+        "# HELP queue_depth Queued items",
+        "# TYPE queue_depth gauge",
+        # Callback samples without a value are skipped
+        'queue_depth{queue="a"} 3',
+    ]) + "\n"
+
+
+def test_failing_callback_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+    registry.callback("broken", "Raises", lambda: 1 / 0)
+    registry.counter("ok_total", "Still rendered").inc()
+
+    assert registry.render().endswith("# TYPE ok_total counter\nok_total 1\n")
+
+
+def test_label_children():
+    counter = Counter("responses_total", "Responses", ["status"])
+
+    # Label values are strings: 200 and "200" are one child, created once
+    assert counter.labels(200) is counter.labels("200")
+    counter.labels(200).inc()
+    counter.labels("200").inc(2)
+    assert counter.labels("200").value == 3
+    assert list(counter._children) == [("200",)]
+
+    with pytest.raises(ValueError):
+        counter.labels("200", "extra")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("incomplete", "No child type")
+
+    class NoRender(_Metric):
+        def _new_child(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        NoRender("incomplete", "No renderer")
+
+
+def test_middleware_labels_requests_and_queries_by_route_template():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/items/{item_id}")
+    def item(item_id: int):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT :id"), {"id": item_id}).scalar_one()
+        return {"route": current_operation()}
+
+    @app.get("/metrics")
+    def scrape():
+        return {}
+
+    route = "/metrics-test/items/{item_id}"
+    before = _count(HTTP_LATENCY, "GET", route, "200"), _count(DB_QUERY_LATENCY, route)
+    unmatched = _count(HTTP_LATENCY, "GET", "unmatched", "404")
+    scrapes = _count(HTTP_LATENCY, "GET", "/metrics", "200")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = [await client.get(f"/metrics-test/items/{i}") for i in (1, 2)]
+            await client.get("/metrics-test/nowhere")
+            await client.get("/metrics")
+            return responses
+
+    responses = asyncio.run(scenario())
+
+    # One series per route template, not per item id
+    assert [response.json() for response in responses] == [{"route": route}] * 2
+    assert _count(HTTP_LATENCY, "GET", route, "200") == before[0] + 2
+    assert _count(DB_QUERY_LATENCY, route) == before[1] + 2
+    assert _count(HTTP_LATENCY, "GET", "unmatched", "404") == unmatched + 1
+    # The scrape endpoint is excluded from its own latency histogram
+    assert _count(HTTP_LATENCY, "GET", "/metrics", "200") == scrapes
+    engine.dispose()
+
+
+def test_instrument_engine_times_statements_per_operation():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    # Instrumenting again does not time statements twice
+    instrument_engine(engine)
+    before = _count(DB_QUERY_LATENCY, "metrics-test-job")
+    background = _count(DB_QUERY_LATENCY, "background")
+
+    with engine.connect() as connection:
+        with operation("metrics-test-job"):
+            connection.execute(text("SELECT 1"))
+            with pytest.raises(Exception):
+                connection.execute(text("SELECT * FROM missing_table"))
+            connection.execute(text("SELECT 2"))
+        assert current_operation() == "background"
+        connection.execute(text("SELECT 3"))
+        # A failed statement does not leave its start time behind
+        assert connection.info["metrics_started"] == []
+
+    assert _count(DB_QUERY_LATENCY, "metrics-test-job") == before + 2
+    assert _count(DB_QUERY_LATENCY, "background") == background + 1
+    engine.dispose()
@@ -0,0 +1,66 @@
+"""
+Alembic migrations, including databases created before they existed
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import inspect, text
+from app.models.database import BASELINE_REVISION, Base, Database
+from tests.conftest import BACKENDS
+
+pytestmark = pytest.mark.parametrize("database_url", BACKENDS, indirect=True)
+
+
+def _version(database: Database) -> str:
+    with database.engine.connect() as connection:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar_one()
+
+
+def _tables(database: Database) -> set:
+    return set(inspect(database.engine).get_table_names())
+
+
+def _indexes(database: Database, table: str) -> set:
+    return {index["name"] for index in inspect(database.engine).get_indexes(table)}
+
+
+def test_migrate_creates_a_new_database(database_url):
+    database = Database(database_url)
+    try:
+        database.migrate()
+        assert set(Base.metadata.tables) <= _tables(database)
+        assert _version(database) == BASELINE_REVISION
+    finally:
+        database.dispose()
+
+
+def test_migrate_stamps_a_legacy_database(database_url):
+    legacy = Database(database_url)
+    # What the app created before migrations: the early tables, without indexes
+    # added later and without alembic_version
+    with legacy.engine.begin() as connection:
+        for name in ("streamers", "scan_history"):
+            table = Base.metadata.tables[name]
+            table.create(connection)
+            for index in table.indexes:
+                index.drop(connection)
+        connection.execute(text(
+            "INSERT INTO streamers (username, query, viewers, first_seen, last_seen, times_seen, is_live) "
+            "VALUES ('old', 'q', 3, :now, :now, 7, :live)"
+        ), {"now": datetime(2023, 1, 1), "live": True})
+    legacy.dispose()
+
+    database = Database(database_url)
+    try:
+        database.migrate()
+
+        assert _version(database) == BASELINE_REVISION
+        assert set(Base.metadata.tables) <= _tables(database)
+        assert "ix_streamers_is_live_last_seen" in _indexes(database, "streamers")
+        with database.engine.connect() as connection:
+            assert connection.execute(text("SELECT username, times_seen FROM streamers")).all() == [("old", 7)]
+
+        # Running again is a no-op
+        database.migrate()
+        assert _version(database) == BASELINE_REVISION
+    finally:
+        database.dispose()
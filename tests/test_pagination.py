@@ -0,0 +1,68 @@
+"""
+Keyset pagination of list endpoints
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.database import ScanHistory
+from app.services.pagination import decode_cursor, encode_cursor, paginate
+
+T0 = datetime(2024, 1, 1)
+
+
+def _add_scans(db, count: int, start: datetime, same_timestamp_every: int = 3):
+    """Scans with groups of equal timestamps, to exercise the id tie-breaker"""
+    for i in range(count):
+        db.add(ScanHistory(
+            timestamp=start + timedelta(minutes=i // same_timestamp_every),
+            query=f"q{i}", streamers_found=i, success=True
+        ))
+    db.commit()
+
+
+def _page(db, cursor=None, limit=7):
+    return paginate(db.query(ScanHistory), ScanHistory.timestamp, ScanHistory.id, limit, cursor=cursor)
+
+
+def test_cursor_pages_are_stable_across_inserts(session):
+    _add_scans(session, 40, T0)
+    expected = [
+        scan.id for scan in
+        session.query(ScanHistory).order_by(ScanHistory.timestamp.desc(), ScanHistory.id.desc())
+    ]
+
+    seen = []
+    rows, cursor = _page(session)
+    seen.extend(row.id for row in rows)
+    while cursor:
+        # New scans land on top while the client is paging
+        _add_scans(session, 5, T0 + timedelta(days=1, minutes=len(seen)))
+        rows, cursor = _page(session, cursor)
+        seen.extend(row.id for row in rows)
+
+    assert seen == expected
+
+
+def test_offset_pages_shift_when_rows_are_inserted(session):
+    _add_scans(session, 20, T0)
+    first, _ = paginate(session.query(ScanHistory), ScanHistory.timestamp, ScanHistory.id, 5)
+    _add_scans(session, 2, T0 + timedelta(days=1))
+    second, _ = paginate(session.query(ScanHistory), ScanHistory.timestamp, ScanHistory.id, 5, offset=5)
+
+    # What cursors avoid: the last rows of page one show up again
+    assert {row.id for row in first} & {row.id for row in second}
+
+
+def test_last_page_has_no_cursor(session):
+    _add_scans(session, 14, T0)
+    rows, cursor = _page(session)
+    rows, cursor = _page(session, cursor)
+    assert len(rows) == 7 and cursor is not None
+    rows, cursor = _page(session, cursor)
+    assert rows == [] and cursor is None
+
+
+def test_cursor_round_trip_and_validation():
+    timestamp = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
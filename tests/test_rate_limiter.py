@@ -0,0 +1,136 @@
+"""
+Token bucket, 429 handling and priorities of the shared rate limiter
+"""
+import threading
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from tikapi import ResponseException
+from app.services import rate_limiter as rate_limiter_module
+from app.services.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RateLimiter
+
+
+class RateLimitedStub:
+    """Answers 429 for the first `failures` calls, then "ok" """
+
+    def __init__(self, failures: int, retry_after=None, status_code: int = 429):
+        self.failures = failures
+        self.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+        self.status_code = status_code
+        self.called_at = []
+
+    def __call__(self, **kwargs):
+        self.called_at.append(time.monotonic())
+        if len(self.called_at) <= self.failures:
+            error = ResponseException(f"HTTP {self.status_code}")
+            error.response = SimpleNamespace(status_code=self.status_code, headers=self.headers)
+            raise error
+        return "ok"
+
+
+def test_retry_after_pauses_the_bucket():
+    limiter = RateLimiter(rate=0)
+    stub = RateLimitedStub(failures=1, retry_after="0.3")
+
+    assert limiter.call(stub, query="q") == "ok"
+
+    assert stub.called_at[1] - stub.called_at[0] >= 0.3
+    stats = limiter.stats()
+    assert (stats["calls"], stats["rate_limited"], stats["retries"], stats["throttled"]) == (2, 1, 1, 1)
+
+
+def test_retry_after_as_http_date():
+    limiter = RateLimiter(rate=0)
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=2)
+    stub = RateLimitedStub(failures=1, retry_after=format_datetime(retry_at, usegmt=True))
+
+    assert limiter.call(stub) == "ok"
+    # HTTP dates have whole seconds
+    assert stub.called_at[1] - stub.called_at[0] >= 0.9
+
+
+def test_backoff_with_jitter_without_retry_after(monkeypatch):
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high / 2
+
+    monkeypatch.setattr(rate_limiter_module.random, "uniform", uniform)
+    limiter = RateLimiter(rate=0, max_retries=3, backoff_base=0.1, backoff_max=0.3)
+    stub = RateLimitedStub(failures=3)
+
+    assert limiter.call(stub) == "ok"
+
+    # Full jitter over an exponential range, capped at backoff_max
+    assert bounds == [(0, 0.1), (0, 0.2), (0, 0.3)]
+    gaps = [later - earlier for earlier, later in zip(stub.called_at, stub.called_at[1:])]
+    assert all(gap >= high / 2 for gap, (_, high) in zip(gaps, bounds))
+    assert limiter.stats()["retries"] == 3
+
+
+def test_gives_up_after_max_retries():
+    limiter = RateLimiter(rate=0, max_retries=2, backoff_base=0.01)
+    stub = RateLimitedStub(failures=10)
+
+    with pytest.raises(ResponseException):
+        limiter.call(stub)
+
+    assert len(stub.called_at) == 3
+    stats = limiter.stats()
+    assert (stats["rate_limited"], stats["retries"]) == (3, 2)
+
+
+def test_other_errors_are_not_retried():
+    limiter = RateLimiter(rate=0)
+    stub = RateLimitedStub(failures=1, status_code=500)
+
+    with pytest.raises(ResponseException):
+        limiter.call(stub)
+    assert len(stub.called_at) == 1 and limiter.stats()["rate_limited"] == 0
+
+
+def test_interactive_callers_go_before_background_ones():
+    limiter = RateLimiter(rate=5, burst=1)
+    limiter.acquire()  # empty the bucket: the next token comes in 0.2s
+    order = []
+
+    def caller(name, priority):
+        limiter.acquire(priority)
+        order.append(name)
+
+    background = threading.Thread(target=caller, args=("background", PRIORITY_BACKGROUND))
+    interactive = threading.Thread(target=caller, args=("interactive", PRIORITY_INTERACTIVE))
+    background.start()
+    time.sleep(0.05)
+    interactive.start()
+    background.join(2)
+    interactive.join(2)
+
+    # The background call was waiting first but yields the next token
+    assert order == ["interactive", "background"]
+    stats = limiter.stats()
+    assert (stats["calls"], stats["throttled"]) == (3, 2)
+
+
+def test_bucket_allows_burst_then_throttles():
+    limiter = RateLimiter(rate=20, burst=3)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    # Three tokens in the bucket, two more at 20/s
+    assert time.monotonic() - started >= 0.09
+    stats = limiter.stats()
+    assert (stats["calls"], stats["throttled"]) == (5, 2)
+
+
+def test_unknown_priority_is_rejected():
+    limiter = RateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        limiter.acquire(priority=5)
+    with pytest.raises(ValueError):
+        limiter.call(lambda: "ok", priority=-1)
+    assert limiter.stats()["calls"] == 0
+    assert limiter.call(lambda: "ok", priority=PRIORITY_BACKGROUND) == "ok"
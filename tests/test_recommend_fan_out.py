@@ -0,0 +1,44 @@
+"""
+Recommend fan-out: one deadline for all rooms of a search
+"""
+import time
+from tests.conftest import FakeLive
+
+ROOMS = [str(1000 + i) for i in range(8)]
+
+
+def test_slow_rooms_cost_one_timeout_and_finished_rooms_are_kept(make_service):
+    live = FakeLive(rooms=8, latency=0.05, room_latency={"1006": 1.5, "1007": 1.5})
+    service = make_service(live, max_rooms=8, max_workers=8, recommend_timeout=0.5)
+
+    started = time.monotonic()
+    results = service._fetch_recommendations(ROOMS)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.8
+    assert all(len(records) == 3 for records in results[:6])
+    assert results[6] is None and results[7] is None
+
+
+def test_queued_calls_count_against_the_same_deadline(make_service):
+    # Two workers, eight rooms of 0.3s each: only the first wave fits in 0.5s
+    live = FakeLive(rooms=8, latency=0.3)
+    service = make_service(live, max_rooms=8, max_workers=2, recommend_timeout=0.5)
+
+    started = time.monotonic()
+    results = service._fetch_recommendations(ROOMS)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.8
+    assert len(results) == len(ROOMS)
+    assert len(results[0]) == 3 and len(results[1]) == 3
+    assert results[-1] is None
+
+
+def test_failed_room_does_not_drop_the_others(make_service):
+    live = FakeLive(rooms=3, failing_rooms={"1001"})
+    service = make_service(live, max_workers=3, recommend_timeout=2)
+
+    results = service._fetch_recommendations(["1000", "1001", "1002"])
+
+    assert [len(records) if records is not None else None for records in results] == [3, None, 3]
@@ -0,0 +1,131 @@
+"""
+Hourly scan rollups against raw scan_history aggregates
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+import pytest
+from app.models.database import ScanHistory, ScanRollup, Streamer
+from app.services.extractor import LiveRecord
+from app.services.retention import RetentionJob
+from app.services.rollups import backfill, window_metrics
+from app.services.streamer_store import record_scan
+
+NOW = datetime(2024, 3, 10, 12, 30)
+SCAN_METRICS = ("scans", "successful_scans", "failed_scans", "streamers_found")
+
+
+def _fill(db, hours: int = 72, every_minutes: int = 17):
+    """Scans of two queries every few minutes, some failed, over the last hours"""
+    scanned_at = NOW - timedelta(hours=hours)
+    i = 0
+    while scanned_at < NOW:
+        query = "a" if i % 2 else "b"
+        error = "boom" if i % 7 == 0 else None
+        records = [LiveRecord(f"u{(i * 3 + j) % 40}", viewers=j) for j in range(i % 5 + 1)]
+        record_scan(db, query, records, scanned_at=scanned_at, error=error)
+        scanned_at += timedelta(minutes=every_minutes)
+        i += 1
+    db.commit()
+
+
+def _raw(db, cutoff: datetime) -> dict:
+    """Per-query scan metrics straight from scan_history"""
+    by_query = defaultdict(lambda: dict.fromkeys(SCAN_METRICS, 0))
+    for scan in db.query(ScanHistory).filter(ScanHistory.timestamp >= cutoff):
+        metrics = by_query[scan.query]
+        metrics["scans"] += 1
+        metrics["successful_scans" if scan.success else "failed_scans"] += 1
+        metrics["streamers_found"] += scan.streamers_found
+    return dict(by_query)
+
+
+def _from_rollups(result: dict) -> dict:
+    return {row["query"]: {metric: row[metric] for metric in SCAN_METRICS} for row in result["by_query"]}
+
+
+@pytest.mark.parametrize("hours", [1, 5.5, 24, 47.25, 100])
+def test_window_metrics_match_raw_scans(session, hours):
+    _fill(session)
+    cutoff = NOW - timedelta(hours=hours)
+
+    result = window_metrics(session, cutoff)
+
+    assert _from_rollups(result) == _raw(session, cutoff)
+    assert result["totals"]["scans"] == session.query(ScanHistory).filter(ScanHistory.timestamp >= cutoff).count()
+
+
+def test_new_streamers_are_counted_per_whole_hour(session):
+    _fill(session)
+    cutoff = NOW.replace(minute=0) - timedelta(hours=30)
+
+    result = window_metrics(session, cutoff)
+
+    assert result["totals"]["new_streamers"] == (
+        session.query(Streamer).filter(Streamer.first_seen >= cutoff).count()
+    )
+
+
+def test_window_metrics_survive_retention(session):
+    _fill(session)
+    hour = NOW.replace(minute=0)
+    cutoffs = [hour - timedelta(hours=hours) for hours in (60, 48, 30)]
+    before = {cutoff: _raw(session, cutoff) for cutoff in cutoffs}
+
+    # Scans recorded before the rollups existed are downsampled, not lost
+    session.query(ScanRollup).filter(ScanRollup.bucket < NOW - timedelta(hours=50)).delete()
+    session.commit()
+
+    report = RetentionJob(scan_history_days=1, sighting_days=0, batch_size=50, batch_pause=0).apply(session, now=NOW)
+
+    assert report["scan_history_deleted"] > 0
+    assert session.query(ScanHistory).filter(ScanHistory.timestamp < NOW - timedelta(days=1)).count() == 0
+    for cutoff in cutoffs:
+        assert _from_rollups(window_metrics(session, cutoff)) == before[cutoff]
+
+
+def test_pruned_first_hour_falls_back_to_its_rollup(session):
+    _fill(session)
+    pruned = NOW - timedelta(hours=40, minutes=20)
+    kept = NOW - timedelta(hours=5, minutes=40)
+    before = {cutoff: _raw(session, cutoff) for cutoff in (pruned.replace(minute=0), kept)}
+
+    RetentionJob(scan_history_days=1, sighting_days=0, batch_pause=0).apply(session, now=NOW)
+
+    # The raw rows of the first hour are gone, so the whole hour is counted
+    assert _from_rollups(window_metrics(session, pruned)) == before[pruned.replace(minute=0)]
+    # Within the retention window the partial hour is still exact
+    assert _from_rollups(window_metrics(session, kept)) == before[kept]
+
+
+def test_backfill_rebuilds_lost_rollups(session):
+    _fill(session, hours=30)
+    cutoffs = [NOW - timedelta(hours=hours) for hours in (3, 12.5, 29)]
+    session.query(ScanRollup).filter(ScanRollup.bucket >= NOW - timedelta(hours=10)).delete()
+    session.commit()
+
+    report = backfill(session, batch_size=7)
+
+    assert report["scans"] == session.query(ScanHistory).count()
+    # Only the hour of the oldest scan could have been partly pruned
+    first_hour = (NOW - timedelta(hours=30)).replace(minute=0)
+    assert report["kept"] == session.query(ScanRollup).filter(ScanRollup.bucket == first_hour).count()
+    for cutoff in cutoffs:
+        assert _from_rollups(window_metrics(session, cutoff)) == _raw(session, cutoff)
+
+
+def test_backfill_after_retention_keeps_downsampled_hours(session):
+    _fill(session)
+    hour = NOW.replace(minute=0)
+    cutoffs = [hour - timedelta(hours=hours) for hours in (60, 30, 5)]
+    before = {cutoff: _raw(session, cutoff) for cutoff in cutoffs}
+    RetentionJob(scan_history_days=1, sighting_days=0, batch_pause=0).apply(session, now=NOW)
+    # A lost rollup inside the retention window is rebuilt
+    session.query(ScanRollup).filter(ScanRollup.bucket == hour - timedelta(hours=3)).delete()
+    session.commit()
+
+    report = backfill(session)
+
+    # Hours whose raw scans are gone keep their rollups
+    assert report["kept"] > 0
+    for cutoff in cutoffs:
+        assert _from_rollups(window_metrics(session, cutoff)) == before[cutoff]
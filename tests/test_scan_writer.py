@@ -0,0 +1,142 @@
+"""
+Write-behind scan queue: batching, retries, backpressure and shutdown
+"""
+import asyncio
+import threading
+from app.models.database import ScanHistory
+from app.services import scan_writer as scan_writer_module
+from app.services.extractor import LiveRecord
+from app.services.scan_writer import ScanWriter
+
+
+def _records(query: str):
+    return [LiveRecord(f"{query}-user")]
+
+
+def _block_writes(monkeypatch, writer: ScanWriter) -> threading.Event:
+    """Hold every batch write until the returned event is set"""
+    release = threading.Event()
+    write = writer._write
+
+    def blocked_write(batch):
+        release.wait(5)
+        return write(batch)
+
+    monkeypatch.setattr(writer, "_write", blocked_write)
+    return release
+
+
+def test_scans_are_written_in_batches(database, session):
+    async def scenario():
+        writer = ScanWriter(batch_size=3, flush_interval=0.2)
+        writer.start()
+        results = await writer.submit_many([(f"q{i}", _records(f"q{i}"), None, None) for i in range(7)])
+        await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(scenario())
+
+    assert [rows[0]["username"] for rows in results] == [f"q{i}-user" for i in range(7)]
+    assert writer.batches == 3 and writer.scans_written == 7
+    assert session.query(ScanHistory).count() == 7
+
+
+def test_failed_batch_is_retried_scan_by_scan(database, session, monkeypatch):
+    record_scan = scan_writer_module.record_scan
+
+    def failing_record_scan(db, query, *args, **kwargs):
+        if query == "bad":
+            raise ValueError("bad scan")
+        return record_scan(db, query, *args, **kwargs)
+
+    monkeypatch.setattr(scan_writer_module, "record_scan", failing_record_scan)
+
+    async def scenario():
+        writer = ScanWriter(batch_size=10, flush_interval=0.2)
+        writer.start()
+        outcomes = await asyncio.gather(
+            *(writer.submit(query, _records(query)) for query in ("a", "bad", "b")),
+            return_exceptions=True
+        )
+        await writer.stop()
+        return writer, outcomes
+
+    writer, outcomes = asyncio.run(scenario())
+
+    # One transaction for the batch failed; only the bad scan's submitter sees it
+    assert outcomes[0][0]["username"] == "a-user" and outcomes[2][0]["username"] == "b-user"
+    assert isinstance(outcomes[1], ValueError)
+    assert writer.batches == 1 and writer.scans_written == 2 and writer.scans_failed == 1
+    assert {scan.query for scan in session.query(ScanHistory)} == {"a", "b"}
+
+
+def test_full_queue_blocks_producers(database, monkeypatch):
+    async def scenario():
+        writer = ScanWriter(max_queued=2, batch_size=1, flush_interval=0)
+        release = _block_writes(monkeypatch, writer)
+        writer.start()
+        tasks = [asyncio.create_task(writer.submit(f"q{i}", _records(f"q{i}"))) for i in range(6)]
+        await asyncio.sleep(0.05)
+
+        # One scan in the writer, two queued, three producers waiting
+        assert writer.stats()["queued"] == 2
+        assert writer._putting == 3
+        assert not any(task.done() for task in tasks)
+
+        release.set()
+        results = await asyncio.gather(*tasks)
+        await writer.stop()
+        return writer, results
+
+    writer, results = asyncio.run(scenario())
+
+    assert len(results) == 6 and writer.scans_written == 6
+
+
+def test_stop_writes_scans_of_blocked_producers(database, session, monkeypatch):
+    async def scenario():
+        writer = ScanWriter(max_queued=2, batch_size=2, flush_interval=0)
+        release = _block_writes(monkeypatch, writer)
+        writer.start()
+        tasks = [asyncio.create_task(writer.submit(f"q{i}", _records(f"q{i}"))) for i in range(7)]
+        await asyncio.sleep(0.05)
+        assert writer._putting > 0
+
+        stopping = asyncio.create_task(writer.stop())
+        await asyncio.sleep(0.05)
+        # Stopped writers no longer queue: this scan is written directly
+        late = asyncio.create_task(writer.submit("late", _records("late")))
+        release.set()
+        await stopping
+        return writer, await asyncio.gather(*tasks), await late
+
+    writer, results, late = asyncio.run(scenario())
+
+    assert [rows[0]["username"] for rows in results] == [f"q{i}-user" for i in range(7)]
+    assert late[0]["username"] == "late-user"
+    assert writer.scans_written == 7 and not writer.running
+    assert session.query(ScanHistory).count() == 8
+
+
+def test_stop_fails_scans_left_by_a_crashed_writer(database, monkeypatch):
+    async def scenario():
+        writer = ScanWriter(max_queued=2, batch_size=1, flush_interval=0)
+
+        async def crashing_flush(batch):
+            for scan in batch:
+                scan.future.set_exception(RuntimeError("write failed"))
+            raise RuntimeError("writer crashed")
+
+        monkeypatch.setattr(writer, "_flush", crashing_flush)
+        writer.start()
+        tasks = [asyncio.create_task(writer.submit(f"q{i}", _records(f"q{i}"))) for i in range(5)]
+        await asyncio.sleep(0.05)
+        await writer.stop()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    outcomes = asyncio.run(scenario())
+
+    # Nobody is left waiting: the queued and blocked scans fail on stop
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert str(outcomes[0]) == "write failed"
+    assert all("stopped before storing" in str(outcome) for outcome in outcomes[1:])
@@ -0,0 +1,59 @@
+"""
+Per-query search cache: only complete searches are reused
+"""
+from app.services.cache import TTLCache
+from tests.conftest import FakeLive
+
+
+def test_partial_search_is_not_served_once_upstream_recovers(make_service):
+    live = FakeLive(rooms=3, failing_rooms={"1001"})
+    service = make_service(live, max_workers=3, recommend_timeout=2, search_cache=TTLCache(ttl=60))
+
+    partial = service.search_live_records("gaming")
+    assert "r1001-0" not in {record.display_id for record in partial}
+    assert service.search_cache.stats()["size"] == 0
+
+    live.failing_rooms.clear()
+    recovered = service.search_live_records("gaming")
+    assert "r1001-0" in {record.display_id for record in recovered}
+    assert live.search_calls == 2
+
+    # Now complete, so it is cached
+    assert service.search_live_records("gaming") == recovered
+    assert live.search_calls == 2
+
+
+def test_timed_out_rooms_are_not_cached(make_service):
+    live = FakeLive(rooms=3, room_latency={"1002": 0.5})
+    service = make_service(live, max_workers=3, recommend_timeout=0.2, search_cache=TTLCache(ttl=60))
+
+    service.search_live_records("gaming")
+    service.search_live_records("gaming")
+    assert live.search_calls == 2
+
+
+def test_query_is_stripped_for_the_key_and_the_upstream_call(make_service):
+    queries = []
+    live = FakeLive(rooms=1)
+    search = live.search
+    live.search = lambda query, **kwargs: queries.append(query) or search(query, **kwargs)
+    service = make_service(live, search_cache=TTLCache(ttl=60))
+
+    first = service.search_live_records("  gaming ")
+    assert service.search_live_records("gaming") == first
+    assert queries == ["gaming"]
+
+
+def test_stream_caches_only_complete_searches(make_service):
+    live = FakeLive(rooms=2, failing_rooms={"1000"})
+    service = make_service(live, max_workers=2, recommend_timeout=2, search_cache=TTLCache(ttl=60))
+
+    steps = list(service.iter_live_records(" gaming"))
+    assert [step.stage for step in steps][0] == "search"
+    assert service.search_cache.stats()["size"] == 0
+
+    live.failing_rooms.clear()
+    list(service.iter_live_records("gaming"))
+    steps = list(service.iter_live_records("gaming "))
+    assert [step.stage for step in steps] == ["cached"]
+    assert {"r1000-0", "r1001-0"} <= {record.display_id for record in steps[0].records}
@@ -0,0 +1,76 @@
+"""
+Progressive live search (/api/search-live/stream)
+"""
+import threading
+import time
+import pytest
+from app.services.cache import TTLCache
+from tests.conftest import FakeLive
+
+
+def test_steps_arrive_in_completion_order_and_fill_the_cache(make_service):
+    live = FakeLive(rooms=3, room_latency={"1000": 0.3, "1001": 0.0, "1002": 0.1})
+    service = make_service(live, max_workers=3, recommend_timeout=2, search_cache=TTLCache(ttl=60))
+
+    steps = list(service.iter_live_records("gaming"))
+
+    assert [step.stage for step in steps] == ["search", "recommendations", "recommendations", "recommendations"]
+    assert [step.room_id for step in steps[1:]] == ["1001", "1002", "1000"]
+    assert [step.rooms_done for step in steps] == [0, 1, 2, 3]
+    streamed = [record for step in steps for record in step.records]
+    assert len({record.display_id for record in streamed}) == len(streamed)
+
+    # Same records as the non-streaming search, now served from the cache
+    assert sorted(service.search_live_records("gaming")) == sorted(streamed)
+    assert live.search_calls == 1
+
+
+def test_stream_and_search_share_one_deadline(make_service):
+    live = FakeLive(rooms=4, room_latency={"1003": 2.0})
+    service = make_service(live, max_workers=4, recommend_timeout=0.4, search_cache=TTLCache(ttl=60))
+
+    started = time.monotonic()
+    steps = list(service.iter_live_records("gaming"))
+    assert time.monotonic() - started < 0.8
+    assert steps[-1].room_id == "1003" and steps[-1].records == []
+
+    started = time.monotonic()
+    service.search_live_records("gaming")
+    assert time.monotonic() - started < 0.8
+    # Neither incomplete search was cached
+    assert live.search_calls == 2
+
+
+def test_concurrent_streams_share_one_upstream_search(make_service):
+    live = FakeLive(rooms=2, latency=0.2)
+    service = make_service(live, max_workers=2, recommend_timeout=2, search_cache=TTLCache(ttl=60))
+    results = {}
+
+    def consume(name):
+        results[name] = list(service.iter_live_records("gaming"))
+
+    threads = [threading.Thread(target=consume, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+
+    assert live.search_calls == 1
+    assert [step.stage for step in results["a"]][0] == "search"
+    assert [step.stage for step in results["b"]] == ["cached"]
+    streamed = {record.display_id for step in results["a"] for record in step.records}
+    assert {record.display_id for record in results["b"][0].records} == streamed
+
+
+def test_search_errors_are_raised_by_the_stream(make_service):
+    live = FakeLive()
+
+    def fail(query, **kwargs):
+        raise RuntimeError("upstream down")
+
+    live.search = fail
+    service = make_service(live, search_cache=TTLCache(ttl=60))
+
+    with pytest.raises(RuntimeError, match="upstream down"):
+        list(service.iter_live_records("gaming"))
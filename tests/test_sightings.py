@@ -0,0 +1,39 @@
+"""
+Sighting history retention
+"""
+from datetime import datetime, timedelta
+from app.models.database import Sighting
+from app.services.extractor import LiveRecord
+from app.services.sightings import prune_sightings, to_epoch
+from app.services.streamer_store import record_scan
+
+NOW = datetime(2024, 6, 1, 12, 0)
+OLD = NOW - timedelta(days=100)
+RECENT = NOW - timedelta(days=1)
+
+
+def _scan(db, names, scanned_at):
+    record_scan(db, "q", [LiveRecord(name) for name in names], scanned_at=scanned_at)
+    db.commit()
+
+
+def test_prune_steps_over_rows_stored_out_of_order(session):
+    _scan(session, ["a", "b"], OLD)
+    _scan(session, ["c"], RECENT)
+    # An old scan stored late lands after a recent one in primary key order
+    _scan(session, ["d", "e", "f", "g", "h"], OLD + timedelta(hours=1))
+    _scan(session, ["i", "j"], RECENT)
+
+    deleted = prune_sightings(session, retention_days=90, batch_size=3, now=NOW)
+
+    assert deleted == 7
+    cutoff = to_epoch(NOW - timedelta(days=90))
+    assert session.query(Sighting).filter(Sighting.seen_at < cutoff).count() == 0
+    assert session.query(Sighting).count() == 3
+
+
+def test_prune_stops_at_the_first_batch_inside_the_window(session):
+    _scan(session, ["a", "b", "c"], RECENT)
+    assert prune_sightings(session, retention_days=90, batch_size=2, now=NOW) == 0
+    assert prune_sightings(session, retention_days=0, now=NOW + timedelta(days=365)) == 0
+    assert session.query(Sighting).count() == 3
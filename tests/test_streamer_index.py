@@ -0,0 +1,174 @@
+"""
+In-memory streamer index on the write path
+"""
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.models.database import Streamer
+from app.services.streamer_index import STREAMER_INDEX_ENABLED, StreamerIndex, index_enabled_for, streamer_index
+from app.services.streamer_store import pop_came_online, upsert_streamers
+from app.services.sweeper import LiveStatusSweeper
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+def _assert_index_matches(db):
+    """Every stored streamer is either unknown to the index or exactly right"""
+    for streamer in db.query(Streamer):
+        entry = streamer_index.get(streamer.username)
+        if entry is not None:
+            assert entry.id == streamer.id
+            assert entry.times_seen == streamer.times_seen
+            assert entry.last_seen == streamer.last_seen
+            assert entry.is_live == streamer.is_live
+
+
+def test_concurrent_upserts_keep_index_and_database_in_step(database):
+    session = database.get_session()
+    upsert_streamers(session, "q", [f"u{i}" for i in range(10)], seen_at=T0, viewers={})
+    session.commit()
+    streamer_index.warm(session)
+
+    rounds, threads = 15, 4
+    errors = []
+
+    def writer(worker: int):
+        db = database.get_session()
+        try:
+            for round_ in range(rounds):
+                usernames = [f"u{(worker + round_ + i) % 20}" for i in range(8)]
+                # One timestamp: concurrent writers apply theirs in any order
+                upsert_streamers(db, "q", usernames, seen_at=T0, viewers={})
+                db.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    workers = [threading.Thread(target=writer, args=(worker,)) for worker in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert errors == []
+    session.expire_all()
+    total = sum(streamer.times_seen for streamer in session.query(Streamer))
+    assert total == 10 + rounds * threads * 8
+    _assert_index_matches(session)
+    session.close()
+
+
+def test_rollback_after_reserve_does_not_leave_reserved_state(session):
+    upsert_streamers(session, "q", ["a", "b"], seen_at=T0, viewers={})
+    session.commit()
+    streamer_index.warm(session)
+    a_id = streamer_index.get("a").id
+    session.execute(update(Streamer).where(Streamer.id == a_id).values(is_live=False))
+    session.commit()
+    streamer_index.mark_offline([a_id])
+    pop_came_online()
+
+    # Reserved through the index, then rolled back
+    upsert_streamers(session, "q", ["a", "b"], seen_at=T0 + timedelta(hours=1), viewers={})
+    session.rollback()
+
+    assert pop_came_online() == 0
+    assert streamer_index.get("a") is None
+    assert streamer_index.get("b") is None
+    _assert_index_matches(session)
+
+    # The next sighting reads the stored (offline) row again
+    rows = upsert_streamers(session, "q", ["a"], seen_at=T0 + timedelta(hours=2), viewers={})
+    session.commit()
+    assert rows[0]["times_seen"] == 2
+    assert pop_came_online() == 1
+    _assert_index_matches(session)
+
+
+def test_rowid_reused_after_rolled_back_insert(session):
+    streamer_index.warm(session)
+    upsert_streamers(session, "q", ["base"], seen_at=T0, viewers={})
+    session.commit()
+
+    upsert_streamers(session, "q", ["ghost"], seen_at=T0, viewers={})
+    session.rollback()
+
+    # SQLite hands the rolled back row id to the next insert
+    rows = upsert_streamers(session, "q", ["real"], seen_at=T0, viewers={})
+    session.commit()
+    assert rows[0]["times_seen"] == 1
+    assert streamer_index.get("real").times_seen == 1
+
+    rows = upsert_streamers(session, "q", ["ghost", "real"], seen_at=T0 + timedelta(minutes=1), viewers={})
+    session.commit()
+    assert {row["username"]: row["times_seen"] for row in rows} == {"ghost": 1, "real": 2}
+    assert session.query(Streamer).count() == 3
+    _assert_index_matches(session)
+
+
+def test_sighting_between_sweep_commit_and_mark_offline(database, session, monkeypatch):
+    upsert_streamers(session, "q", ["a", "b"], seen_at=T0, viewers={})
+    session.commit()
+    streamer_index.warm(session)
+    pop_came_online()
+    now = T0 + timedelta(hours=2)
+    mark_offline = streamer_index.mark_offline
+
+    def sighting_then_mark_offline(streamer_ids, cutoff=None):
+        streamer_ids = list(streamer_ids)
+        # A scan reserves "a" after the sweeper's UPDATE committed
+        writer = database.get_session()
+        upsert_streamers(writer, "q", ["a"], seen_at=now, viewers={})
+        writer.commit()
+        writer.close()
+        mark_offline(streamer_ids, cutoff)
+
+    monkeypatch.setattr(streamer_index, "mark_offline", sighting_then_mark_offline)
+    report = LiveStatusSweeper(window_minutes=30).sweep(session, now=now)
+    monkeypatch.undo()
+
+    assert report["went_offline"] == 2
+    session.expire_all()
+    assert {s.username: s.is_live for s in session.query(Streamer)} == {"a": True, "b": False}
+    assert streamer_index.get("a").is_live and not streamer_index.get("b").is_live
+    _assert_index_matches(session)
+
+    # "a" stayed live: its next sighting is not another comeback
+    upsert_streamers(session, "q", ["a"], seen_at=now + timedelta(minutes=1), viewers={})
+    session.commit()
+    assert pop_came_online() == 0
+
+
+def test_index_is_only_trusted_with_a_single_writer():
+    assert index_enabled_for("sqlite") == STREAMER_INDEX_ENABLED
+    assert not index_enabled_for("postgresql")
+
+
+def test_memory_per_entry():
+    index = StreamerIndex()
+    timestamp = datetime(2024, 1, 1)
+    loaded = 0
+    for count in (60000, 131000):
+        index.load((f"user{i}", i, 1, timestamp, timestamp, True) for i in range(loaded + 1, count + 1))
+        loaded = count
+        per_entry = index.memory_bytes() / count
+        assert per_entry < 110
+    # Just before the next doubling: the documented ~55 bytes
+    assert per_entry < 56
+
+
+def test_clear_resets_the_index():
+    index = StreamerIndex(capacity=8)
+    timestamp = datetime(2024, 1, 1)
+    index.load((f"user{i}", i, 3, timestamp, timestamp, True) for i in range(1, 100))
+    index.reserve(["user1", "nobody"], timestamp)
+    index.warmed = True
+
+    index.clear()
+
+    assert index.get("user1") is None
+    assert index.stats()["entries"] == 0 and index.stats()["hits"] == 0
+    assert not index.warmed
+    index.load([("user1", 1, 3, timestamp, timestamp, True)])
+    assert index.get("user1").times_seen == 3
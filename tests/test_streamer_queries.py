@@ -0,0 +1,99 @@
+"""
+Streamer <-> query association and its backfill
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.api.routes import get_streamers
+from app.models.database import SearchQuery, Streamer, StreamerQuery
+from app.services import streamer_queries
+from app.services.extractor import LiveRecord
+from app.services.sightings import prune_sightings
+from app.services.streamer_queries import (
+    queries_for_streamer, streamer_counts_by_query, streamers_for_query
+)
+from app.services.streamer_store import record_scan
+
+T0 = datetime(2024, 6, 1, 12, 0)
+
+
+def _scan(db, query, names, scanned_at):
+    record_scan(db, query, [LiveRecord(name) for name in names], scanned_at=scanned_at)
+    db.commit()
+
+
+def _associations(db) -> dict:
+    """(username, query) -> (first_seen, last_seen, times_seen)"""
+    rows = db.execute(
+        select(
+            Streamer.username, SearchQuery.text,
+            StreamerQuery.first_seen, StreamerQuery.last_seen, StreamerQuery.times_seen
+        )
+        .join(Streamer, Streamer.id == StreamerQuery.streamer_id)
+        .join(SearchQuery, SearchQuery.id == StreamerQuery.query_id)
+    )
+    return {(username, text): tuple(counts) for username, text, *counts in rows}
+
+
+def _seed(db):
+    _scan(db, "gaming", ["ana", "bob"], T0)
+    _scan(db, "music", ["bob", "cid"], T0 + timedelta(hours=1))
+    _scan(db, "gaming", ["bob"], T0 + timedelta(hours=2))
+
+
+def test_each_sighting_is_counted_per_query(session):
+    _seed(session)
+
+    assert _associations(session) == {
+        ("ana", "gaming"): (T0, T0, 1),
+        ("bob", "gaming"): (T0, T0 + timedelta(hours=2), 2),
+        ("bob", "music"): (T0 + timedelta(hours=1), T0 + timedelta(hours=1), 1),
+        ("cid", "music"): (T0 + timedelta(hours=1), T0 + timedelta(hours=1), 1),
+    }
+
+
+def test_streamers_endpoint_filters_on_every_query_that_found_them(session):
+    _seed(session)
+
+    # bob's latest query is gaming, but music found him too
+    response = get_streamers(query="music", is_live=None, limit=10, offset=0, cursor=None, count=False, db=session)
+    assert response["success"]
+    assert sorted(row["username"] for row in response["data"]) == ["bob", "cid"]
+
+    ids = {streamer_id for (streamer_id,) in session.execute(streamers_for_query("nothing"))}
+    assert ids == set()
+
+
+def test_counts_and_queries_per_streamer(session):
+    _seed(session)
+    bob = session.query(Streamer).filter_by(username="bob").one()
+
+    _scan(session, "music", ["dan"], T0 + timedelta(hours=3))
+
+    assert streamer_counts_by_query(session) == [{"query": "music", "count": 3}, {"query": "gaming", "count": 2}]
+    assert [(row["query"], row["times_seen"]) for row in queries_for_streamer(session, bob.id)] == [
+        ("gaming", 2), ("music", 1)
+    ]
+    assert queries_for_streamer(session, bob.id)[0]["last_seen"] == (T0 + timedelta(hours=2)).isoformat()
+
+
+def test_backfill_adds_missing_pairs_and_keeps_pruned_ones(session):
+    _seed(session)
+    before = _associations(session)
+    # Sightings of the first two scans are pruned; one association is lost
+    prune_sightings(session, retention_days=1, now=T0 + timedelta(days=1, hours=1, minutes=30))
+    bob = session.query(Streamer).filter_by(username="bob").one()
+    session.query(StreamerQuery).filter(StreamerQuery.streamer_id == bob.id).delete()
+    session.commit()
+
+    report = streamer_queries.backfill(session)
+
+    after = _associations(session)
+    # Memberships only the pruned sightings knew about survive, with their first_seen
+    assert after[("ana", "gaming")] == before[("ana", "gaming")]
+    assert after[("cid", "music")] == before[("cid", "music")]
+    # bob's gaming association is rebuilt from the sighting that is left
+    assert after[("bob", "gaming")] == (T0 + timedelta(hours=2), T0 + timedelta(hours=2), 1)
+    assert report["added"] == 1
+
+    assert streamer_queries.backfill(session)["added"] == 0
+    assert _associations(session) == after
@@ -0,0 +1,70 @@
+"""
+Bulk upsert of streamer sightings
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app.models.database import Streamer
+from app.services.streamer_index import streamer_index
+from app.services.streamer_store import pop_came_online, upsert_streamers
+from tests.conftest import BACKENDS
+
+pytestmark = pytest.mark.parametrize("database_url", BACKENDS, indirect=True)
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _mark_offline(db, usernames):
+    """What the sweeper does to streamers it stops seeing"""
+    ids = [row.id for row in db.query(Streamer.id).filter(Streamer.username.in_(usernames))]
+    db.execute(update(Streamer).where(Streamer.id.in_(ids)).values(is_live=False))
+    db.commit()
+    streamer_index.mark_offline(ids)
+
+
+@pytest.fixture(params=["cold", "indexed"])
+def store(request, session):
+    """A session whose writes go through the upsert path or the streamer index"""
+    if request.param == "indexed":
+        streamer_index.warm(session)
+    pop_came_online()
+    return session
+
+
+def test_upsert_counts_sightings(store):
+    rows = upsert_streamers(store, "q1", ["a", "b", "a"], seen_at=T0, viewers={"a": 5, "b": 7})
+    store.commit()
+    assert [row["username"] for row in rows] == ["a", "b"]
+    assert [row["times_seen"] for row in rows] == [1, 1]
+
+    later = T0 + timedelta(minutes=5)
+    rows = upsert_streamers(store, "q2", ["b", "c"], seen_at=later, viewers={"b": 9, "c": 1})
+    store.commit()
+    assert {row["username"]: row["times_seen"] for row in rows} == {"b": 2, "c": 1}
+
+    b = store.query(Streamer).filter_by(username="b").one()
+    assert (b.times_seen, b.query, b.viewers, b.first_seen, b.last_seen) == (2, "q2", 9, T0, later)
+    assert {s.username: s.times_seen for s in store.query(Streamer)} == {"a": 1, "b": 2, "c": 1}
+
+
+def test_upsert_without_viewers_keeps_stored_counts(store):
+    upsert_streamers(store, "q", ["a"], seen_at=T0, viewers={"a": 42})
+    store.commit()
+    upsert_streamers(store, "q", ["a"], seen_at=T0 + timedelta(minutes=1))
+    store.commit()
+    a = store.query(Streamer).filter_by(username="a").one()
+    assert (a.times_seen, a.viewers) == (2, 42)
+
+
+def test_came_online_counts_offline_streamers_seen_again(store):
+    upsert_streamers(store, "q", ["a", "b", "c"], seen_at=T0, viewers={})
+    store.commit()
+    assert pop_came_online() == 0
+
+    _mark_offline(store, ["a", "b"])
+    upsert_streamers(store, "q", ["a", "c", "d"], seen_at=T0 + timedelta(hours=1), viewers={})
+    store.commit()
+    # a came back; c never went offline and d is new
+    assert pop_came_online() == 1
+    assert pop_came_online() == 0
+    assert {s.username for s in store.query(Streamer).filter(Streamer.is_live.is_(True))} == {"a", "c", "d"}
@@ -0,0 +1,97 @@
+"""
+Live-status sweeper: batched offline marking and its side effects
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app.models.database import Streamer
+from app.services.live_feed import live_feed
+from app.services.streamer_index import streamer_index
+from app.services.streamer_store import pop_came_online, upsert_streamers
+from app.services.sweeper import LiveStatusSweeper
+from tests.conftest import BACKENDS
+
+pytestmark = pytest.mark.parametrize("database_url", BACKENDS, indirect=True)
+
+NOW = datetime(2024, 6, 1, 12, 0)
+STALE = NOW - timedelta(hours=2)
+
+
+def _seed(db, stale: int, fresh: int):
+    upsert_streamers(db, "q", [f"old{i}" for i in range(stale)], seen_at=STALE, viewers={})
+    upsert_streamers(db, "q", [f"new{i}" for i in range(fresh)], seen_at=NOW, viewers={})
+    db.commit()
+
+
+def test_batches_reach_every_stale_row(database, session):
+    _seed(session, stale=23, fresh=4)
+    updates = []
+
+    def count_updates(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            updates.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", count_updates)
+    try:
+        report = LiveStatusSweeper(window_minutes=30, batch_size=5).sweep(session, now=NOW)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count_updates)
+
+    assert report["went_offline"] == 23
+    # Four full batches and the short one that ends the sweep
+    assert len(updates) == 5
+    live = {streamer.username for streamer in session.query(Streamer).filter(Streamer.is_live.is_(True))}
+    assert live == {f"new{i}" for i in range(4)}
+
+    # Nothing left to do
+    assert LiveStatusSweeper(window_minutes=30, batch_size=5).sweep(session, now=NOW)["went_offline"] == 0
+
+
+def test_exact_multiple_of_the_batch_size(session):
+    _seed(session, stale=10, fresh=0)
+    report = LiveStatusSweeper(window_minutes=30, batch_size=5).sweep(session, now=NOW)
+    assert report["went_offline"] == 10
+    assert session.query(Streamer).filter(Streamer.is_live.is_(True)).count() == 0
+
+
+def test_offline_streamers_are_cleared_in_the_index(session):
+    _seed(session, stale=3, fresh=2)
+    streamer_index.warm(session)
+
+    LiveStatusSweeper(window_minutes=30, batch_size=2).sweep(session, now=NOW)
+
+    assert [streamer_index.get(f"old{i}").is_live for i in range(3)] == [False] * 3
+    assert [streamer_index.get(f"new{i}").is_live for i in range(2)] == [True] * 2
+
+
+def test_offline_deltas_are_published(session):
+    _seed(session, stale=3, fresh=1)
+    ids = {streamer.username: streamer.id for streamer in session.query(Streamer)}
+    seq = live_feed.seq
+
+    LiveStatusSweeper(window_minutes=30, batch_size=2).sweep(session, now=NOW)
+
+    batches = live_feed.since(seq)
+    deltas = [delta for _, batch in batches for delta in batch]
+    assert len(batches) == 2
+    assert sorted(deltas, key=lambda delta: delta["id"]) == [
+        {"op": "offline", "id": ids[f"old{i}"], "username": f"old{i}"} for i in range(3)
+    ]
+
+
+def test_came_online_is_counted_once_per_sweep(session):
+    _seed(session, stale=2, fresh=0)
+    sweeper = LiveStatusSweeper(window_minutes=30, batch_size=10)
+    sweeper.sweep(session, now=NOW)
+    pop_came_online()
+
+    # Both come back; one sighting is rolled back and does not count
+    upsert_streamers(session, "q", ["old0"], seen_at=NOW, viewers={})
+    session.commit()
+    upsert_streamers(session, "q", ["old1"], seen_at=NOW, viewers={})
+    session.rollback()
+
+    assert sweeper.sweep(session, now=NOW)["came_online"] == 1
+    # Reset by the sweep that reported it
+    assert sweeper.sweep(session, now=NOW)["came_online"] == 0
+    assert sweeper.stats()["sweeps"] == 3
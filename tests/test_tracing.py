@@ -0,0 +1,145 @@
+"""
+Nested spans, trace propagation into threads, database spans and slow traces
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+from app.api import routes
+from app.services import tracing
+from app.services.tracing import Tracer, TracingMiddleware, propagate, span
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """A fresh tracer that keeps every trace as slow"""
+    tracer = Tracer(mode="memory", slow_threshold=0, buffer_size=10)
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    monkeypatch.setattr(routes, "tracer", tracer)
+    return tracer
+
+
+def _shape(trace: dict) -> list:
+    """(depth, name) of each span, parents before children"""
+    return [(row["depth"], row["name"]) for row in trace["spans"]]
+
+
+def test_spans_nest_within_one_trace(tracer):
+    with span("request", user="a"):
+        with span("search"):
+            with span("tikapi.call"):
+                pass
+            with pytest.raises(ValueError):
+                with span("parse"):
+                    raise ValueError("bad payload")
+        with span("store"):
+            pass
+    with span("next request"):
+        pass
+
+    first, second = reversed(tracer.slow())
+    assert _shape(first) == [(0, "request"), (1, "search"), (2, "tikapi.call"), (2, "parse"), (1, "store")]
+    assert first["spans"][0]["attributes"] == {"user": "a"}
+    assert first["spans"][3]["error"] == "ValueError: bad payload"
+    # A span outside any other starts its own trace
+    assert _shape(second) == [(0, "next request")]
+    assert first["trace_id"] != second["trace_id"]
+    assert tracer.stats()["traces"] == 2
+
+
+def test_propagate_carries_the_trace_into_a_thread_pool(tracer):
+    def work(i: int) -> int:
+        with span("work", item=i):
+            time.sleep(0.001)
+        return i
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        with span("fan-out"):
+            assert list(executor.map(propagate(work), range(3))) == [0, 1, 2]
+        with span("unpropagated"):
+            list(executor.map(work, range(2)))
+
+    traces = tracer.slow()
+    fan_out = next(trace for trace in traces if trace["name"] == "fan-out")
+    assert _shape(fan_out) == [(0, "fan-out")] + [(1, "work")] * 3
+    assert sorted(row["attributes"]["item"] for row in fan_out["spans"][1:]) == [0, 1, 2]
+    # Without propagate() each thread starts a trace of its own
+    assert [trace["name"] for trace in traces].count("work") == 2
+    assert _shape(next(trace for trace in traces if trace["name"] == "unpropagated")) == [(0, "unpropagated")]
+
+
+def test_trace_follows_to_thread_and_run_in_executor(tracer):
+    def work(name: str):
+        with span(name):
+            pass
+
+    async def scenario():
+        with span("handler"):
+            await asyncio.to_thread(work, "to_thread")
+            # run_in_executor does not copy the context by itself
+            await asyncio.get_running_loop().run_in_executor(None, propagate(work), "executor")
+
+    asyncio.run(scenario())
+
+    [trace] = tracer.slow()
+    assert _shape(trace) == [(0, "handler"), (1, "to_thread"), (1, "executor")]
+
+
+def test_database_statements_become_spans_of_the_current_trace(tracer):
+    engine = create_engine("sqlite://")
+    tracing.instrument_engine(engine)
+    tracing.instrument_engine(engine)
+
+    with engine.connect() as connection:
+        # Statements outside a trace are not recorded
+        connection.execute(text("SELECT 0"))
+        with span("job"):
+            connection.execute(text("SELECT   1"))
+            with pytest.raises(Exception):
+                connection.execute(text("SELECT * FROM missing_table"))
+    engine.dispose()
+
+    [trace] = tracer.slow()
+    assert _shape(trace) == [(0, "job"), (1, "db.query"), (1, "db.query")]
+    ok, failed = trace["spans"][1:]
+    assert ok["attributes"] == {"statement": "SELECT 1"} and ok["error"] is None
+    assert failed["attributes"]["statement"] == "SELECT * FROM missing_table"
+    assert "missing_table" in failed["error"]
+
+
+def test_slow_traces_endpoint_returns_the_span_breakdown(monkeypatch):
+    tracer = Tracer(mode="memory", slow_threshold=0.1, buffer_size=10)
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    monkeypatch.setattr(routes, "tracer", tracer)
+
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+    app.include_router(routes.router)
+
+    @app.get("/tracing-test/{kind}")
+    def handler(kind: str):
+        with span("work", kind=kind):
+            time.sleep(0.15 if kind == "slow" else 0)
+        return {}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.get("/tracing-test/slow")
+            await client.get("/tracing-test/fast")
+            return (await client.get("/api/traces/slow")).json()
+
+    body = asyncio.run(scenario())
+
+    # Only the request above TRACE_SLOW_SECONDS is kept, named by its route
+    assert body["success"] and body["slow_threshold"] == 0.1
+    [trace] = body["data"]
+    assert trace["name"] == "GET /tracing-test/{kind}" and trace["duration_ms"] >= 150
+    request, work = trace["spans"]
+    assert request["attributes"]["http.route"] == "/tracing-test/{kind}"
+    assert request["attributes"]["http.status_code"] == 200
+    assert work["name"] == "work" and work["depth"] == 1 and work["attributes"] == {"kind": "slow"}
+    assert work["duration_ms"] >= 150 and work["offset_ms"] >= 0
@@ -0,0 +1,227 @@
+"""
+WebSocket fan-out through per-client queues
+"""
+import asyncio
+import json
+import threading
+from app.api import websocket as websocket_module
+from app.api.websocket import ConnectionManager
+from app.services.live_feed import LiveFeed, live_feed
+
+
+class FakeWebSocket:
+    """Records sent messages; each send takes send_delay seconds"""
+
+    def __init__(self, send_delay: float = 0.0):
+        self.send_delay = send_delay
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.send_delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+def test_slow_client_does_not_block_a_fast_one():
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, send_timeout=0.5)
+        fast, slow = FakeWebSocket(), FakeWebSocket(send_delay=30)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        for i in range(20):
+            await manager.broadcast({"type": "tick", "i": i})
+            # Give the fast sender a turn; the slow one never finishes a send
+            while manager.clients[fast].queue.qsize():
+                await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+
+        # Every tick reached the fast client while the slow one is stuck
+        assert [message["i"] for message in fast.sent] == list(range(20))
+        assert slow.sent == []
+        assert manager.clients[slow].queue.qsize() == 4
+        assert manager.dropped > 0
+
+        # The stalled send is evicted; the fast client stays connected
+        await asyncio.sleep(0.6)
+        assert slow not in manager.clients and slow.closed
+        assert fast in manager.clients and manager.evicted == 1
+        await manager.broadcast({"type": "tick", "i": 20})
+        await asyncio.sleep(0.01)
+        assert fast.sent[-1]["i"] == 20
+        manager.disconnect(fast)
+
+    asyncio.run(scenario())
+
+
+def test_unsubscribed_client_keeps_the_newest_messages():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, send_timeout=5)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        # No await in between: the sender task cannot drain the queue
+        for i in range(5):
+            manager._enqueue(manager.clients[websocket], json.dumps({"type": "tick", "i": i}))
+        await asyncio.sleep(0.01)
+        assert [message["i"] for message in websocket.sent] == [3, 4]
+        manager.disconnect(websocket)
+
+    asyncio.run(scenario())
+
+
+def test_subscribed_client_overflow_with_queue_of_one():
+    async def scenario():
+        manager = ConnectionManager(queue_size=1, send_timeout=5)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        await manager.subscribe(websocket)  # queues "subscribed"
+
+        deltas = [{"op": "new", "query": "q", "username": "a"}]
+        for seq in range(1, 4):
+            manager.publish_deltas(live_feed.seq + seq, deltas)
+        await asyncio.sleep(0.01)
+
+        # No QueueFull: the resync replaces the queue and every payload
+        assert [message["type"] for message in websocket.sent] == ["resync_required"]
+        assert manager.clients[websocket].queue.empty()
+        manager.disconnect(websocket)
+
+    asyncio.run(scenario())
+
+
+def _delta(op: str, query: str, username: str) -> dict:
+    return {"op": op, "query": query, "username": username} if op != "offline" else {"op": op, "username": username}
+
+
+def _received(websocket: FakeWebSocket) -> list:
+    """(type, seq, usernames) of each message sent to a client"""
+    return [
+        (message["type"], message["seq"], [delta["username"] for delta in message.get("deltas", [])])
+        for message in websocket.sent
+    ]
+
+
+def test_subscribe_replays_batches_after_since(monkeypatch):
+    feed = LiveFeed(buffer_size=10)
+    monkeypatch.setattr(websocket_module, "live_feed", feed)
+    first = feed.publish([_delta("new", "q", "a")])
+    second = feed.publish([_delta("updated", "q", "a"), _delta("new", "q", "b")])
+    third = feed.publish([_delta("offline", "q", "a")])
+
+    async def scenario():
+        manager = ConnectionManager(queue_size=16, send_timeout=5)
+        behind, current = FakeWebSocket(), FakeWebSocket()
+        for websocket in (behind, current):
+            await manager.connect(websocket)
+        await manager.subscribe(behind, since=first)
+        await manager.subscribe(current, since=third)
+        await asyncio.sleep(0.01)
+        manager.disconnect(behind)
+        manager.disconnect(current)
+        return behind, current
+
+    behind, current = asyncio.run(scenario())
+
+    assert _received(behind) == [
+        ("deltas", second, ["a", "b"]),
+        ("deltas", third, ["a"]),
+        ("subscribed", third, [])
+    ]
+    assert _received(current) == [("subscribed", third, [])]
+
+
+def test_subscribe_asks_for_resync_when_since_left_the_buffer(monkeypatch):
+    feed = LiveFeed(buffer_size=2)
+    monkeypatch.setattr(websocket_module, "live_feed", feed)
+    first = feed.publish([_delta("new", "q", "a")])
+    for username in ("b", "c", "d"):
+        feed.publish([_delta("new", "q", username)])
+
+    async def scenario():
+        manager = ConnectionManager(queue_size=16, send_timeout=5)
+        too_old, from_the_future = FakeWebSocket(), FakeWebSocket()
+        for websocket in (too_old, from_the_future):
+            await manager.connect(websocket)
+        await manager.subscribe(too_old, since=first)
+        # A sequence number this feed never issued, e.g. from before a restart
+        await manager.subscribe(from_the_future, since=feed.seq + 100)
+        await asyncio.sleep(0.01)
+        manager.disconnect(too_old)
+        manager.disconnect(from_the_future)
+        return too_old, from_the_future
+
+    too_old, from_the_future = asyncio.run(scenario())
+
+    for websocket in (too_old, from_the_future):
+        assert _received(websocket) == [("resync_required", feed.seq, []), ("subscribed", feed.seq, [])]
+
+
+def test_subscription_filters_by_query_and_ops(monkeypatch):
+    feed = LiveFeed(buffer_size=10)
+    monkeypatch.setattr(websocket_module, "live_feed", feed)
+    start = feed.seq
+    replayed = feed.publish([_delta("new", "cats", "a"), _delta("new", "dogs", "b"), _delta("updated", "cats", "c")])
+    feed.publish([_delta("updated", "cats", "d")])
+
+    async def scenario():
+        manager = ConnectionManager(queue_size=16, send_timeout=5)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        await manager.subscribe(websocket, query="cats", ops=["new", "offline"], since=start)
+        live = feed.seq + 1
+        manager.publish_deltas(live, [
+            _delta("new", "dogs", "e"), _delta("offline", None, "f"), _delta("new", "cats", "g")
+        ])
+        # Nothing matches: no message at all
+        manager.publish_deltas(live + 1, [_delta("updated", "cats", "h")])
+        await asyncio.sleep(0.01)
+        manager.disconnect(websocket)
+        return websocket, live
+
+    websocket, live = asyncio.run(scenario())
+
+    # Offline deltas carry no query and reach every query subscription
+    assert _received(websocket) == [
+        ("deltas", replayed, ["a"]),
+        ("subscribed", replayed + 1, []),
+        ("deltas", live, ["f", "g"])
+    ]
+
+
+def test_batches_published_from_a_writer_thread_arrive_in_order():
+    feed = LiveFeed(buffer_size=100)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        manager = ConnectionManager(queue_size=256, send_timeout=5)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        await manager.subscribe(websocket)
+        delivered_on = set()
+
+        def listener(seq, deltas):
+            delivered_on.add(threading.get_ident())
+            manager.publish_deltas(seq, deltas)
+
+        feed.attach(loop, listener)
+
+        def writer(name: str):
+            return [feed.publish([_delta("new", "q", f"{name}{i}")]) for i in range(50)]
+
+        published = await asyncio.gather(*(asyncio.to_thread(writer, name) for name in ("x", "y")))
+        await asyncio.sleep(0.05)
+        feed.detach()
+        manager.disconnect(websocket)
+        return websocket, published, delivered_on
+
+    websocket, published, delivered_on = asyncio.run(scenario())
+
+    assert delivered_on == {threading.get_ident()}
+    seqs = [seq for _, seq, _ in _received(websocket)[1:]]
+    assert seqs == sorted(published[0] + published[1])